@@ -1,5 +1,8 @@
 from .base import ResourceUnrecognizableError, ResourceInvalidError, ResourceConstraintError, NetDriveDownloadSession, \
     StandaloneFileNetDriveDownloadSession, SeparableNetDriveDownloadSession
+from .batch import BatchConfig, batch_config, get_batch_config, FATAL_STATUSES, TRANSIENT_STATUSES, \
+    FAIL_FAST_POLICIES, is_fatal_error, classify_error, is_overload_error, ItemFailure, BatchSummary, BatchDownloadError, \
+    prewarm_resolved_url
 from .bunkr import BunkrAlbumDownloadSession, BunkrImageDownloadSession, get_file_urls_for_bunkr_album, \
     get_direct_url_for_bunkr_image, BunkrVideoDownloadSession, BunkrFileDownloadSession
 from .cyberdrop import CyberDropArchiveDownloadSession, CyberDropFileDownloadSession, get_file_links_for_cyberdrop, \
@@ -8,15 +11,17 @@ from .cyberfile import get_direct_url_for_cyberfile_file, get_all_direct_urls_fo
     CyberFileDownloadSession
 from .dispatch import register_net_drive, from_url, sep_from_url
 from .dropbox import DropBoxFolderDownloadSession, DropBoxFileDownloadSession, get_direct_url_for_dropbox
-from .gofile import GoFileFolderDownloadSession, get_direct_urls_for_gofile_folder
+from .gofile import GoFileFolderDownloadSession, GoFileFileDownloadSession, get_direct_urls_for_gofile_folder, \
+    iter_direct_urls_for_gofile_folder, GoFileTokenPool, gofile_token_pool
 from .ibb import IbbFileDownloadSession
 from .imagebam import get_direct_url_for_imagebam_image, ImageBamImageDownloadSession, ImageBamViewDownloadSession
 from .imgbox import ImgBoxGalleryDownloadSession, ImgBoxImageDownloadSession, ImgBoxResourceInvalidError, \
     get_file_urls_for_imgbox, get_direct_url_for_imgbox
 from .imgvb import ImgvbImageDownloadSession
 from .jpg5su import JPG5SuFileDownloadSession, get_direct_url_for_jpg5su, JPG5SuAlbumDownloadSession, \
-    get_file_urls_for_jpg5su, get_og_image_url
-from .mediafire import MediaFireLinkInvalidError, MediaFireDownloadSession, get_direct_url_and_filename_for_mediafire
+    get_file_urls_for_jpg5su, get_og_image_url, iter_file_urls_for_jpg5su
+from .mediafire import MediaFireLinkInvalidError, MediaFireDownloadSession, get_direct_url_and_filename_for_mediafire, \
+    open_direct_response_for_mediafire
 from .pixeldrain import get_list_info_for_pixeldrain, get_direct_url_and_name_for_pixeldrain, \
     PixelDrainFileDownloadSession, PixelDrainListDownloadSession
 from .pixhost import PixHostGalleryDownloadSession, PixHostShowDownloadSession, get_direct_url_for_pixhost
@@ -0,0 +1,399 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterable, Optional, List
+from urllib.parse import urlsplit
+
+import requests
+from hbutils.string import plural_word
+
+from .base import ResourceDownloadError, ResourceInvalidError, ResourceConstraintError
+from ..utils import progress_scope, cancel_scope, DownloadCancelledError, prewarm_connections, deadline_scope, \
+    DeadlineExceededError, global_concurrency
+
+#: Statuses meaning that the other items of the same album are doomed as well, e.g. expired links or revoked tokens.
+FATAL_STATUSES = (401, 403, 404, 410)
+#: Statuses worth retrying later, e.g. overloaded CDN nodes.
+TRANSIENT_STATUSES = (408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524)
+#: Policies of cancelling the pending items when one item fails.
+FAIL_FAST_POLICIES = ('never', 'fatal', 'any')
+
+
+def is_fatal_error(err: BaseException) -> bool:
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code in FATAL_STATUSES
+    return False
+
+
+def classify_error(err: BaseException) -> str:
+    # * cancelled: stopped by the cancel token
+    # * fatal: the other items are doomed as well, see FATAL_STATUSES
+    # * permanent: retrying will not help, e.g. invalid pages or other client errors
+    # * transient: network errors, server errors, truncated or corrupted transfers, and the unknown ones
+    if isinstance(err, DownloadCancelledError):
+        return 'cancelled'
+    elif is_fatal_error(err):
+        return 'fatal'
+    elif isinstance(err, requests.HTTPError) and err.response is not None:
+        return 'transient' if err.response.status_code in TRANSIENT_STATUSES else 'permanent'
+    elif isinstance(err, (ResourceInvalidError, ResourceConstraintError, requests.exceptions.InvalidURL)):
+        return 'permanent'
+    else:
+        return 'transient'
+
+
+def is_overload_error(err: BaseException) -> bool:
+    # the host asks for fewer concurrent requests, see AdaptiveConcurrency
+    if isinstance(err, requests.HTTPError) and err.response is not None:
+        return err.response.status_code == 429 or err.response.status_code >= 500
+    return isinstance(err, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)) and \
+        not isinstance(err, DeadlineExceededError)
+
+
+class BatchConfig:
+    def __init__(self, max_workers: int = 12, max_in_flight: Optional[int] = None,
+                 byte_budget: Optional[int] = None, fail_fast: str = 'never',
+                 retry_rounds: int = 1, retry_workers: Optional[int] = None,
+                 job_timeout: Optional[float] = None, file_timeout: Optional[float] = None,
+                 adaptive: bool = False):
+        self.max_workers = max_workers
+        # submitted but unfinished items (including the queued ones), None means twice the workers
+        self.max_in_flight = max_in_flight
+        # total expected size of the unfinished items, None means unlimited
+        self.byte_budget = byte_budget
+        if fail_fast not in FAIL_FAST_POLICIES:
+            raise ValueError(f'Unknown fail-fast policy {fail_fast!r}, should be one of {FAIL_FAST_POLICIES!r}.')
+        self.fail_fast = fail_fast
+        # rounds of retrying the transiently failed items after all the others, 0 means no retry
+        self.retry_rounds = retry_rounds
+        # workers of the retry rounds, None means a quarter of the workers
+        self.retry_workers = retry_workers
+        # seconds of the whole album (retry rounds included) and of each item (resolution and transfer),
+        # None means unlimited, see deadline_scope
+        self.job_timeout = job_timeout
+        self.file_timeout = file_timeout
+        # concurrency of each host adapted by global_concurrency (up to its max_limit) instead of max_workers
+        self.adaptive = adaptive
+
+    def should_cancel(self, err: BaseException) -> bool:
+        return self.fail_fast == 'any' or (self.fail_fast == 'fatal' and is_fatal_error(err))
+
+    @property
+    def in_flight_limit(self) -> int:
+        return max(self.max_in_flight or self.max_workers * 2, self.max_workers)
+
+    @property
+    def retry_workers_limit(self) -> int:
+        return self.retry_workers or max(self.max_workers // 4, 1)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} max_workers: {self.max_workers!r}, ' \
+               f'max_in_flight: {self.max_in_flight!r}, byte_budget: {self.byte_budget!r}, ' \
+               f'fail_fast: {self.fail_fast!r}, retry_rounds: {self.retry_rounds!r}, ' \
+               f'retry_workers: {self.retry_workers!r}, job_timeout: {self.job_timeout!r}, ' \
+               f'file_timeout: {self.file_timeout!r}, adaptive: {self.adaptive!r}>'
+
+
+_current_config = contextvars.ContextVar('batch_config', default=BatchConfig())
+
+
+def get_batch_config() -> BatchConfig:
+    return _current_config.get()
+
+
+@contextmanager
+def batch_config(max_workers: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 byte_budget: Optional[int] = None, fail_fast: Optional[str] = None,
+                 retry_rounds: Optional[int] = None, retry_workers: Optional[int] = None,
+                 job_timeout: Optional[float] = None, file_timeout: Optional[float] = None,
+                 adaptive: Optional[bool] = None):
+    # the unspecified fields are inherited from the current config
+    current = _current_config.get()
+    token = _current_config.set(BatchConfig(
+        max_workers=max_workers or current.max_workers,
+        max_in_flight=max_in_flight or current.max_in_flight,
+        byte_budget=byte_budget or current.byte_budget,
+        fail_fast=fail_fast or current.fail_fast,
+        retry_rounds=retry_rounds if retry_rounds is not None else current.retry_rounds,
+        retry_workers=retry_workers or current.retry_workers,
+        job_timeout=job_timeout or current.job_timeout,
+        file_timeout=file_timeout or current.file_timeout,
+        adaptive=adaptive if adaptive is not None else current.adaptive,
+    ))
+    try:
+        yield _current_config.get()
+    finally:
+        _current_config.reset(token)
+
+
+_current_prewarm = contextvars.ContextVar('batch_prewarm', default=None)
+
+
+def prewarm_resolved_url(url: str):
+    # called by fn once the direct url of its item is resolved, e.g. a CDN url only known after a page request,
+    # the connection to its host is opened in the background for the queued items of the same host,
+    # once for each host of the album, nothing is done outside download_items or without its session
+    prewarm = _current_prewarm.get()
+    if prewarm is not None:
+        prewarm(url)
+
+
+class ByteBudget:
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size: Optional[int]) -> int:
+        # items larger than the whole budget are still allowed when nothing else is in flight
+        size = size or 0
+        if self.limit is None or not size:
+            return 0
+        with self._cond:
+            self._cond.wait_for(lambda: not self.in_flight or self.in_flight + size <= self.limit)
+            self.in_flight += size
+        return size
+
+    def release(self, size: int):
+        if size:
+            with self._cond:
+                self.in_flight -= size
+                self._cond.notify_all()
+
+
+class ItemFailure:
+    __slots__ = ('item', 'error', 'kind', 'attempts')
+
+    def __init__(self, item: tuple, error: BaseException, kind: str, attempts: int):
+        self.item = item
+        self.error = error
+        self.kind = kind
+        self.attempts = attempts
+
+    def to_json(self) -> dict:
+        return {
+            'item': [str(value) for value in self.item],
+            'error': f'{self.error.__class__.__name__}: {self.error}',
+            'kind': self.kind,
+            'attempts': self.attempts,
+        }
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} item: {self.item!r}, kind: {self.kind!r}, ' \
+               f'attempts: {self.attempts!r}, error: {self.error!r}>'
+
+
+class BatchSummary:
+    def __init__(self, page_url: str):
+        self.page_url = page_url
+        self.total = 0
+        self.done = 0
+        # items finished in the retry rounds
+        self.recovered = 0
+        self.failures: List[ItemFailure] = []
+        self.cancel_reason: Optional[str] = None
+        self.lock = threading.Lock()
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for failure in self.failures if failure.kind != 'cancelled')
+
+    @property
+    def skipped(self) -> int:
+        return sum(1 for failure in self.failures if failure.kind == 'cancelled')
+
+    def to_json(self) -> dict:
+        return {
+            'page_url': self.page_url,
+            'total': self.total,
+            'done': self.done,
+            'recovered': self.recovered,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'cancel_reason': self.cancel_reason,
+            'failures': [failure.to_json() for failure in self.failures if failure.kind != 'cancelled'],
+        }
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} page_url: {self.page_url!r}, total: {self.total!r}, ' \
+               f'done: {self.done!r}, recovered: {self.recovered!r}, failed: {self.failed!r}, ' \
+               f'skipped: {self.skipped!r}>'
+
+
+class BatchDownloadError(ResourceDownloadError):
+    def __init__(self, message: str, summary: BatchSummary):
+        ResourceDownloadError.__init__(self, message)
+        self.summary = summary
+
+
+def download_items(page_url: str, items: Iterable[tuple], fn: Callable,
+                   max_workers: Optional[int] = None, total_bytes: Optional[int] = None, sized: int = 0,
+                   size_of: Optional[Callable[[tuple], Optional[int]]] = None,
+                   url_of: Optional[Callable[[tuple], Optional[str]]] = None,
+                   session: Optional[requests.Session] = None) -> BatchSummary:
+    # fn is called with each item unpacked, it is expected to log its errors and clean up its partial files,
+    # the errors are collected and reported together once all the items are finished.
+    # the items can be a lazy iterable, they are only drawn when there is room in flight, so the memory
+    # does not grow with the size of the album.
+    # the items share one cancel token, cancelled by the fail-fast policy or an interruption, then the
+    # pending items are skipped and the running streams are aborted.
+    # the transiently failed items are deferred, and retried with fewer workers once all the others are
+    # finished, fn is called again so the direct urls are resolved again
+    # with url_of and session, the connection to the host of each item is opened as soon as the item is drawn,
+    # so the queued items find their connections ready, fn can call prewarm_resolved_url for the hosts
+    # only known after the resolution, e.g. the CDN hosts
+    # with adaptive concurrency, the items of each host (of url_of, or of the page) are limited by
+    # global_concurrency instead, which learns from their durations and overload errors, the items wait in the
+    # queues of their hosts, so only the room in flight holds up the drawing of the next items
+    config = get_batch_config()
+    max_workers = max_workers or (global_concurrency.max_limit if config.adaptive else config.max_workers)
+    page_host = urlsplit(page_url).netloc
+    summary = BatchSummary(page_url)
+    deferred = []
+    prewarmed_hosts = set()
+    prewarm_lock = threading.Lock()
+
+    def _prewarm(url: str):
+        host = urlsplit(url).netloc
+        with prewarm_lock:
+            if not host or host in prewarmed_hosts:
+                return
+            prewarmed_hosts.add(host)
+        prewarm_connections(session, [url])
+
+    with progress_scope(desc=page_url) as progress, cancel_scope() as token, \
+            deadline_scope(config.job_timeout):
+        counted = hasattr(items, '__len__')
+        if counted:
+            progress.add_files(len(items), total_bytes=total_bytes, sized=sized)
+            summary.total = len(items)
+
+        def _run_pass(pass_items: Iterable[tuple], workers: int, attempt: int, last: bool):
+            in_flight_limit = max(config.in_flight_limit, workers)
+            in_flight = threading.BoundedSemaphore(in_flight_limit)
+            budget = ByteBudget(config.byte_budget)
+
+            def _download_item(item, reserved, host, size):
+                start_time, elapsed, overloaded = time.perf_counter(), None, False
+                try:
+                    token.raise_if_cancelled()
+                    with deadline_scope(config.file_timeout):
+                        fn(*item)
+                except Exception as err:
+                    overloaded = is_overload_error(err)
+                    kind = classify_error(err)
+                    with summary.lock:
+                        if kind == 'transient' and not last and config.fail_fast != 'any':
+                            deferred.append((item, err, attempt))
+                            return
+                        summary.failures.append(ItemFailure(item, err, kind, attempt))
+                    progress.file_failed()
+                    if kind != 'cancelled' and config.should_cancel(err):
+                        token.cancel(f'{err.__class__.__name__} with fail-fast policy {config.fail_fast!r}', err)
+                else:
+                    elapsed = time.perf_counter() - start_time
+                    with summary.lock:
+                        summary.done += 1
+                        if attempt > 1:
+                            summary.recovered += 1
+                    progress.file_done()
+                finally:
+                    if host is not None:
+                        global_concurrency.release(host, elapsed=elapsed, size=size, overloaded=overloaded)
+                    budget.release(reserved)
+                    in_flight.release()
+
+            waiting, waiting_cond = [0], threading.Condition()
+
+            def _submit_waiting(context, item, reserved, host, size):
+                # called once the slot of the host is taken, possibly by a worker giving back its own slot
+                try:
+                    tp.submit(context.run, _download_item, item, reserved, host, size)
+                except RuntimeError:
+                    # the pass is already interrupted, the item is dropped
+                    global_concurrency.release(host)
+                    budget.release(reserved)
+                    in_flight.release()
+                with waiting_cond:
+                    waiting[0] -= 1
+                    waiting_cond.notify_all()
+
+            # with adaptive concurrency, the running items are bounded by the limits of their hosts,
+            # so each item in flight can have its thread
+            with ThreadPoolExecutor(max_workers=in_flight_limit if config.adaptive else workers) as tp:
+                try:
+                    for item in pass_items:
+                        if token.cancelled:
+                            break
+                        url = url_of(item) if url_of is not None else None
+                        if url and session is not None and attempt == 1:
+                            _prewarm(url)
+                        size = size_of(item) if size_of else None
+                        if not counted and attempt == 1:
+                            progress.add_files(1, total_bytes=size, sized=1 if size is not None else 0)
+                            summary.total += 1
+                        in_flight.acquire()
+                        reserved = budget.acquire(size)
+                        # each item runs in a copy of the current context, so the workers report to the same progress
+                        context = contextvars.copy_context()
+                        if config.adaptive:
+                            # the item waits in the queue of its host, so a saturated host does not hold up the others
+                            host = (urlsplit(url).netloc if url else None) or page_host
+                            with waiting_cond:
+                                waiting[0] += 1
+                            global_concurrency.acquire_then(
+                                host, partial(_submit_waiting, context, item, reserved, host, size))
+                        else:
+                            tp.submit(context.run, _download_item, item, reserved, None, size)
+
+                    # the items still waiting for their hosts are submitted by the workers of this pass
+                    with waiting_cond:
+                        waiting_cond.wait_for(lambda: not waiting[0])
+                except BaseException as err:
+                    # e.g. KeyboardInterrupt, cancelled before the executor waits for the running items,
+                    # so they are stopped at their next chunk
+                    token.cancel(f'interrupted by {err.__class__.__name__}', err)
+                    raise
+
+        prewarm_token = _current_prewarm.set(_prewarm if session is not None else None)
+        try:
+            _run_pass(items, max_workers, 1, last=config.retry_rounds <= 0)
+            for round_ in range(config.retry_rounds):
+                if not deferred or token.cancelled:
+                    break
+                retry_items, deferred[:] = [item for item, _, _ in deferred], []
+                logging.info(f'Retrying {plural_word(len(retry_items), "failed item")} of {page_url!r}, '
+                             f'round {round_ + 1}/{config.retry_rounds} ...')
+                _run_pass(retry_items, config.retry_workers_limit, round_ + 2,
+                          last=round_ + 1 >= config.retry_rounds)
+        except BaseException as err:
+            # e.g. KeyboardInterrupt between the passes
+            token.cancel(f'interrupted by {err.__class__.__name__}', err)
+            raise
+        finally:
+            _current_prewarm.reset(prewarm_token)
+
+    # deferred items left by a cancellation are reported with their own errors
+    for item, err, attempt in deferred:
+        summary.failures.append(ItemFailure(item, err, 'transient', attempt))
+    if token.cancelled:
+        summary.cancel_reason = token.reason
+        raise BatchDownloadError(f'Download of {page_url!r} cancelled - {token.reason}, '
+                                 f'{plural_word(summary.failed, "error")} found.', summary) from token.error
+    if summary.failures:
+        raise BatchDownloadError(f'{plural_word(summary.failed, "error")} found '
+                                 f'when downloading {page_url!r} in total.', summary)
+    return summary
+
+
+def sum_sizes(sizes: Iterable[Optional[int]]):
+    total, sized = 0, 0
+    for size in sizes:
+        if size is not None:
+            total += size
+            sized += 1
+    return total, sized
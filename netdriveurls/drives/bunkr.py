@@ -1,20 +1,19 @@
 import logging
 import os.path
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional
+from typing import Optional, List
 from urllib.parse import urljoin
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
-from tqdm import tqdm
 
 from .base import ResourceInvalidError, StandaloneFileNetDriveDownloadSession, NetDriveDownloadSession, \
-    ResourceDownloadError
-from ..utils import get_requests_session, download_file
+    SeparableNetDriveDownloadSession
+from .batch import download_items, prewarm_resolved_url
+from ..utils import get_requests_session, download_file, single_flight
 
 
+@single_flight()
 def get_direct_url_for_bunkr_image(url: str, session: Optional[requests.Session] = None):
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:-1]) in {('bunkr',), ('bunkrrr',)}, f'Invalid host: {split.host!r}'
@@ -32,6 +31,7 @@ def get_direct_url_for_bunkr_image(url: str, session: Optional[requests.Session]
         raise ResourceInvalidError(f'Failed to get image url from {url!r}.')
 
 
+@single_flight()
 def get_direct_url_for_bunkr_video(url: str, session: Optional[requests.Session] = None):
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:-1]) in {('bunkr',), ('bunkrrr',)}, f'Invalid host: {split.host!r}'
@@ -49,6 +49,7 @@ def get_direct_url_for_bunkr_video(url: str, session: Optional[requests.Session]
         raise ResourceInvalidError(f'Failed to get video url from {url!r}.')
 
 
+@single_flight()
 def get_direct_url_for_bunkr_file(url: str, session: Optional[requests.Session] = None):
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:-1]) in {('bunkr',), ('bunkrrr',)}, f'Invalid host: {split.host!r}'
@@ -87,6 +88,7 @@ def get_direct_url_for_bunkr(url: str, session: Optional[requests.Session] = Non
         assert False, f'Invalid path: {url!r}.'
 
 
+@single_flight()
 def get_file_urls_for_bunkr_album(url: str, session: Optional[requests.Session] = None):
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:-1]) in {('bunkr',), ('bunkrrr',)}, f'Invalid host: {split.host!r}'
@@ -106,25 +108,35 @@ def get_file_urls_for_bunkr_album(url: str, session: Optional[requests.Session]
     return retval
 
 
-class BunkrImageDownloadSession(StandaloneFileNetDriveDownloadSession):
-    def __init__(self, url: str):
+class _BunkrItemDownloadSession(StandaloneFileNetDriveDownloadSession):
+    def __init__(self, url: str, filename: Optional[str] = None):
         StandaloneFileNetDriveDownloadSession.__init__(self)
         self.page_url = url
+        # e.g. the title in the album, the name in the direct url is used when not given
+        self.filename = filename
 
-    def _get_resource_id(self) -> str:
-        split = urlsplit(self.page_url)
-        return f'{split.host}_image_{split.path_segments[2]}'
+    def _get_direct_url(self, session: requests.Session) -> str:
+        raise NotImplementedError  # pragma: no cover
 
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
-        url = get_direct_url_for_bunkr_image(self.page_url, session=session)
-        dst_file = os.path.join(dst_dir, urlsplit(url).filename)
+        url = self._get_direct_url(session)
+        dst_file = os.path.join(dst_dir, self.filename or urlsplit(url).filename)
         download_file(url, filename=dst_file, session=session)
 
     @classmethod
     def from_url(cls, url: str):
         return cls(url)
 
+
+class BunkrImageDownloadSession(_BunkrItemDownloadSession):
+    def _get_resource_id(self) -> str:
+        split = urlsplit(self.page_url)
+        return f'{split.host}_image_{split.path_segments[2]}'
+
+    def _get_direct_url(self, session: requests.Session) -> str:
+        return get_direct_url_for_bunkr_image(self.page_url, session=session)
+
     @classmethod
     def is_valid_url(cls, url: str) -> bool:
         split = urlsplit(url)
@@ -132,24 +144,13 @@ class BunkrImageDownloadSession(StandaloneFileNetDriveDownloadSession):
             tuple(split.path_segments[1:2]) == ('i',)
 
 
-class BunkrVideoDownloadSession(StandaloneFileNetDriveDownloadSession):
-    def __init__(self, url: str):
-        StandaloneFileNetDriveDownloadSession.__init__(self)
-        self.page_url = url
-
+class BunkrVideoDownloadSession(_BunkrItemDownloadSession):
     def _get_resource_id(self) -> str:
         split = urlsplit(self.page_url)
         return f'{split.host}_video_{split.path_segments[2]}'
 
-    def download_to_directory(self, dst_dir: str):
-        session = get_requests_session()
-        url = get_direct_url_for_bunkr_video(self.page_url, session=session)
-        dst_file = os.path.join(dst_dir, urlsplit(url).filename)
-        download_file(url, filename=dst_file, session=session)
-
-    @classmethod
-    def from_url(cls, url: str):
-        return cls(url)
+    def _get_direct_url(self, session: requests.Session) -> str:
+        return get_direct_url_for_bunkr_video(self.page_url, session=session)
 
     @classmethod
     def is_valid_url(cls, url: str) -> bool:
@@ -158,24 +159,13 @@ class BunkrVideoDownloadSession(StandaloneFileNetDriveDownloadSession):
             tuple(split.path_segments[1:2]) == ('v',)
 
 
-class BunkrFileDownloadSession(StandaloneFileNetDriveDownloadSession):
-    def __init__(self, url: str):
-        StandaloneFileNetDriveDownloadSession.__init__(self)
-        self.page_url = url
-
+class BunkrFileDownloadSession(_BunkrItemDownloadSession):
     def _get_resource_id(self) -> str:
         split = urlsplit(self.page_url)
         return f'{split.host}_file_{split.path_segments[2]}'
 
-    def download_to_directory(self, dst_dir: str):
-        session = get_requests_session()
-        url = get_direct_url_for_bunkr_file(self.page_url, session=session)
-        dst_file = os.path.join(dst_dir, urlsplit(url).filename)
-        download_file(url, filename=dst_file, session=session)
-
-    @classmethod
-    def from_url(cls, url: str):
-        return cls(url)
+    def _get_direct_url(self, session: requests.Session) -> str:
+        return get_direct_url_for_bunkr_file(self.page_url, session=session)
 
     @classmethod
     def is_valid_url(cls, url: str) -> bool:
@@ -184,9 +174,9 @@ class BunkrFileDownloadSession(StandaloneFileNetDriveDownloadSession):
             tuple(split.path_segments[1:2]) == ('d',)
 
 
-class BunkrAlbumDownloadSession(NetDriveDownloadSession):
+class BunkrAlbumDownloadSession(SeparableNetDriveDownloadSession):
     def __init__(self, url: str):
-        NetDriveDownloadSession.__init__(self)
+        SeparableNetDriveDownloadSession.__init__(self)
         self.page_url = url
 
     def _get_resource_id(self) -> str:
@@ -195,34 +185,35 @@ class BunkrAlbumDownloadSession(NetDriveDownloadSession):
 
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
-        errors = []
-
         all_items = get_file_urls_for_bunkr_album(self.page_url, session=session)
-        pg = tqdm(total=len(all_items))
 
-        def _download_file(file_url, fn):
+        def _download_file(fn, file_url):
             dst_file = None
             try:
                 url = get_direct_url_for_bunkr(file_url, session=session)
+                # the media host is only known here, the next items on it find a connection ready
+                prewarm_resolved_url(url)
                 dst_file = os.path.join(dst_dir, fn)
                 download_file(url, filename=dst_file, session=session)
-            except Exception as err:
+            except Exception:
                 logging.exception(f'Error when downloading {file_url!r} ...')
-                errors.append(err)
                 if dst_file and os.path.exists(dst_file):
                     os.remove(dst_file)
                 raise
-            finally:
-                pg.update()
 
-        tp = ThreadPoolExecutor(max_workers=12)
-        for title, furl in all_items:
-            tp.submit(_download_file, furl, title)
-        tp.shutdown(wait=True)
+        download_items(self.page_url, all_items, _download_file, url_of=lambda item: item[1], session=session)
 
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+    def separate(self) -> List[NetDriveDownloadSession]:
+        session = get_requests_session()
+        retval = []
+        for title, file_url in get_file_urls_for_bunkr_album(self.page_url, session=session):
+            for cls in (BunkrImageDownloadSession, BunkrVideoDownloadSession, BunkrFileDownloadSession):
+                if cls.is_valid_url(file_url):
+                    retval.append(cls(file_url, filename=title or None))
+                    break
+            else:
+                raise ResourceInvalidError(f'Unknown item {file_url!r} in album {self.page_url!r}.')
+        return retval
 
     @classmethod
     def from_url(cls, url: str):
@@ -1,29 +1,19 @@
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List
 from urllib.parse import urljoin
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
-from tqdm import tqdm
 
-from .base import StandaloneFileNetDriveDownloadSession, NetDriveDownloadSession, ResourceDownloadError, \
-    SeparableNetDriveDownloadSession
-from ..utils import get_requests_session, download_file
+from .base import StandaloneFileNetDriveDownloadSession, NetDriveDownloadSession, SeparableNetDriveDownloadSession
+from .batch import download_items, prewarm_resolved_url
+from ..utils import get_requests_session, download_file, get_current_progress, single_flight, global_http_cache, \
+    hedged_get
 
 
-def get_file_links_for_cyberdrop(url: str, session: Optional[requests.Session] = None):
-    split = urlsplit(url)
-    assert tuple(split.host.split('.')) == ('cyberdrop', 'me'), f'Invalid host: {split.host!r}'
-    assert tuple(split.path_segments[1:2]) == ('a',), f'Invalid path: {url!r}'
-
-    session = session or get_requests_session()
-    resp = session.get(url)
-    resp.raise_for_status()
-
+def _parse_cyberdrop_album(resp: requests.Response):
     retval = []
     for item in pq(resp.text)('#table > *').items():
         a = item('a#file')
@@ -34,6 +24,17 @@ def get_file_links_for_cyberdrop(url: str, session: Optional[requests.Session] =
     return retval
 
 
+@single_flight()
+def get_file_links_for_cyberdrop(url: str, session: Optional[requests.Session] = None):
+    split = urlsplit(url)
+    assert tuple(split.host.split('.')) == ('cyberdrop', 'me'), f'Invalid host: {split.host!r}'
+    assert tuple(split.path_segments[1:2]) == ('a',), f'Invalid path: {url!r}'
+
+    session = session or get_requests_session()
+    return [tuple(item) for item in global_http_cache.fetch(url, _parse_cyberdrop_album, session=session)]
+
+
+@single_flight()
 def get_direct_file_link_for_cyberdrop(url: str, session: Optional[requests.Session] = None):
     split = urlsplit(url)
     assert tuple(split.host.split('.')) == ('cyberdrop', 'me'), f'Invalid host: {split.host!r}'
@@ -41,11 +42,11 @@ def get_direct_file_link_for_cyberdrop(url: str, session: Optional[requests.Sess
 
     file_id = split.path_segments[2]
     session = session or get_requests_session()
-    resp = session.get(f'https://api.cyberdrop.me/api/file/info/{file_id}')
+    resp = hedged_get(f'https://api.cyberdrop.me/api/file/info/{file_id}', session=session)
     resp.raise_for_status()
     file_info = resp.json()
 
-    resp = session.get(file_info['auth_url'])
+    resp = hedged_get(file_info['auth_url'], session=session)
     resp.raise_for_status()
     return resp.json()['url'], file_info['name'], file_info['size']
 
@@ -88,32 +89,31 @@ class CyberDropArchiveDownloadSession(SeparableNetDriveDownloadSession):
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
         os.makedirs(dst_dir, exist_ok=True)
-        errors = []
-
         all_items = get_file_links_for_cyberdrop(self.page_url, session=session)
-        pg = tqdm(total=len(all_items))
 
         def _download_file(furl, dst_file):
             try:
                 url, name, size = get_direct_file_link_for_cyberdrop(furl, session=session)
-                download_file(url, filename=dst_file, expected_size=size)
-            except Exception as err:
+                # the CDN host is only known here, the next items on it find a connection ready
+                prewarm_resolved_url(url)
+                progress = get_current_progress()
+                if progress is not None and size is not None:
+                    # the sizes are only known after the resolution
+                    progress.add_file_size(size)
+                download_file(url, filename=dst_file, expected_size=size, session=session)
+            except Exception:
                 logging.exception(f'Error when downloading {furl!r} to {dst_file!r} ...')
-                errors.append(err)
                 if os.path.exists(dst_file):
                     os.remove(dst_file)
                 raise
-            finally:
-                pg.update()
-
-        tp = ThreadPoolExecutor(max_workers=12)
-        for rname, file_url in all_items:
-            tp.submit(_download_file, file_url, os.path.join(dst_dir, rname))
-        tp.shutdown(wait=True)
 
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+        download_items(
+            self.page_url,
+            [(file_url, os.path.join(dst_dir, rname)) for rname, file_url in all_items],
+            _download_file,
+            url_of=lambda item: item[0],
+            session=session,
+        )
 
     def separate(self) -> List[NetDriveDownloadSession]:
         session = get_requests_session()
@@ -6,7 +6,7 @@ from .bunkr import BunkrImageDownloadSession, BunkrAlbumDownloadSession, BunkrVi
 from .cyberdrop import CyberDropArchiveDownloadSession, CyberDropFileDownloadSession
 from .cyberfile import CyberFileDownloadSession
 from .dropbox import DropBoxFileDownloadSession, DropBoxFolderDownloadSession
-from .gofile import GoFileFolderDownloadSession
+from .gofile import GoFileFolderDownloadSession, GoFileFileDownloadSession
 from .ibb import IbbFileDownloadSession
 from .imagebam import ImageBamViewDownloadSession, ImageBamImageDownloadSession
 from .imgbox import ImgBoxImageDownloadSession, ImgBoxGalleryDownloadSession
@@ -30,6 +30,7 @@ register_net_drive(MediaFireDownloadSession)
 register_net_drive(DropBoxFolderDownloadSession)
 register_net_drive(DropBoxFileDownloadSession)
 register_net_drive(GoFileFolderDownloadSession)
+register_net_drive(GoFileFileDownloadSession)
 register_net_drive(CyberDropFileDownloadSession)
 register_net_drive(CyberDropArchiveDownloadSession)
 register_net_drive(JPG5SuFileDownloadSession)
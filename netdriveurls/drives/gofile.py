@@ -2,163 +2,351 @@ import json
 import logging
 import os
 import re
+import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
-from hashlib import md5
-from typing import Optional, Dict, Tuple, List
+from typing import Optional, Tuple, List, Iterator, Callable
+from urllib.parse import unquote
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
-from tqdm import tqdm
 
-from .base import NetDriveDownloadSession, ResourceDownloadError, ResourceInvalidError
-from ..utils import get_requests_session, download_file
+from .base import NetDriveDownloadSession, SeparableNetDriveDownloadSession, \
+    StandaloneFileNetDriveDownloadSession, ResourceInvalidError
+from .batch import download_items
+from ..utils import get_requests_session, download_file, DiskCache
 
 
 class GoFileLinkInvalidError(ResourceInvalidError):
     pass
 
 
-@lru_cache()
-def _get_guest_profile_raw(magic):
-    _ = magic
-    session = get_requests_session()
-    resp = session.post('https://api.gofile.io/accounts')
-    resp.raise_for_status()
-    return resp.json()
+_CACHE = DiskCache('gofile')
+#: Seconds before a guest token is replaced by a new one.
+GOFILE_TOKEN_TTL = 60 * 60
+#: Seconds before the wt code is revalidated against ``alljs.js``.
+GOFILE_WT_TTL = 6 * 60 * 60
 
 
-@lru_cache()
-def _get_guest_profile():
-    # timeout: 60 * 60
-    return _get_guest_profile_raw(int(time.time() // (60 * 60)))
+def _create_guest_token(session: Optional[requests.Session] = None) -> str:
+    session = session or get_requests_session()
+    resp = session.post('https://api.gofile.io/accounts')
+    resp.raise_for_status()
+    return resp.json()['data']['token']
+
+
+class GoFileTokenPool:
+    def __init__(self, size: int = 1, ttl: float = GOFILE_TOKEN_TTL, cache: Optional[DiskCache] = _CACHE):
+        # the guest tokens are persisted, so short-lived processes do not create a new guest account each,
+        # and the folders are spread over `size` tokens in turn
+        self.size = size
+        self.ttl = ttl
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._tokens: List[Tuple[str, float]] = []
+        self._index = 0
+
+    def _alive(self) -> List[Tuple[str, float]]:
+        now = time.time()
+        self._tokens = [(token, expires) for token, expires in self._tokens if expires > now]
+        return self._tokens
+
+    def _sync(self):
+        # merge with the tokens created by the other processes
+        if self._cache is not None:
+            known = dict(self._tokens)
+            for token, expires in self._cache.get('tokens', []):
+                known[token] = max(expires, known.get(token, 0))
+            self._tokens = sorted(known.items(), key=lambda x: -x[1])
+        self._alive()
+
+    def _save(self):
+        if self._cache is not None and self._tokens:
+            self._cache.set('tokens', [list(item) for item in self._tokens],
+                            ttl=max(expires for _, expires in self._tokens) - time.time())
+
+    def acquire(self) -> str:
+        with self._lock:
+            if len(self._alive()) < self.size:
+                self._sync()
+            if len(self._tokens) < self.size:
+                token = _create_guest_token()
+                self._tokens.append((token, time.time() + self.ttl))
+                self._save()
+                return token
+
+            token, _ = self._tokens[self._index % len(self._tokens)]
+            self._index += 1
+            return token
+
+    def discard(self, token: str):
+        # e.g. the token is rejected by the server
+        with self._lock:
+            self._sync()
+            self._tokens = [(t, expires) for t, expires in self._tokens if t != token]
+            if self._cache is not None:
+                if self._tokens:
+                    self._save()
+                else:
+                    self._cache.delete('tokens')
+
+
+#: Environment variable of the number of pooled guest tokens.
+GOFILE_TOKENS_ENV = 'NETDRIVEURLS_GOFILE_TOKENS'
+
+
+def _get_token_pool_size() -> int:
+    # an invalid value should not break the import of all the drives
+    value = os.environ.get(GOFILE_TOKENS_ENV, '1')
+    try:
+        size = int(value)
+        if size < 1:
+            raise ValueError(f'size should be positive, but {size!r} found')
+    except ValueError as err:
+        logging.warning(f'Invalid ${GOFILE_TOKENS_ENV} {value!r}, 1 guest token is used instead - {err}.')
+        return 1
+    return size
+
+
+#: Pool of the guest tokens, set its ``size`` to spread the concurrent folder fetches over more guest accounts.
+gofile_token_pool = GoFileTokenPool(size=_get_token_pool_size())
 
 
 def _get_guest_token():
-    return _get_guest_profile()['data']['token']
-
-
-@lru_cache()
-def _get_wd_code():
-    session = get_requests_session()
-    resp = session.get('https://gofile.io/dist/js/alljs.js')
-    resp.raise_for_status()
-    raw_token = re.findall(r'\{\s*wt\s*:\s*(\S+?)\s*}', resp.text)[0]
-    return json.loads(raw_token)
+    return gofile_token_pool.acquire()
+
+
+_wt_lock = threading.Lock()
+_wt_memo: Optional[Tuple[str, float]] = None
+
+
+def _get_wd_code(session: Optional[requests.Session] = None) -> str:
+    global _wt_memo
+    with _wt_lock:
+        if _wt_memo is not None and _wt_memo[1] > time.time():
+            return _wt_memo[0]
+
+        entry = _CACHE.get_entry('wt')
+        if entry is not None and entry['expires'] > time.time():
+            _wt_memo = (entry['value'], entry['expires'])
+            return entry['value']
+
+        # revalidate the expired code, alljs.js is only downloaded and scanned again when it is changed
+        headers = {}
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        session = session or get_requests_session()
+        resp = session.get('https://gofile.io/dist/js/alljs.js', headers=headers)
+        if resp.status_code == 304 and entry is not None:
+            code = entry['value']
+            etag = resp.headers.get('ETag') or entry.get('etag')
+            last_modified = resp.headers.get('Last-Modified') or entry.get('last_modified')
+        else:
+            resp.raise_for_status()
+            raw_token = re.findall(r'\{\s*wt\s*:\s*(\S+?)\s*}', resp.text)[0]
+            code = json.loads(raw_token)
+            etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
 
+        _CACHE.set('wt', code, GOFILE_WT_TTL, etag=etag, last_modified=last_modified)
+        _wt_memo = (code, time.time() + GOFILE_WT_TTL)
+        return code
 
-def _extract_files(data) -> List[Tuple[Tuple[str, ...], str, int, str]]:
-    _id_to_node: Dict[str, dict] = {}
 
-    def _node_checkin(d):
-        _id_to_node[d['id']] = d
-        if d['type'] == 'folder':
-            for child in d['children'].values():
-                _node_checkin(child)
+_GoFileItem = Tuple[Tuple[str, ...], str, int, str]
 
-    _node_checkin(data)
 
-    _id_to_segs: Dict[str, Tuple[str, ...]] = {}
+def _iter_files(data, segs: Tuple[str, ...] = (),
+                on_folder: Optional[Callable[[str, Tuple[str, ...]], None]] = None) -> Iterator[_GoFileItem]:
+    # iterative walk, so deeply nested folders do not hit the recursion limit,
+    # and the stack only holds the unvisited siblings along the current path
+    if data['type'] == 'file':
+        yield (*segs, data['name']), data['link'], data['size'], data['md5']
+        return
 
-    def _get_node_segs(id_: str):
-        if id_ in _id_to_segs:
-            return _id_to_segs[id_]
+    stack = [(data, segs)]
+    while stack:
+        node, node_segs = stack.pop()
+        for child in node['children'].values():
+            if child['type'] == 'file':
+                yield (*node_segs, child['name']), child['link'], child['size'], child['md5']
+            elif isinstance(child.get('children'), dict):
+                stack.append((child, (*node_segs, child['name'])))
+            elif on_folder is not None:
+                # children of the sub folder are not inlined, it has to be fetched
+                on_folder(child['id'], (*node_segs, child['name']))
 
-        node_info = _id_to_node[id_]
-        if node_info.get('parentFolder'):
-            segs = (*_get_node_segs(node_info['parentFolder']), node_info['name'])
-        else:
-            if node_info['type'] == 'file':
-                segs = (node_info['name'],)
-            else:
-                segs = ()
-        _id_to_segs[id_] = segs
-        return segs
 
-    retval = []
-    for node in _id_to_node.values():
-        if node['type'] == 'file':
-            retval.append((_get_node_segs(node['id']), node['link'], node['size'], node['md5']))
-    retval = sorted(retval)
-    return retval
+def _extract_files(data) -> List[_GoFileItem]:
+    return sorted(_iter_files(data))
 
 
-def get_direct_urls_for_gofile_folder(
-        url: str, token: Optional[str] = None,
-        session: Optional[requests.Session] = None
-) -> List[Tuple[Tuple[str, ...], str, int, str]]:
-    session = session or get_requests_session()
-
+def _get_folder_id(url: str) -> str:
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:]) == ('gofile', 'io'), f'Unexpected host: {split.host!r}'
     assert tuple(split.path_segments[1:2]) == ('d',), f'Invalid url: {url!r}'
-    resource_id = split.path_segments[2]
+    return split.path_segments[2]
 
-    token = token or _get_guest_token()
+
+def _fetch_contents(url: str, resource_id: str, token: str, session: requests.Session) -> dict:
     resp = session.get(
         f'https://api.gofile.io/contents/{resource_id}',
-        params={'wt': _get_wd_code()},
+        params={'wt': _get_wd_code(session=session)},
         headers={'Authorization': f'Bearer {token}'}
     )
     resp.raise_for_status()
 
-    if resp.json()['status'] != 'ok':
+    data = resp.json()
+    if data['status'] != 'ok':
         raise GoFileLinkInvalidError(f'Resource not exist - {url!r}.')
-    return _extract_files(resp.json()['data'])
+    return data['data']
+
+
+def iter_direct_urls_for_gofile_folder(
+        url: str, token: Optional[str] = None,
+        session: Optional[requests.Session] = None, max_workers: int = 4,
+) -> Iterator[_GoFileItem]:
+    session = session or get_requests_session()
+    resource_id = _get_folder_id(url)
+    token = token or _get_guest_token()
+    # the root is fetched before returning, so an invalid link or rejected token is raised here
+    root = _fetch_contents(url, resource_id, token, session)
+
+    def _iter_all():
+        pending: List[Tuple[str, Tuple[str, ...]]] = []
+        in_flight = deque()
+
+        def _on_folder(folder_id, segs):
+            pending.append((folder_id, segs))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            try:
+                yield from _iter_files(root, on_folder=_on_folder)
+                while pending or in_flight:
+                    # the sub folders are fetched in parallel, the latest found first (depth-first),
+                    # so the pending ones stay proportional to the depth of the tree
+                    while pending and len(in_flight) < max_workers:
+                        folder_id, segs = pending.pop()
+                        in_flight.append((pool.submit(_fetch_contents, url, folder_id, token, session), segs))
+                    future, segs = in_flight.popleft()
+                    yield from _iter_files(future.result(), segs, on_folder=_on_folder)
+            finally:
+                for future, _ in in_flight:
+                    future.cancel()
 
+    return _iter_all()
 
-class GoFileFolderDownloadSession(NetDriveDownloadSession):
+
+def get_direct_urls_for_gofile_folder(
+        url: str, token: Optional[str] = None,
+        session: Optional[requests.Session] = None
+) -> List[_GoFileItem]:
+    return sorted(iter_direct_urls_for_gofile_folder(url, token=token, session=session))
+
+
+def _list_with_guest_token(url: str, session: Optional[requests.Session] = None):
+    # a guest token rejected by the server (e.g. expired earlier than expected) is replaced once
+    token = _get_guest_token()
+    try:
+        return token, iter_direct_urls_for_gofile_folder(url, token=token, session=session)
+    except requests.HTTPError as err:
+        if err.response is None or err.response.status_code != 401:
+            raise
+        logging.warning(f'Guest token rejected when listing {url!r}, retrying with a new one ...')
+        gofile_token_pool.discard(token)
+        token = _get_guest_token()
+        return token, iter_direct_urls_for_gofile_folder(url, token=token, session=session)
+
+
+def _download_gofile_file(url: str, dst_file: str, size: Optional[int], md5_expected: Optional[str],
+                          token: str, session: Optional[requests.Session] = None):
+    try:
+        download_file(url, filename=dst_file, expected_size=size,
+                      checksum=f'md5={md5_expected}' if md5_expected is not None else None,
+                      cookies={'accountToken': token}, session=session)
+    except Exception:
+        logging.exception(f'Error when downloading {url!r} to {dst_file!r} ...')
+        if os.path.exists(dst_file):
+            os.remove(dst_file)
+        raise
+
+
+class GoFileFileDownloadSession(StandaloneFileNetDriveDownloadSession):
+    def __init__(self, url: str, size: Optional[int] = None, md5_expected: Optional[str] = None,
+                 token: Optional[str] = None, segs: Optional[Tuple[str, ...]] = None):
+        StandaloneFileNetDriveDownloadSession.__init__(self)
+        self.page_url = url
+        self.size = size
+        self.md5_expected = md5_expected
+        # the token used when listing the folder, a guest token is acquired when not given
+        self.token = token
+        # path of the file inside its folder
+        self.segs = segs or (unquote(urlsplit(url).path_segments[-1]),)
+
+    def _get_resource_id(self) -> str:
+        return f'gofile_file_{urlsplit(self.page_url).path_segments[3]}'
+
+    @property
+    def filename(self) -> str:
+        return self.segs[-1]
+
+    def download_to_directory(self, dst_dir: str):
+        # the path inside the folder is kept, so the files of the same name in different sub folders are apart
+        dst_file = os.path.join(dst_dir, *self.segs)
+        os.makedirs(os.path.dirname(dst_file), exist_ok=True)
+        _download_gofile_file(self.page_url, dst_file, self.size, self.md5_expected,
+                              token=self.token or _get_guest_token())
+
+    def download_to_file(self, dst_file: str):
+        if os.path.dirname(dst_file):
+            os.makedirs(os.path.dirname(dst_file), exist_ok=True)
+        _download_gofile_file(self.page_url, dst_file, self.size, self.md5_expected,
+                              token=self.token or _get_guest_token())
+
+    @classmethod
+    def from_url(cls, url: str):
+        return cls(url)
+
+    @classmethod
+    def is_valid_url(cls, url: str) -> bool:
+        split = urlsplit(url)
+        return tuple(split.host.split('.')[-2:]) == ('gofile', 'io') and \
+            tuple(split.path_segments[1:3]) == ('download', 'web') and len(split.path_segments) >= 5
+
+
+class GoFileFolderDownloadSession(SeparableNetDriveDownloadSession):
     def __init__(self, url: str):
-        NetDriveDownloadSession.__init__(self)
+        SeparableNetDriveDownloadSession.__init__(self)
         self.page_url = url
 
     def _get_resource_id(self) -> str:
         return f'gofile_folder_{urlsplit(self.page_url).path_segments[2]}'
 
     def download_to_directory(self, dst_dir: str):
-        # TODO: maybe gofile should be seperated
         os.makedirs(dst_dir, exist_ok=True)
-        token = _get_guest_token()
         session = get_requests_session()
-        errors = []
-
-        all_items = get_direct_urls_for_gofile_folder(self.page_url, token=token, session=session)
-        pg = tqdm(total=len(all_items))
+        token, all_items = _list_with_guest_token(self.page_url, session=session)
 
         def _download_file(url, dst_file, size, md5_expected):
-            try:
-                download_file(url, filename=dst_file, expected_size=size,
-                              cookies={'accountToken': token}, session=session)
-                hash_obj = md5()
-                with open(dst_file, 'rb') as hash_f:
-                    # make sure the big files will not cause OOM
-                    while True:
-                        data = hash_f.read(1 << 20)
-                        if not data:
-                            break
-                        hash_obj.update(data)
-                assert md5_expected == hash_obj.hexdigest(), \
-                    f'MD5 not match, {md5_expected!r} expected, but {hash_obj.hexdigest()} found.'
-            except Exception as err:
-                logging.exception(f'Error when downloading {url!r} to {dst_file!r} ...')
-                errors.append(err)
-                if os.path.exists(dst_file):
-                    os.remove(dst_file)
-                raise
-            finally:
-                pg.update()
+            _download_gofile_file(url, dst_file, size, md5_expected, token=token, session=session)
 
-        tp = ThreadPoolExecutor(max_workers=12)
-        for segs, url, expected_size, expected_md5 in all_items:
-            dst_path = os.path.join(dst_dir, *segs)
-            tp.submit(_download_file, url, dst_path, expected_size, expected_md5)
-        tp.shutdown(wait=True)
+        # the files are downloaded while the sub folders are still being listed
+        download_items(
+            self.page_url,
+            ((url, os.path.join(dst_dir, *segs), expected_size, expected_md5)
+             for segs, url, expected_size, expected_md5 in all_items),
+            _download_file, size_of=lambda item: item[2], url_of=lambda item: item[0], session=session,
+        )
 
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+    def separate(self) -> List[NetDriveDownloadSession]:
+        session = get_requests_session()
+        token, all_items = _list_with_guest_token(self.page_url, session=session)
+        return [
+            GoFileFileDownloadSession(url, size=expected_size, md5_expected=expected_md5, token=token, segs=segs)
+            for segs, url, expected_size, expected_md5 in all_items
+        ]
 
     @classmethod
     def from_url(cls, url: str):
@@ -1,27 +1,26 @@
 import logging
 import os.path
-from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List
 from urllib.parse import urljoin
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
-from tqdm import tqdm
 
 from .base import StandaloneFileNetDriveDownloadSession, ResourceInvalidError, NetDriveDownloadSession, \
-    ResourceDownloadError, SeparableNetDriveDownloadSession
-from ..utils import get_requests_session, download_file
+    SeparableNetDriveDownloadSession
+from .batch import download_items
+from ..utils import get_requests_session, download_file, single_flight, global_http_cache, hedged_get
 
 
 class ImgBoxResourceInvalidError(ResourceInvalidError):
     pass
 
 
+@single_flight()
 def get_direct_url_for_imgbox(url: str, session: Optional[requests.Session] = None) -> str:
     session = session or get_requests_session()
-    resp = session.get(url)
+    resp = hedged_get(url, session=session)
     resp.raise_for_status()
 
     page = pq(resp.text)
@@ -32,11 +31,7 @@ def get_direct_url_for_imgbox(url: str, session: Optional[requests.Session] = No
         raise ImgBoxResourceInvalidError(f'No image url found for {url!r}.')
 
 
-def get_file_urls_for_imgbox(url: str, session: Optional[requests.Session] = None) -> List[str]:
-    session = session or get_requests_session()
-    resp = session.get(url)
-    resp.raise_for_status()
-
+def _parse_imgbox_gallery(resp: requests.Response) -> List[str]:
     page = pq(resp.text)
     retval = []
     for aitem in page('#gallery-view-content > a').items():
@@ -45,6 +40,12 @@ def get_file_urls_for_imgbox(url: str, session: Optional[requests.Session] = Non
     return retval
 
 
+@single_flight()
+def get_file_urls_for_imgbox(url: str, session: Optional[requests.Session] = None) -> List[str]:
+    session = session or get_requests_session()
+    return global_http_cache.fetch(url, _parse_imgbox_gallery, session=session)
+
+
 class ImgBoxImageDownloadSession(StandaloneFileNetDriveDownloadSession):
     def __init__(self, url: str):
         StandaloneFileNetDriveDownloadSession.__init__(self)
@@ -83,10 +84,7 @@ class ImgBoxGalleryDownloadSession(SeparableNetDriveDownloadSession):
 
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
-        errors = []
-
         all_items = get_file_urls_for_imgbox(self.page_url, session=session)
-        pg = tqdm(total=len(all_items))
 
         def _download_file(file_url):
             dst_file = None
@@ -96,23 +94,13 @@ class ImgBoxGalleryDownloadSession(SeparableNetDriveDownloadSession):
                 fid = urlsplit(file_url).path_segments[1]
                 dst_file = os.path.join(dst_dir, f'{fid}{ext}')
                 download_file(url, filename=dst_file, session=session)
-            except Exception as err:
+            except Exception:
                 logging.exception(f'Error when downloading {file_url!r} ...')
-                errors.append(err)
                 if dst_file and os.path.exists(dst_file):
                     os.remove(dst_file)
                 raise
-            finally:
-                pg.update()
-
-        tp = ThreadPoolExecutor(max_workers=12)
-        for furl in all_items:
-            tp.submit(_download_file, furl)
-        tp.shutdown(wait=True)
 
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+        download_items(self.page_url, [(furl,) for furl in all_items], _download_file)
 
     def separate(self) -> List[NetDriveDownloadSession]:
         session = get_requests_session()
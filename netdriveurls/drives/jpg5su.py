@@ -1,23 +1,21 @@
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, List
+from typing import Optional, List, Iterator, Tuple
 from urllib.parse import urljoin
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
-from tqdm import tqdm
 
-from .base import StandaloneFileNetDriveDownloadSession, NetDriveDownloadSession, ResourceDownloadError, \
-    SeparableNetDriveDownloadSession
-from ..utils import get_requests_session, download_file
+from .base import StandaloneFileNetDriveDownloadSession, NetDriveDownloadSession, SeparableNetDriveDownloadSession
+from .batch import download_items
+from ..utils import get_requests_session, download_file, single_flight, hedged_get
 
 
+@single_flight()
 def get_og_image_url(url: str, session: Optional[requests.Session] = None):
     session = session or get_requests_session()
-    resp = session.get(url)
+    resp = hedged_get(url, session=session)
     resp.raise_for_status()
 
     page = pq(resp.text)
@@ -33,14 +31,14 @@ def get_direct_url_for_jpg5su(url: str, session: Optional[requests.Session] = No
     return get_og_image_url(url, session=session)
 
 
-def get_file_urls_for_jpg5su(url: str, session: Optional[requests.Session] = None):
+def iter_file_urls_for_jpg5su(url: str, session: Optional[requests.Session] = None) \
+        -> Iterator[Tuple[str, str]]:
     split = urlsplit(url)
     assert tuple(split.host.split('.')[-2:]) in {('jpg5', 'su'), ('jpg4', 'su')}, f'Invalid host: {split.host!r}'
     assert tuple(split.path_segments[1:2]) == ('a',), f'Invalid path: {url!r}'
 
     session = session or get_requests_session()
     next_url = url
-    retval = []
     while True:
         resp = session.get(next_url)
         resp.raise_for_status()
@@ -49,14 +47,21 @@ def get_file_urls_for_jpg5su(url: str, session: Optional[requests.Session] = Non
             a = item('.list-item-desc-title > a')
             title = a.text().strip()
             url = urljoin(resp.url, a.attr('href'))
-            retval.append((title, url))
+            yield title, url
 
         if page('a[data-pagination="next"]').attr('href'):
             next_url = urljoin(resp.url, page('a[data-pagination="next"]').attr('href'))
         else:
             break
 
-    return retval
+
+@single_flight()
+def get_file_urls_for_jpg5su(url: str, session: Optional[requests.Session] = None) -> List[Tuple[str, str]]:
+    split = urlsplit(url)
+    assert tuple(split.host.split('.')[-2:]) in {('jpg5', 'su'), ('jpg4', 'su')}, f'Invalid host: {split.host!r}'
+    assert tuple(split.path_segments[1:2]) == ('a',), f'Invalid path: {url!r}'
+
+    return list(iter_file_urls_for_jpg5su(url, session=session))
 
 
 class JPG5SuFileDownloadSession(StandaloneFileNetDriveDownloadSession):
@@ -99,35 +104,23 @@ class JPG5SuAlbumDownloadSession(SeparableNetDriveDownloadSession):
 
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
-        errors = []
-
-        all_items = get_file_urls_for_jpg5su(self.page_url, session=session)
-        pg = tqdm(total=len(all_items))
+        # the pages are listed lazily, while the items of the former pages are being downloaded
+        all_items = iter_file_urls_for_jpg5su(self.page_url, session=session)
 
-        def _download_file(file_url, title):
+        def _download_file(title, file_url):
             dst_file = None
             try:
                 url = get_direct_url_for_jpg5su(file_url, session=session)
                 _, ext = os.path.splitext(urlsplit(url).filename.lower())
                 dst_file = os.path.join(dst_dir, f'{title}{ext}')
                 download_file(url, filename=dst_file, session=session)
-            except Exception as err:
+            except Exception:
                 logging.exception(f'Error when downloading {file_url!r} ...')
-                errors.append(err)
                 if dst_file and os.path.exists(dst_file):
                     os.remove(dst_file)
                 raise
-            finally:
-                pg.update()
-
-        tp = ThreadPoolExecutor(max_workers=12)
-        for title, furl in all_items:
-            tp.submit(_download_file, furl, title)
-        tp.shutdown(wait=True)
 
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+        download_items(self.page_url, all_items, _download_file)
 
     def separate(self) -> List[NetDriveDownloadSession]:
         session = get_requests_session()
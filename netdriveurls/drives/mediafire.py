@@ -1,7 +1,9 @@
 import logging
 import os
 import re
+from typing import Optional, Tuple
 
+import requests
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
 
@@ -13,9 +15,11 @@ class MediaFireLinkInvalidError(ResourceInvalidError):
     pass
 
 
-def get_direct_url_and_filename_for_mediafire(url: str):
+def open_direct_response_for_mediafire(url: str, session: Optional[requests.Session] = None) \
+        -> Tuple[str, str, requests.Response]:
+    # the response of the direct url is returned still open, so it can be downloaded without another request
     origin_url = url
-    sess = get_requests_session()
+    sess = session or get_requests_session()
 
     while True:
         res = sess.get(url, stream=True)
@@ -29,10 +33,20 @@ def get_direct_url_and_filename_for_mediafire(url: str):
             raise MediaFireLinkInvalidError(f"Permission denied: {origin_url!r}\n"
                                             f"Maybe you need to change permission over 'Anyone with the link'?")
 
-    m = re.search(
-        'filename="(.*)"', res.headers['Content-Disposition']
-    )
-    filename = m.groups()[0].encode('iso8859').decode('utf-8')
+    try:
+        m = re.search(
+            'filename="(.*)"', res.headers['Content-Disposition']
+        )
+        filename = m.groups()[0].encode('iso8859').decode('utf-8')
+    except BaseException:
+        res.close()
+        raise
+    return url, filename, res
+
+
+def get_direct_url_and_filename_for_mediafire(url: str, session: Optional[requests.Session] = None):
+    url, filename, res = open_direct_response_for_mediafire(url, session=session)
+    res.close()
     return url, filename
 
 
@@ -46,12 +60,17 @@ class MediaFireDownloadSession(StandaloneFileNetDriveDownloadSession):
         return f'mediafire_{id_}'
 
     def download_to_directory(self, dst_dir: str):
-        url, filename = get_direct_url_and_filename_for_mediafire(self.page_url)
-        os.makedirs(dst_dir, exist_ok=True)
-        dst_filename = os.path.join(dst_dir, filename)
-        if os.path.dirname(dst_filename):
-            os.makedirs(os.path.dirname(dst_filename), exist_ok=True)
-        download_file(url, filename=dst_filename)
+        session = get_requests_session()
+        url, filename, response = open_direct_response_for_mediafire(self.page_url, session=session)
+        try:
+            os.makedirs(dst_dir, exist_ok=True)
+            dst_filename = os.path.join(dst_dir, filename)
+            if os.path.dirname(dst_filename):
+                os.makedirs(os.path.dirname(dst_filename), exist_ok=True)
+        except BaseException:
+            response.close()
+            raise
+        download_file(url, filename=dst_filename, session=session, response=response)
         return dst_dir
 
     @classmethod
@@ -1,24 +1,23 @@
+import logging
 import os.path
-from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 from typing import Optional, List, Tuple
 from urllib.parse import urljoin
 
 import requests
-from hbutils.string import plural_word
 from hbutils.system import urlsplit
 from pyquery import PyQuery as pq
-from tqdm import tqdm
 
 from netdriveurls.drives import NetDriveDownloadSession
-from .base import ResourceInvalidError, StandaloneFileNetDriveDownloadSession, SeparableNetDriveDownloadSession, \
-    ResourceDownloadError
-from ..utils import get_requests_session, download_file
+from .base import ResourceInvalidError, StandaloneFileNetDriveDownloadSession, SeparableNetDriveDownloadSession
+from .batch import download_items
+from ..utils import get_requests_session, download_file, single_flight, global_http_cache, hedged_get
 
 
+@single_flight()
 def get_direct_url_from_postimg_image(url: str, session: Optional[requests.Session] = None) -> str:
     session = session or get_requests_session()
-    resp = session.get(url)
+    resp = hedged_get(url, session=session)
     resp.raise_for_status()
 
     page = pq(resp.text)
@@ -29,11 +28,7 @@ def get_direct_url_from_postimg_image(url: str, session: Optional[requests.Sessi
         raise ResourceInvalidError(f'No url found for {url!r}.')
 
 
-def get_file_urls_from_postimg_gallery(url: str, session: Optional[requests.Session] = None) -> List[Tuple[str, str]]:
-    session = session or get_requests_session()
-    resp = session.get(url)
-    resp.raise_for_status()
-
+def _parse_postimg_gallery(resp: requests.Response) -> List[Tuple[str, str]]:
     page = pq(resp.text)
     retval = []
     for item in page('#thumb-list > [data-image]').items():
@@ -47,6 +42,12 @@ def get_file_urls_from_postimg_gallery(url: str, session: Optional[requests.Sess
     return retval
 
 
+@single_flight()
+def get_file_urls_from_postimg_gallery(url: str, session: Optional[requests.Session] = None) -> List[Tuple[str, str]]:
+    session = session or get_requests_session()
+    return [tuple(item) for item in global_http_cache.fetch(url, _parse_postimg_gallery, session=session)]
+
+
 class PostImgImageDownloadSession(StandaloneFileNetDriveDownloadSession):
     def __init__(self, url):
         StandaloneFileNetDriveDownloadSession.__init__(self)
@@ -85,34 +86,21 @@ class PostImgGalleryDownloadSession(SeparableNetDriveDownloadSession):
 
     def download_to_directory(self, dst_dir: str):
         session = get_requests_session()
-        errors = []
-
         all_items = get_file_urls_from_postimg_gallery(self.page_url, session=session)
-        pg = tqdm(total=len(all_items))
 
-        def _download_file(file_url, filename):
+        def _download_file(filename, file_url):
             dst_file = None
             try:
                 url = get_direct_url_from_postimg_image(file_url, session=session)
                 dst_file = os.path.join(dst_dir, filename)
                 download_file(url, filename=dst_file, session=session)
-            except Exception as err:
+            except Exception:
                 logging.exception(f'Error when downloading {file_url!r} ...')
-                errors.append(err)
                 if dst_file and os.path.exists(dst_file):
                     os.remove(dst_file)
                 raise
-            finally:
-                pg.update()
 
-        tp = ThreadPoolExecutor(max_workers=12)
-        for fn, furl in all_items:
-            tp.submit(_download_file, furl, fn)
-        tp.shutdown(wait=True)
-
-        if errors:
-            raise ResourceDownloadError(f'{plural_word(len(errors), "error")} found '
-                                        f'when downloading {self.page_url!r} in total.')
+        download_items(self.page_url, all_items, _download_file)
 
     def separate(self) -> List[NetDriveDownloadSession]:
         session = get_requests_session()
@@ -133,7 +121,5 @@ class PostImgGalleryDownloadSession(SeparableNetDriveDownloadSession):
 
 
 if __name__ == '__main__':
-    from ditk import logging
-
-    logging.try_init_root(logging.DEBUG)
+    logging.basicConfig(level=logging.DEBUG)
     pprint(get_file_urls_from_postimg_gallery('https://postimg.cc/gallery/xkCyy22'))
@@ -1,6 +1,8 @@
 from .dispatch import hfutilcli
+from .download import _add_download_subcommand
 
 _DECORATORS = [
+    _add_download_subcommand,
 ]
 
 cli = hfutilcli
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+from typing import Optional
+
+import click
+from hbutils.scale import size_to_bytes
+
+from .base import CONTEXT_SETTINGS, command_wrap
+from ..drives import from_url, batch_config, FAIL_FAST_POLICIES, BatchDownloadError
+from ..utils import TimingsCollector, set_progress_mode, global_bandwidth, low_speed_scope, global_concurrency, \
+    DiskCache
+
+
+def _add_download_subcommand(cli: click.Group) -> click.Group:
+    @cli.command('download', help='Download the resources of net drive urls to a local directory.',
+                 context_settings=CONTEXT_SETTINGS)
+    @click.argument('urls', type=str, nargs=-1, required=True)
+    @click.option('-o', '--output-dir', 'output_dir', type=click.Path(file_okay=False), default='.',
+                  help='Directory to save the downloaded files.', show_default=True)
+    @click.option('--timings', 'timings', is_flag=True, type=bool, default=False,
+                  help='Report the DNS, connect, TLS, TTFB and transfer timings per host.')
+    @click.option('--progress', 'progress', type=click.Choice(['tqdm', 'logging', 'json', 'silent']),
+                  default='tqdm', help='Output of the download progress.', show_default=True)
+    @click.option('--max-in-flight', 'max_in_flight', type=int, default=None,
+                  help='Maximum number of album items submitted at the same time. (default: twice the workers)')
+    @click.option('--byte-budget', 'byte_budget', type=str, default=None,
+                  help='Maximum total size of the album items downloaded at the same time, such as 2GiB. '
+                       '(default: unlimited)')
+    @click.option('--fail-fast', 'fail_fast', type=click.Choice(list(FAIL_FAST_POLICIES)), default='never',
+                  help='Cancel the pending items of an album when one item fails, '
+                       '`fatal` only cancels on errors like expired links or revoked tokens.', show_default=True)
+    @click.option('--retry-rounds', 'retry_rounds', type=int, default=1,
+                  help='Rounds of retrying the transiently failed items of an album at the end.', show_default=True)
+    @click.option('--limit-rate', 'limit_rate', type=str, default=None,
+                  help='Maximum total download speed per second, such as 10MiB. (default: unlimited)')
+    @click.option('--job-timeout', 'job_timeout', type=float, default=None,
+                  help='Seconds to download each album, the unfinished items fail afterwards. (default: unlimited)')
+    @click.option('--file-timeout', 'file_timeout', type=float, default=None,
+                  help='Seconds to resolve and download each item of an album, retries included. '
+                       '(default: unlimited)')
+    @click.option('--low-speed-limit', 'low_speed_limit', type=str, default=None,
+                  help='Speed per second under which a transfer is reconnected and continued, such as 10KiB, '
+                       '0 disables it. (default: 1KiB)')
+    @click.option('--low-speed-time', 'low_speed_time', type=float, default=None,
+                  help='Seconds a transfer has to stay under the low-speed limit to be reconnected. (default: 30)')
+    @click.option('--adaptive-concurrency', 'adaptive', is_flag=True, type=bool, default=False,
+                  help='Adapt the concurrency of each host to its latency and errors instead of a fixed number '
+                       'of workers, the learned limits are kept for the next runs.')
+    @command_wrap()
+    def download(urls, output_dir: str, timings: bool, progress: str,
+                 max_in_flight: Optional[int], byte_budget: Optional[str], fail_fast: str, retry_rounds: int,
+                 limit_rate: Optional[str], job_timeout: Optional[float], file_timeout: Optional[float],
+                 low_speed_limit: Optional[str], low_speed_time: Optional[float], adaptive: bool):
+        set_progress_mode(progress)
+        if limit_rate:
+            global_bandwidth.set_rate(size_to_bytes(limit_rate))
+        if adaptive:
+            global_concurrency.cache = DiskCache('concurrency')
+        collector = TimingsCollector().attach() if timings else None
+        try:
+            with batch_config(max_in_flight=max_in_flight, fail_fast=fail_fast, retry_rounds=retry_rounds,
+                              byte_budget=size_to_bytes(byte_budget) if byte_budget else None,
+                              job_timeout=job_timeout, file_timeout=file_timeout, adaptive=adaptive), \
+                    low_speed_scope(size_to_bytes(low_speed_limit) if low_speed_limit else None, low_speed_time):
+                for url in urls:
+                    session = from_url(url)
+                    click.echo(f'Downloading {session!r} to {output_dir!r} ...', err=True)
+                    os.makedirs(output_dir, exist_ok=True)
+                    try:
+                        session.download_to_directory(output_dir)
+                    except BatchDownloadError as err:
+                        click.echo(json.dumps(err.summary.to_json(), indent=4), err=True)
+                        raise
+        finally:
+            if collector is not None:
+                collector.detach()
+                click.echo(collector.format_report(), file=sys.stderr)
+
+    return cli
@@ -2,4 +2,4 @@ from .base import GenericResolver, StandaloneResolver, URLRecognizableError, URL
 from .cyberdrop import CyberDropEResolver, CyberDropDirectResolver
 from .dispatch import resolve_url, resolve_url_all, is_resolvable, register_resolver
 from .dropbox import DropBoxSHResolver, DropBoxSResolver
-from .redirect import url_redirect
+from .redirect import url_redirect, redirect_hop, RedirectMemo, redirect_memo, MAX_REDIRECTS
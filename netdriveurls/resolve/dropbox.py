@@ -1,18 +1,16 @@
-from urllib.parse import urljoin
-
 from hbutils.system import urlsplit
 
-from .base import StandaloneResolver
-from ..utils import get_requests_session
+from .base import StandaloneResolver, URLUnresolvableError
+from .redirect import redirect_hop
 
 
 class DropBoxSResolver(StandaloneResolver):
     @classmethod
     def resolve(cls, url: str) -> str:
-        session = get_requests_session()
-        resp = session.head(url)
-        resp.raise_for_status()
-        return urljoin(resp.url, resp.headers['Location'])
+        location = redirect_hop(url)
+        if location is None:
+            raise URLUnresolvableError(f'No redirection found for {url!r}.')
+        return location
 
     @classmethod
     def is_solvable(cls, url: str) -> bool:
@@ -24,10 +22,10 @@ class DropBoxSResolver(StandaloneResolver):
 class DropBoxSHResolver(StandaloneResolver):
     @classmethod
     def resolve(cls, url: str) -> str:
-        session = get_requests_session()
-        resp = session.head(url)
-        resp.raise_for_status()
-        return urljoin(resp.url, resp.headers['Location'])
+        location = redirect_hop(url)
+        if location is None:
+            raise URLUnresolvableError(f'No redirection found for {url!r}.')
+        return location
 
     @classmethod
     def is_solvable(cls, url: str) -> bool:
@@ -1,17 +1,114 @@
-from typing import Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from urllib.parse import urljoin
 
 import requests
 
 from ..utils import get_requests_session
 
+#: Max redirect hops followed by :func:`url_redirect`, same as the default of requests.
+MAX_REDIRECTS = 30
+
+_PERMANENT_STATUSES = (301, 308)
+
+
+def _hop_ttl(resp: requests.Response) -> float:
+    # seconds the redirect can be reused, permanent redirects are kept forever unless told otherwise
+    cache_control = resp.headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0.0
+    m = re.search(r'(?:^|[\s,])max-age\s*=\s*"?(\d+)', cache_control)
+    if m:
+        return float(m.group(1))
+    return float('inf') if resp.status_code in _PERMANENT_STATUSES else 0.0
+
+
+class RedirectMemo:
+    """
+    Thread-safe LRU memo of the redirect hops, from the url to its ``Location``.
+
+    :param maxsize: Max number of hops kept, the least recently used ones are dropped first. (default: ``4096``)
+    :type maxsize: int
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def get(self, url: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(url)
+            if item is None:
+                return None
+            location, expires = item
+            if expires <= time.monotonic():
+                del self._items[url]
+                return None
+            self._items.move_to_end(url)
+            return location
+
+    def set(self, url: str, location: str, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._items[url] = (location, time.monotonic() + ttl)
+            self._items.move_to_end(url)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+#: Process-wide memo used by :func:`url_redirect` and the redirect based resolvers.
+redirect_memo = RedirectMemo()
+
+
+def redirect_hop(url: str, session: Optional[requests.Session] = None,
+                 memo: Optional[RedirectMemo] = None) -> Optional[str]:
+    """
+    Get where the url redirects to in one hop, ``None`` when it is not a redirect.
+    The hops are memorized according to their status code and ``Cache-Control``.
+
+    :param url: Url to request.
+    :type url: str
+    :param session: Session to use. (default: :func:`netdriveurls.utils.get_requests_session`)
+    :type session: Optional[requests.Session]
+    :param memo: Memo of the hops. (default: :data:`redirect_memo`)
+    :type memo: Optional[RedirectMemo]
+    """
+    memo = redirect_memo if memo is None else memo
+    location = memo.get(url)
+    if location is not None:
+        return location
 
-def url_redirect(url: str, session: Optional[requests.Session] = None) -> str:
     session = session or get_requests_session()
-    while True:
-        resp = session.head(url, allow_redirects=False)
-        if resp.status_code // 100 == 3:
-            url = urljoin(resp.url, resp.headers['Location'])
-        else:
-            resp.raise_for_status()
-            return resp.url
+    resp = session.head(url, allow_redirects=False)
+    if resp.status_code // 100 == 3 and 'Location' in resp.headers:
+        location = urljoin(resp.url, resp.headers['Location'])
+        memo.set(url, location, _hop_ttl(resp))
+        return location
+    else:
+        resp.raise_for_status()
+        return None
+
+
+def url_redirect(url: str, session: Optional[requests.Session] = None,
+                 memo: Optional[RedirectMemo] = None, max_redirects: int = MAX_REDIRECTS) -> str:
+    session = session or get_requests_session()
+    for _ in range(max_redirects + 1):
+        location = redirect_hop(url, session=session, memo=memo)
+        if location is None:
+            return url
+        url = location
+
+    raise requests.TooManyRedirects(f'Exceeded {max_redirects} redirects when resolving {url!r}.')
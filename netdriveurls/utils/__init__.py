@@ -1,2 +1,26 @@
-from .download import download_file
-from .session import get_random_ua, get_random_mobile_ua, TimeoutHTTPAdapter, get_requests_session
+from .aria2 import Aria2Error, Aria2Backend
+from .bandwidth import TokenBucket, BandwidthLimiter, global_bandwidth, bandwidth_job, get_bandwidth_job
+from .cache import CACHE_DIR_ENV, get_cache_dir, DiskCache
+from .cancel import DownloadCancelledError, CancelToken, get_cancel_token, cancel_scope
+from .concurrency import CONCURRENCY_TTL, AdaptiveConcurrency, global_concurrency
+from .deadline import DeadlineExceededError, Deadline, get_deadline, deadline_scope
+from .dns import DNS_CACHE_TTL_ENV, DNS_CACHE_TTL, DNSCache, global_dns_cache
+from .download import TransferBackend, set_transfer_backend, get_transfer_backend, transfer_backend_scope, \
+    download_file
+from .hedge import HedgePolicy, global_hedge_policy, hedged_get
+from .hooks import EVENTS, EventHooks, global_hooks, register_hook, unregister_hook, emit_event, has_listeners
+from .httpx_adapter import HTTPXAdapter
+from .httpcache import HTTP_CACHE_TTL, HTTPCache, global_http_cache
+from .metrics import MetricsCollector, LatencyHistogram, TimingsCollector
+from .progress import ProgressSnapshot, ProgressSink, TqdmProgressSink, LoggingProgressSink, JsonProgressSink, \
+    ProgressAggregator, set_progress_mode, get_current_progress, progress_scope
+from .retry_budget import RetryBudget, global_retry_budget
+from .session import get_random_ua, get_random_mobile_ua, TimeoutHTTPAdapter, get_requests_session, HookedRetry, \
+    get_session_hooks, prewarm_connections
+from .stall import LOW_SPEED_LIMIT, LOW_SPEED_TIME, StalledTransferError, LowSpeedMonitor, get_low_speed_limit, \
+    low_speed_scope
+from .singleflight import RELEVANT_HEADERS, request_key, SingleFlight, global_singleflight, single_flight
+from .timing import RequestTimings, get_response_timings
+from .transport import TRANSPORT_ENV, ClientRaw, ClientAdapter, register_transport, set_transport, get_transport, \
+    get_host_transports, create_transport_adapter
+from .curl_adapter import PycurlAdapter
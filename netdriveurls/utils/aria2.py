@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+from typing import Optional, Dict, Callable
+
+import requests
+
+from .cancel import CancelToken, DownloadCancelledError
+from .deadline import get_deadline
+from .download import TransferBackend
+
+
+class Aria2Error(requests.exceptions.RequestException):
+    """
+    Error reported by aria2, or by its JSON-RPC interface.
+
+    :param message: Message of the error.
+    :type message: str
+    :param code: Error code of aria2 (see the exit status of aria2c), or of the JSON-RPC error.
+    :type code: Optional[int]
+    """
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        requests.exceptions.RequestException.__init__(self, message)
+        self.code = code
+
+
+#: Errors of aria2 mapped to the ones raised by the requests session, by the error codes of aria2.
+_ERROR_TYPES = {
+    2: requests.exceptions.Timeout,  # time out
+    3: requests.exceptions.HTTPError,  # resource not found
+    4: requests.exceptions.HTTPError,  # too many "resource not found"
+    5: requests.exceptions.ReadTimeout,  # speed too slow
+    6: requests.exceptions.ConnectionError,  # network problem
+    9: OSError,  # not enough disk space
+    13: OSError,  # file already existed
+    14: OSError,  # renaming file failed
+    15: OSError,  # could not open existing file
+    16: OSError,  # could not create new file
+    17: OSError,  # file I/O error
+    18: OSError,  # could not create directory
+    19: requests.exceptions.ConnectionError,  # name resolution failed
+    22: requests.exceptions.HTTPError,  # bad response header
+    23: requests.exceptions.TooManyRedirects,
+    24: requests.exceptions.HTTPError,  # authorization failed
+    29: requests.exceptions.HTTPError,  # server overloaded
+    32: requests.exceptions.HTTPError,  # checksum validation failed
+}
+
+#: HTTP statuses of the errors of aria2, attached as the responses of the raised errors, so they are classified
+#: in the same way as the ones of the requests session (e.g. a 404 is fatal to the other items of an album).
+_ERROR_STATUSES = {
+    3: 404,  # resource not found
+    4: 404,  # too many "resource not found"
+    24: 401,  # authorization failed
+    29: 503,  # server overloaded
+}
+
+#: Names of the hash algorithms used by aria2, the others are the same as in hashlib.
+_ARIA2_HASHES = {'sha1': 'sha-1', 'sha224': 'sha-224', 'sha256': 'sha-256', 'sha384': 'sha-384',
+                 'sha512': 'sha-512'}
+
+
+def _to_aria2_checksum(checksum: str) -> str:
+    algorithm, digest = checksum.split('=', 1)
+    algorithm = algorithm.lower()
+    return f'{_ARIA2_HASHES.get(algorithm, algorithm)}={digest.lower()}'
+
+
+def _remove_partial(path: Optional[str]):
+    if path is not None:
+        for file in (path, f'{path}.aria2'):
+            if os.path.exists(file):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+
+
+class Aria2Backend(TransferBackend):
+    """
+    Transfer backend submitting the downloads to an `aria2 <https://aria2.github.io/>`_ daemon over JSON-RPC,
+    so the bytes are moved by aria2's multi-connection engine while the urls are still resolved by
+    netdriveurls. The daemon is started separately, e.g. ``aria2c --enable-rpc --rpc-secret=xxx``.
+
+    The headers, the cookies, the output path and the checksum are submitted with each download, the expected
+    size is checked against the length reported by aria2, and the errors of aria2 are raised as the ones of
+    requests (e.g. ``HTTPError`` when the resource is not found). The partial files of the failed or cancelled
+    downloads are removed, the control files of aria2 included. The bandwidth limits of netdriveurls do not
+    apply, use the options of aria2 instead.
+
+    Example:
+    ```python
+    with transfer_backend_scope(Aria2Backend(secret='xxx')):
+        from_url('https://bunkr.si/a/xxxxxxxx').download_to_directory('dst')
+    ```
+
+    :param rpc_url: Url of the JSON-RPC interface. (default: ``http://127.0.0.1:6800/jsonrpc``)
+    :type rpc_url: str
+    :param secret: Secret of the interface, set with ``--rpc-secret``. (default: None)
+    :type secret: Optional[str]
+    :param options: Options of each download, added to :attr:`DEFAULT_OPTIONS`. (default: None)
+    :type options: Optional[Dict[str, str]]
+    :param poll_interval: Seconds between the status checks. (default: ``0.5``)
+    :type poll_interval: float
+    :param session: Session of the RPC requests. (default: a new plain session)
+    :type session: Optional[requests.Session]
+    """
+
+    #: Options of each download, the files are split into 8 connections.
+    DEFAULT_OPTIONS = {
+        'split': '8',
+        'max-connection-per-server': '8',
+        'min-split-size': '1M',
+        'allow-overwrite': 'true',
+        'auto-file-renaming': 'false',
+    }
+
+    def __init__(self, rpc_url: str = 'http://127.0.0.1:6800/jsonrpc', secret: Optional[str] = None,
+                 options: Optional[Dict[str, str]] = None, poll_interval: float = 0.5,
+                 session: Optional[requests.Session] = None):
+        self.rpc_url = rpc_url
+        self.secret = secret
+        self.options = {**self.DEFAULT_OPTIONS, **dict(options or {})}
+        self.poll_interval = poll_interval
+        self._session = session or requests.Session()
+
+    def call(self, method: str, *params):
+        """
+        Call a method of the JSON-RPC interface, e.g. ``call('aria2.getVersion')``.
+
+        :raises Aria2Error: If the call fails.
+        """
+        if self.secret is not None:
+            params = (f'token:{self.secret}', *params)
+        payload = {'jsonrpc': '2.0', 'id': uuid.uuid4().hex, 'method': method, 'params': list(params)}
+        try:
+            resp = self._session.post(self.rpc_url, json=payload, timeout=30)
+            data = resp.json()
+        except (requests.RequestException, ValueError) as err:
+            raise Aria2Error(f'Failed to call {method!r} of aria2 at {self.rpc_url!r} - {err!r}.')
+        if data.get('error'):
+            raise Aria2Error(f'Failed to call {method!r} of aria2 - {data["error"].get("message")}.',
+                             code=data['error'].get('code'))
+        return data['result']
+
+    def _raise_error(self, url: str, status: dict):
+        code = int(status.get('errorCode') or 1)
+        message = f'aria2 failed to download {url!r} - {status.get("errorMessage") or "unknown error"} ' \
+                  f'(code {code}).'
+        error_type = _ERROR_TYPES.get(code)
+        if error_type is None:
+            raise Aria2Error(message, code=code)
+        elif code in _ERROR_STATUSES:
+            response = requests.Response()
+            response.status_code = _ERROR_STATUSES[code]
+            response.url = url
+            raise error_type(message, response=response)
+        raise error_type(message)
+
+    def _cleanup(self, gid: str, remove: bool):
+        try:
+            if remove:
+                self.call('aria2.forceRemove', gid)
+            self.call('aria2.removeDownloadResult', gid)
+        except Aria2Error:
+            pass
+
+    def transfer(self, url: str, filename: Optional[str], output_directory: Optional[str],
+                 headers: dict, expected_size: Optional[int] = None, checksum: Optional[str] = None,
+                 cancel_token: Optional[CancelToken] = None,
+                 on_progress: Optional[Callable[[int], None]] = None) -> str:
+        options = dict(self.options)
+        if filename is not None:
+            options['dir'] = os.path.dirname(os.path.abspath(filename))
+            options['out'] = os.path.basename(filename)
+        else:
+            options['dir'] = os.path.abspath(output_directory or '.')
+        options['header'] = [f'{key}: {value}' for key, value in headers.items()]
+        if checksum is not None:
+            options['checksum'] = _to_aria2_checksum(checksum)
+        os.makedirs(options['dir'], exist_ok=True)
+
+        deadline = get_deadline()
+        gid = self.call('aria2.addUri', [url], options)
+        path = os.path.join(options['dir'], options['out']) if 'out' in options else None
+        finished, completed = False, 0
+        try:
+            while True:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                if deadline is not None:
+                    deadline.raise_if_expired()
+                status = self.call('aria2.tellStatus', gid, ['status', 'totalLength', 'completedLength',
+                                                             'errorCode', 'errorMessage', 'files'])
+                files = status.get('files') or []
+                if files and files[0].get('path'):
+                    path = files[0]['path']
+                done = int(status.get('completedLength') or 0)
+                if on_progress is not None and done > completed:
+                    on_progress(done - completed)
+                completed = max(completed, done)
+
+                total = int(status.get('totalLength') or 0)
+                if expected_size is not None and total and total != expected_size:
+                    # known from the response headers, the rest of the file is not waited for
+                    raise requests.exceptions.HTTPError(f"Downloaded file is not of expected size, "
+                                                        f"{expected_size} expected but {total} found.")
+                if status['status'] == 'complete':
+                    finished = True
+                    if expected_size is not None and done != expected_size:
+                        raise requests.exceptions.HTTPError(f"Downloaded file is not of expected size, "
+                                                            f"{expected_size} expected but {done} found.")
+                    break
+                elif status['status'] == 'error':
+                    finished = True
+                    self._raise_error(url, status)
+                elif status['status'] == 'removed':
+                    finished = True
+                    raise DownloadCancelledError(f'Download of {url!r} removed from aria2.')
+                time.sleep(self.poll_interval)
+        except BaseException:
+            # like the requests backend, the partial file and the control file of aria2 are not left behind
+            self._cleanup(gid, remove=not finished)
+            _remove_partial(path)
+            raise
+
+        self._cleanup(gid, remove=False)
+        return path
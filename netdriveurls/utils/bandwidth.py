@@ -0,0 +1,211 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Hashable
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, consuming more than available puts it into debt, which the caller sleeps off.
+
+    :param rate: Tokens added per second, ``None`` means unlimited.
+    :type rate: Optional[float]
+    :param burst: Seconds of tokens which can be accumulated when idle. (default: 0.25)
+    :type burst: float
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: float = 0.25):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self.burst = burst
+        self._tokens = 0.0
+        self._last_time = time.monotonic()
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: Optional[float]):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            if rate is None:
+                self._tokens = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate is not None:
+            self._tokens = min(self._tokens + (now - self._last_time) * self._rate, self._rate * self.burst)
+        self._last_time = now
+
+    def reserve(self, n: int) -> float:
+        """
+        Consume the tokens and return the seconds to wait before using them.
+        """
+        with self._lock:
+            if self._rate is None:
+                return 0.0
+            self._refill()
+            self._tokens -= n
+            return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+    def consume(self, n: int):
+        wait = self.reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _ShareGroup:
+    # rates of the active members are shared from the total rate according to their weights,
+    # so the share of an idle member is given to the others
+    def __init__(self):
+        self.weights: Dict[Hashable, float] = {}
+        self.active: Dict[Hashable, int] = {}
+        self.buckets: Dict[Hashable, TokenBucket] = {}
+
+    def rebalance(self, rate: Optional[float]):
+        total_weight = sum(self.weights.get(key, 1.0) for key in self.active)
+        for key, bucket in self.buckets.items():
+            bucket.rate = None if rate is None else rate * self.weights.get(key, 1.0) / total_weight
+
+    def enter(self, key: Hashable, rate: Optional[float]) -> TokenBucket:
+        self.active[key] = self.active.get(key, 0) + 1
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket()
+        self.rebalance(rate)
+        return self.buckets[key]
+
+    def leave(self, key: Hashable, rate: Optional[float]):
+        self.active[key] -= 1
+        if not self.active[key]:
+            del self.active[key]
+            del self.buckets[key]
+        self.rebalance(rate)
+
+
+class BandwidthLimiter:
+    """
+    Bandwidth limiter with a global cap, shared by the active jobs and the active hosts according to
+    their weights. A job or host with weight 2 gets twice the bandwidth of one with weight 1 while both are
+    downloading, and the share of an idle one goes to the others. Everything can be adjusted at runtime.
+
+    Example:
+    ```python
+    global_bandwidth.set_rate(10 * 1024 ** 2)  # 10 MiB/s in total
+    global_bandwidth.set_host_weight('gofile.io', 3.0)
+    with bandwidth_job('priority', weight=4.0):
+        ...  # download something
+    ```
+
+    :param rate: Global cap in bytes per second, ``None`` means unlimited.
+    :type rate: Optional[float]
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._global = TokenBucket(rate)
+        self._jobs = _ShareGroup()
+        self._hosts = _ShareGroup()
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    @property
+    def limited(self) -> bool:
+        return self._rate is not None
+
+    def set_rate(self, rate: Optional[float]):
+        """
+        Set the global cap in bytes per second, ``None`` means unlimited.
+        """
+        with self._lock:
+            self._rate = rate
+            self._global.rate = rate
+            self._jobs.rebalance(rate)
+            self._hosts.rebalance(rate)
+
+    def set_job_weight(self, job: Hashable, weight: float):
+        with self._lock:
+            self._jobs.weights[job] = weight
+            self._jobs.rebalance(self._rate)
+
+    def set_host_weight(self, host: str, weight: float):
+        with self._lock:
+            self._hosts.weights[host] = weight
+            self._hosts.rebalance(self._rate)
+
+    @contextmanager
+    def job(self, job: Hashable, weight: Optional[float] = None):
+        """
+        Mark the job as active during the context, its transfers share the job's part of the bandwidth.
+        """
+        with self._lock:
+            if weight is not None:
+                self._jobs.weights[job] = weight
+            bucket = self._jobs.enter(job, self._rate)
+        try:
+            yield bucket
+        finally:
+            with self._lock:
+                self._jobs.leave(job, self._rate)
+
+    @contextmanager
+    def transfer(self, host: Optional[str] = None, job: Optional[Hashable] = None):
+        """
+        Mark the host as active during one transfer, and yield the function to call with each chunk's size,
+        which returns the seconds it waited.
+        """
+        with self._lock:
+            host_bucket = self._hosts.enter(host, self._rate)
+            job_bucket = self._jobs.buckets.get(job) if job is not None else None
+
+        def _consume(n: int) -> float:
+            if self._rate is not None:
+                buckets = (self._global, job_bucket, host_bucket)
+                # the buckets refill in parallel, so the waits are overlapped instead of added up
+                wait = max(bucket.reserve(n) for bucket in buckets if bucket is not None)
+                if wait > 0:
+                    time.sleep(wait)
+                    return wait
+            return 0.0
+
+        try:
+            yield _consume
+        finally:
+            with self._lock:
+                self._hosts.leave(host, self._rate)
+
+
+#: Process-wide limiter used by :func:`netdriveurls.utils.download_file`, unlimited by default.
+global_bandwidth = BandwidthLimiter()
+
+_current_job = ContextVar('bandwidth_job', default=None)
+
+
+def get_bandwidth_job() -> Optional[Hashable]:
+    return _current_job.get()
+
+
+@contextmanager
+def bandwidth_job(job: Hashable, weight: Optional[float] = None, limiter: Optional[BandwidthLimiter] = None):
+    """
+    Run the downloads in the context as one job of the limiter, sharing its part of the bandwidth.
+
+    :param job: Name of the job.
+    :type job: Hashable
+    :param weight: Weight of the job, the former weight or ``1.0`` is used when not given.
+    :type weight: Optional[float]
+    :param limiter: Limiter to use. (default: :data:`global_bandwidth`)
+    :type limiter: Optional[BandwidthLimiter]
+    """
+    limiter = limiter or global_bandwidth
+    with limiter.job(job, weight):
+        token = _current_job.set(job)
+        try:
+            yield job
+        finally:
+            _current_job.reset(token)
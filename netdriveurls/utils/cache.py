@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Any
+
+#: Environment variable of the cache directory.
+CACHE_DIR_ENV = 'NETDRIVEURLS_CACHE_DIR'
+
+
+def get_cache_dir() -> str:
+    """
+    Get the directory of the on-disk caches, which is ``$NETDRIVEURLS_CACHE_DIR`` if set,
+    otherwise ``~/.cache/netdriveurls``.
+    """
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'netdriveurls')
+
+
+class DiskCache:
+    """
+    Small json cache on the disk, shared by the processes of the same user.
+
+    Each entry has its value, its expiry time and optional metadata (e.g. the ETag used to revalidate it).
+    The file is replaced atomically on every write, so concurrent processes never read a broken file,
+    and the last writer wins. Broken or unreadable files are treated as empty.
+
+    :param name: Name of the cache file, without extension.
+    :type name: str
+    :param directory: Directory of the cache file. (default: :func:`get_cache_dir`)
+    :type directory: Optional[str]
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self._directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self._directory or get_cache_dir(), f'{self.name}.json')
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _dump(self, data: dict):
+        path = self.path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=f'.{self.name}.', dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError:
+            # the cache is only an optimization, a read-only home should not break the downloads
+            logging.warning(f'Failed to write cache file {path!r}.', exc_info=True)
+
+    def get_entry(self, key: str) -> Optional[dict]:
+        """
+        Get the entry with ``value``, ``expires`` and the metadata, even if it is expired.
+        """
+        with self._lock:
+            entry = self._load().get(key)
+        return entry if isinstance(entry, dict) and 'value' in entry else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get the value if it is not expired.
+        """
+        entry = self.get_entry(key)
+        if entry is None or entry.get('expires', 0) <= time.time():
+            return default
+        return entry['value']
+
+    def set(self, key: str, value: Any, ttl: float, **meta):
+        """
+        Set the value, which expires after ``ttl`` seconds.
+        """
+        with self._lock:
+            data = self._load()
+            data[key] = {**meta, 'value': value, 'expires': time.time() + ttl}
+            self._dump(data)
+
+    def delete(self, key: str):
+        with self._lock:
+            data = self._load()
+            if key in data:
+                del data[key]
+                self._dump(data)
+
+    def clear(self):
+        """
+        Remove the cache file with all its entries.
+        """
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logging.warning(f'Failed to remove cache file {self.path!r}.', exc_info=True)
@@ -0,0 +1,101 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DownloadCancelledError(Exception):
+    """
+    Raised when a download is stopped because its :class:`CancelToken` is cancelled.
+    """
+    pass
+
+
+class CancelToken:
+    """
+    Thread-safe cancellation flag shared by the threads of a job.
+
+    A token with a parent is also cancelled when its parent is, so one album can be stopped without
+    affecting the others, while stopping the whole job stops all its albums.
+
+    :param parent: Parent token. (default: None)
+    :type parent: Optional[CancelToken]
+    """
+
+    def __init__(self, parent: Optional['CancelToken'] = None):
+        self.parent = parent
+        self._event = threading.Event()
+        self._reason: Optional[str] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def reason(self) -> Optional[str]:
+        if self._event.is_set():
+            return self._reason
+        return self.parent.reason if self.parent is not None else None
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """
+        The error which caused the cancellation, if any.
+        """
+        if self._event.is_set():
+            return self._error
+        return self.parent.error if self.parent is not None else None
+
+    def cancel(self, reason: str = 'cancelled', error: Optional[BaseException] = None) -> bool:
+        """
+        Cancel this token, only the first cancellation's reason is kept.
+
+        :param reason: Reason of the cancellation.
+        :type reason: str
+        :param error: The error which caused the cancellation.
+        :type error: Optional[BaseException]
+        :returns: ``True`` if this call cancelled the token, ``False`` if it was already cancelled.
+        :rtype: bool
+        """
+        if self._event.is_set():
+            return False
+        self._reason, self._error = reason, error
+        self._event.set()
+        return True
+
+    def raise_if_cancelled(self):
+        """
+        :raises DownloadCancelledError: If the token is cancelled.
+        """
+        if self.cancelled:
+            raise DownloadCancelledError(f'Download cancelled - {self.reason}.')
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} cancelled: {self.cancelled!r}, reason: {self.reason!r}>'
+
+
+_current_token = ContextVar('cancel_token', default=None)
+
+
+def get_cancel_token() -> Optional[CancelToken]:
+    """
+    Get the cancel token of the current context, set by :func:`cancel_scope`.
+    """
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken] = None):
+    """
+    Use a cancel token in the current context, the downloads inside stop as soon as it is cancelled.
+
+    :param token: Token to use, a child of the current token is created if not given.
+    :type token: Optional[CancelToken]
+    """
+    token = token or CancelToken(parent=_current_token.get())
+    ctx_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(ctx_token)
@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Callable, Deque, List
+
+from .cache import DiskCache
+
+#: Seconds the learned concurrency of a host is kept on the disk.
+CONCURRENCY_TTL = 7 * 24 * 60 * 60
+
+
+class _HostState:
+    __slots__ = ('limit', 'in_flight', 'waiters', 'baseline', 'elapsed', 'last_decrease', 'saved_limit')
+
+    def __init__(self, limit: float, baseline: Optional[float] = None):
+        self.limit = limit
+        self.in_flight = 0
+        # callbacks of acquire_then waiting for a slot, in order
+        self.waiters: Deque[Callable[[], None]] = deque()
+        # lowest cost per item seen recently (seconds per byte when the sizes are known), rising slowly
+        self.baseline = baseline
+        # smoothed seconds per item
+        self.elapsed: Optional[float] = None
+        self.last_decrease = 0.0
+        self.saved_limit = int(limit)
+
+
+class AdaptiveConcurrency:
+    """
+    Per-host concurrency limits adapted with AIMD, shared by all the jobs of the process.
+
+    The limit of a host grows by ``increase`` per ``limit`` items finished while it is fully used and the cost
+    of the items (the seconds per byte, or the seconds per item when the sizes are unknown) stays within
+    ``tolerance`` times its lowest recent cost. It is multiplied by ``decrease`` when the host is overloaded
+    (e.g. 429, 5xx, timeouts), at most once per item duration, so a burst of failures only cuts it once.
+
+    Example:
+    ```python
+    concurrency = AdaptiveConcurrency(cache=DiskCache('concurrency'))  # remember the limits between runs
+    concurrency.acquire('pixeldrain.com')
+    try:
+        ...  # download the item
+    finally:
+        concurrency.release('pixeldrain.com', elapsed=12.5, size=1 << 20)
+    ```
+
+    :param initial: Limit of the unknown hosts. (default: ``4``)
+    :type initial: float
+    :param min_limit: Min limit of the hosts. (default: ``1``)
+    :type min_limit: float
+    :param max_limit: Max limit of the hosts. (default: ``32``)
+    :type max_limit: float
+    :param increase: Additive increase per ``limit`` successful items. (default: ``1``)
+    :type increase: float
+    :param decrease: Multiplicative decrease on overload. (default: ``0.5``)
+    :type decrease: float
+    :param tolerance: Growth of the cost per item over the baseline still considered flat. (default: ``2``)
+    :type tolerance: float
+    :param cooldown: Min seconds between two decreases. (default: ``1``)
+    :type cooldown: float
+    :param cache: Cache persisting the limits between runs, ``None`` keeps them in memory only. (default: None)
+    :type cache: Optional[DiskCache]
+    :param ttl: Seconds the persisted limits are kept. (default: :data:`CONCURRENCY_TTL`)
+    :type ttl: float
+    """
+
+    def __init__(self, initial: float = 4, min_limit: float = 1, max_limit: float = 32, increase: float = 1.0,
+                 decrease: float = 0.5, tolerance: float = 2.0, cooldown: float = 1.0,
+                 cache: Optional[DiskCache] = None, ttl: float = CONCURRENCY_TTL):
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.cooldown = cooldown
+        self.cache = cache
+        self.ttl = ttl
+        self._cond = threading.Condition()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        if host not in self._hosts:
+            saved = self.cache.get(host) if self.cache is not None else None
+            if isinstance(saved, dict):
+                limit = min(max(float(saved.get('limit', self.initial)), self.min_limit), self.max_limit)
+                self._hosts[host] = _HostState(limit, saved.get('baseline'))
+            else:
+                self._hosts[host] = _HostState(min(max(self.initial, self.min_limit), self.max_limit))
+        return self._hosts[host]
+
+    def limit(self, host: str) -> int:
+        """
+        Current number of the concurrent items allowed for the host.
+        """
+        with self._cond:
+            return max(int(self._state(host).limit), 1)
+
+    def acquire(self, host: str):
+        """
+        Wait until the host is under its limit, and take one of its slots.
+        """
+        with self._cond:
+            state = self._state(host)
+            self._cond.wait_for(lambda: not state.waiters and state.in_flight < max(int(state.limit), 1))
+            state.in_flight += 1
+
+    def acquire_then(self, host: str, callback: Callable[[], None]):
+        """
+        Take one of the host's slots without waiting, and call the callback once it is taken, at once when
+        the host is under its limit, otherwise in the thread giving back a slot. The callbacks waiting for
+        the same host are called in order, before the blocking :meth:`acquire`.
+
+        :param host: Host of the item.
+        :type host: str
+        :param callback: Function to call with the slot taken, e.g. submitting the item, it should not block.
+        :type callback: Callable[[], None]
+        """
+        with self._cond:
+            state = self._state(host)
+            state.waiters.append(callback)
+            ready = self._take_waiters(state)
+        for fn in ready:
+            fn()
+
+    def _take_waiters(self, state: _HostState) -> List[Callable[[], None]]:
+        ready = []
+        while state.waiters and state.in_flight < max(int(state.limit), 1):
+            state.in_flight += 1
+            ready.append(state.waiters.popleft())
+        return ready
+
+    def release(self, host: str, elapsed: Optional[float] = None, size: Optional[int] = None,
+                overloaded: bool = False):
+        """
+        Give back the slot of a finished item, and adapt the limit of the host.
+
+        :param host: Host of the item.
+        :type host: str
+        :param elapsed: Seconds of the successful item, ``None`` if it failed or does not tell anything.
+        :type elapsed: Optional[float]
+        :param size: Size of the item, if known.
+        :type size: Optional[int]
+        :param overloaded: The item failed because the host is overloaded, e.g. 429, 5xx or timeouts.
+        :type overloaded: bool
+        """
+        with self._cond:
+            state = self._state(host)
+            saturated = state.in_flight >= int(state.limit)
+            state.in_flight -= 1
+            if overloaded:
+                now = time.monotonic()
+                if now - state.last_decrease >= max(self.cooldown, state.elapsed or 0.0):
+                    state.limit = max(state.limit * self.decrease, self.min_limit)
+                    state.last_decrease = now
+            elif elapsed is not None:
+                state.elapsed = elapsed if state.elapsed is None else state.elapsed * 0.8 + elapsed * 0.2
+                cost = elapsed / size if size else elapsed
+                if state.baseline is None or cost < state.baseline:
+                    state.baseline = cost
+                else:
+                    state.baseline += (cost - state.baseline) * 0.01
+                # only grow when the limit is actually reached, otherwise it says nothing about the host
+                if saturated and cost <= state.baseline * self.tolerance:
+                    state.limit = min(state.limit + self.increase / state.limit, self.max_limit)
+            ready = self._take_waiters(state)
+            self._cond.notify_all()
+            changed = int(state.limit) != state.saved_limit
+            if changed:
+                state.saved_limit = int(state.limit)
+            record = {'limit': state.limit, 'baseline': state.baseline}
+
+        for fn in ready:
+            fn()
+        if changed and self.cache is not None:
+            self.cache.set(host, record, self.ttl)
+
+    def to_json(self) -> dict:
+        with self._cond:
+            return {host: {'limit': state.limit, 'in_flight': state.in_flight, 'waiting': len(state.waiters)}
+                    for host, state in sorted(self._hosts.items())}
+
+    def reset(self):
+        with self._cond:
+            self._hosts = {host: state for host, state in self._hosts.items() if state.in_flight or state.waiters}
+            ready = []
+            for state in self._hosts.values():
+                state.limit = min(max(self.initial, self.min_limit), self.max_limit)
+                ready.extend(self._take_waiters(state))
+            self._cond.notify_all()
+        for fn in ready:
+            fn()
+
+
+#: Process-wide limits used by :func:`netdriveurls.drives.download_items` when adaptive concurrency is enabled.
+global_concurrency = AdaptiveConcurrency()
@@ -0,0 +1,266 @@
+import math
+import os
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+import requests
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, select_proxy
+
+from .timing import RequestTimings
+from .transport import ClientAdapter, ClientRaw, HOP_BY_HOP_HEADERS
+
+
+def _import_pycurl():
+    try:
+        import pycurl
+    except ImportError:  # pragma: no cover
+        raise ImportError('pycurl is required by the pycurl transport, '
+                          'please install it with `pip install netdriveurls[pycurl]`.')
+    return pycurl
+
+
+class CurlError(Exception):
+    """
+    Error of libcurl, with its error code as ``errno``.
+    """
+
+    def __init__(self, errno: int, message: str, headers_received: bool = False, connected: bool = False):
+        Exception.__init__(self, errno, message)
+        self.errno = errno
+        self.message = message
+        self.headers_received = headers_received
+        self.connected = connected
+
+
+class _CurlHandle:
+    # an easy handle with its own multi handle, which keeps the connections between the transfers
+    def __init__(self):
+        pycurl = _import_pycurl()
+        self.curl = pycurl.Curl()
+        self.multi = pycurl.CurlMulti()
+
+    def close(self):
+        self.multi.close()
+        self.curl.close()
+
+
+class _CurlTransfer:
+    # one transfer driven through the multi interface, so the body is read only when it is consumed
+    def __init__(self, handle: _CurlHandle, on_finished):
+        self.handle = handle
+        self._on_finished = on_finished
+        self.chunks = deque()
+        self.status: Optional[int] = None
+        self.reason = ''
+        self.http_version = ''
+        self.headers: List[Tuple[str, str]] = []
+        self.headers_done = False
+        self.finished = False
+        self.error: Optional[CurlError] = None
+
+    def on_header(self, line: bytes):
+        line = line.decode('iso-8859-1').rstrip('\r\n')
+        if line.startswith('HTTP/'):
+            # a new response, e.g. after ``100 Continue``
+            parts = line.split(' ', 2)
+            self.http_version, self.status = parts[0], int(parts[1])
+            self.reason = parts[2] if len(parts) > 2 else ''
+            self.headers = []
+        elif not line:
+            if self.status is not None and not 100 <= self.status < 200:
+                self.headers_done = True
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            self.headers.append((key.strip(), value.strip()))
+
+    def start(self):
+        self.handle.multi.add_handle(self.handle.curl)
+
+    def pump(self):
+        pycurl = _import_pycurl()
+        multi = self.handle.multi
+        while True:
+            ret, active = multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+        if not active:
+            _, _, failed = multi.info_read()
+            if failed:
+                _, errno, message = failed[0]
+                connected = self.handle.curl.getinfo(pycurl.CONNECT_TIME) > 0
+                self.error = CurlError(errno, message, headers_received=self.headers_done, connected=connected)
+            self.headers_done = True
+            self.finish()
+        elif not self.chunks:
+            multi.select(0.2)
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.handle.multi.remove_handle(self.handle.curl)
+            self._on_finished(self.handle)
+
+
+class _CurlRaw(ClientRaw):
+    def __init__(self, transfer: _CurlTransfer, timings: Optional[RequestTimings]):
+        ClientRaw.__init__(self, transfer.status, transfer.headers, reason=transfer.reason,
+                           http_version=transfer.http_version, timings=timings)
+        self._transfer = transfer
+
+    def _iter_chunks(self, chunk_size: int):
+        transfer = self._transfer
+        while True:
+            while transfer.chunks:
+                yield transfer.chunks.popleft()
+            if transfer.finished:
+                break
+            transfer.pump()
+
+        if transfer.error is not None:
+            if transfer.error.errno == _import_pycurl().E_OPERATION_TIMEDOUT:
+                raise requests.exceptions.ConnectionError(transfer.error)
+            raise requests.exceptions.ChunkedEncodingError(transfer.error)
+
+    def release_conn(self):
+        # an unfinished transfer is aborted, its connection is dropped by libcurl
+        self._transfer.finish()
+
+
+class PycurlAdapter(ClientAdapter):
+    """
+    Adapter sending the requests with `pycurl <http://pycurl.io/>`_, whose libcurl transfers are lighter on
+    the CPU than ``iter_content`` of urllib3 for bulk downloads. The connections are kept by the idle curl
+    handles and reused by the later requests of the adapter.
+
+    The timeouts, the retries (the same ``max_retries`` as :class:`TimeoutHTTPAdapter`), the events and the
+    phase timings work in the same way. The read timeout is approximated by libcurl's low speed limit
+    (less than 1 byte per second during the timeout).
+
+    Requires the ``pycurl`` extra (``pip install netdriveurls[pycurl]``).
+
+    Example:
+    ```python
+    set_transport('pycurl')
+    session = get_requests_session()
+    ```
+    """
+
+    def __init__(self, *args, **kwargs):
+        _import_pycurl()
+        super().__init__(*args, **kwargs)
+        self._handles_lock = threading.Lock()
+        self._idle_handles: List[_CurlHandle] = []
+
+    @property
+    def retryable_errors(self):
+        return CurlError,
+
+    def _to_requests_error(self, err: Exception, request: requests.PreparedRequest) -> requests.RequestException:
+        pycurl = _import_pycurl()
+        if isinstance(err, CurlError):
+            if err.errno == pycurl.E_OPERATION_TIMEDOUT:
+                if err.connected:
+                    return requests.exceptions.ReadTimeout(err, request=request)
+                else:
+                    return requests.exceptions.ConnectTimeout(err, request=request)
+            elif err.errno in (pycurl.E_SSL_CONNECT_ERROR, pycurl.E_PEER_FAILED_VERIFICATION,
+                               pycurl.E_SSL_CACERT_BADFILE):
+                return requests.exceptions.SSLError(err, request=request)
+        return requests.exceptions.ConnectionError(err, request=request)
+
+    def _acquire(self) -> _CurlHandle:
+        with self._handles_lock:
+            if self._idle_handles:
+                return self._idle_handles.pop()
+        return _CurlHandle()
+
+    def _release(self, handle: _CurlHandle):
+        with self._handles_lock:
+            self._idle_handles.append(handle)
+
+    def _setup(self, curl, transfer: _CurlTransfer, request, timeout, verify, cert, proxies):
+        pycurl = _import_pycurl()
+        curl.reset()
+        curl.setopt(pycurl.URL, request.url)
+        curl.setopt(pycurl.NOSIGNAL, 1)
+        curl.setopt(pycurl.FOLLOWLOCATION, 0)
+        curl.setopt(pycurl.WRITEFUNCTION, transfer.chunks.append)
+        curl.setopt(pycurl.HEADERFUNCTION, transfer.on_header)
+
+        headers = [f'{key}: {value}' for key, value in request.headers.items()
+                   if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() != 'accept-encoding']
+        if 'accept-encoding' in {key.lower() for key in request.headers}:
+            # let libcurl decode the body, as urllib3 does
+            curl.setopt(pycurl.ACCEPT_ENCODING, '')
+        curl.setopt(pycurl.HTTPHEADER, [*headers, 'Expect:'])
+
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        if body is not None and not isinstance(body, bytes):
+            body = b''.join(body) if not hasattr(body, 'read') else body.read()
+        if request.method == 'HEAD':
+            curl.setopt(pycurl.NOBODY, 1)
+        elif request.method == 'GET' and not body:
+            curl.setopt(pycurl.HTTPGET, 1)
+        else:
+            curl.setopt(pycurl.POSTFIELDSIZE, len(body or b''))
+            curl.setopt(pycurl.COPYPOSTFIELDS, body or b'')
+            curl.setopt(pycurl.CUSTOMREQUEST, request.method)
+
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+        if connect_timeout is not None:
+            curl.setopt(pycurl.CONNECTTIMEOUT_MS, max(int(connect_timeout * 1000), 1))
+        if read_timeout is not None:
+            curl.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+            curl.setopt(pycurl.LOW_SPEED_TIME, max(int(math.ceil(read_timeout)), 1))
+
+        if verify is False:
+            curl.setopt(pycurl.SSL_VERIFYPEER, 0)
+            curl.setopt(pycurl.SSL_VERIFYHOST, 0)
+        else:
+            ca_path = verify if isinstance(verify, str) else DEFAULT_CA_BUNDLE_PATH
+            curl.setopt(pycurl.CAPATH if os.path.isdir(ca_path) else pycurl.CAINFO, ca_path)
+        if cert:
+            cert_file, key_file = cert if isinstance(cert, tuple) else (cert, None)
+            curl.setopt(pycurl.SSLCERT, cert_file)
+            if key_file:
+                curl.setopt(pycurl.SSLKEY, key_file)
+        # the proxies are selected by requests, from the arguments and the environment
+        curl.setopt(pycurl.PROXY, select_proxy(request.url, proxies) or '')
+
+    def _timings(self, curl) -> RequestTimings:
+        pycurl = _import_pycurl()
+        dns = curl.getinfo(pycurl.NAMELOOKUP_TIME)
+        connect = curl.getinfo(pycurl.CONNECT_TIME)
+        app_connect = curl.getinfo(pycurl.APPCONNECT_TIME)
+        pre_transfer = curl.getinfo(pycurl.PRETRANSFER_TIME)
+        start_transfer = curl.getinfo(pycurl.STARTTRANSFER_TIME)
+        return RequestTimings(
+            dns=dns, connect=max(connect - dns, 0.0), tls=max(app_connect - connect, 0.0) if app_connect else 0.0,
+            ttfb=max(start_transfer - pre_transfer, 0.0), reused=curl.getinfo(pycurl.NUM_CONNECTS) == 0,
+        )
+
+    def _open(self, request, timeout, verify, cert, proxies) -> ClientRaw:
+        handle = self._acquire()
+        transfer = _CurlTransfer(handle, self._release)
+        try:
+            self._setup(handle.curl, transfer, request, timeout, verify, cert, proxies)
+            transfer.start()
+            while not transfer.headers_done:
+                transfer.pump()
+        except BaseException:
+            transfer.finish()
+            raise
+        if transfer.error is not None and not transfer.chunks and transfer.status is None:
+            raise transfer.error
+        return _CurlRaw(transfer, self._timings(handle.curl))
+
+    def close(self):
+        super().close()
+        with self._handles_lock:
+            handles, self._idle_handles = self._idle_handles, []
+        for handle in handles:
+            handle.close()
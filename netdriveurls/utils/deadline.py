@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import requests
+
+
+class DeadlineExceededError(requests.exceptions.Timeout):
+    """
+    Raised when the deadline of the current job or file is reached, while resolving or transferring.
+    """
+    pass
+
+
+class Deadline:
+    """
+    Point in time by which the work has to be finished.
+
+    :param seconds: Seconds from now.
+    :type seconds: float
+    :param parent: Deadline of the enclosing work, the earlier one of both is effective.
+    :type parent: Optional[Deadline]
+    """
+
+    def __init__(self, seconds: float, parent: Optional['Deadline'] = None):
+        self.expires_at = time.monotonic() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    def remaining(self) -> float:
+        """
+        Seconds left, ``0`` once expired.
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def raise_if_expired(self):
+        """
+        :raises DeadlineExceededError: If the deadline is reached.
+        """
+        if self.expired:
+            raise DeadlineExceededError('Deadline exceeded.')
+
+    def clamp_timeout(self, timeout):
+        """
+        Clamp a requests timeout (a number or a ``(connect, read)`` tuple) to the remaining time.
+        """
+        remaining = self.remaining()
+        if isinstance(timeout, tuple):
+            return tuple(remaining if value is None else min(value, remaining) for value in timeout)
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} remaining: {self.remaining():.3f}s>'
+
+
+_current_deadline = ContextVar('deadline', default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    """
+    Get the deadline of the current context, set by :func:`deadline_scope`.
+    """
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Finish the work in the context within the given seconds, the requests inside have their timeouts clamped
+    to the remaining time, stop retrying when the next attempt cannot start in time, and raise
+    :class:`DeadlineExceededError` once it is reached. The transfers stop at their next chunk.
+
+    Nested scopes cannot extend the deadline of the enclosing one, e.g. a per-file deadline inside
+    a per-job deadline.
+
+    Example:
+    ```python
+    with deadline_scope(600):  # the whole album
+        with deadline_scope(60):  # one of its files, resolution and transfer
+            ...
+    ```
+
+    :param seconds: Seconds from now, ``None`` keeps the current deadline.
+    :type seconds: Optional[float]
+    """
+    if seconds is None:
+        yield _current_deadline.get()
+        return
+
+    deadline = Deadline(seconds, parent=_current_deadline.get())
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
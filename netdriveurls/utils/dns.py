@@ -0,0 +1,101 @@
+import ipaddress
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple, Optional
+
+from .singleflight import SingleFlight
+
+#: Environment variable of the seconds the resolved addresses are kept, ``0`` disables the cache.
+DNS_CACHE_TTL_ENV = 'NETDRIVEURLS_DNS_TTL'
+#: Seconds the resolved addresses are kept by default.
+DNS_CACHE_TTL = 300
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return False
+    else:
+        return True
+
+
+class DNSCache:
+    """
+    In-process cache of the resolved addresses, shared by all the sessions. The CDN hosts of the net drives
+    often change from one file to another, so each new connection would otherwise pay its own lookup.
+    The concurrent lookups of the same host are coalesced into one.
+
+    ``getaddrinfo`` does not tell the TTLs of the records, so the addresses are kept for a fixed time,
+    and dropped earlier with :meth:`invalidate` when none of them can be connected.
+
+    :param ttl: Seconds the addresses are kept, ``None`` means :data:`DNS_CACHE_TTL` or ``$NETDRIVEURLS_DNS_TTL``. \
+        ``0`` disables the cache. (default: None)
+    :type ttl: Optional[float]
+    :param maxsize: Max number of the hosts kept, the least recently used ones are dropped. (default: ``1024``)
+    :type maxsize: int
+    """
+
+    def __init__(self, ttl: Optional[float] = None, maxsize: int = 1024):
+        self._ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return float(os.environ.get(DNS_CACHE_TTL_ENV, DNS_CACHE_TTL))
+
+    def resolve(self, host: str, port: int) -> List[Tuple]:
+        """
+        Resolve the host into the address infos used to open TCP connections, like ``socket.getaddrinfo``.
+        """
+        ttl = self.ttl
+        if ttl <= 0 or _is_ip_address(host):
+            return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+        key = (host.lower(), port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        address_infos = self._flight.do(key, socket.getaddrinfo, host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, address_infos)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return address_infos
+
+    def invalidate(self, host: str):
+        """
+        Drop the addresses of the host, e.g. when none of them can be connected.
+        """
+        host = host.lower()
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == host]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+#: Process-wide cache used by the connections of :class:`netdriveurls.utils.TimeoutHTTPAdapter`.
+global_dns_cache = DNSCache()
@@ -1,12 +1,25 @@
+import hashlib
 import os
 import sys
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable
+from urllib.parse import urlsplit
 
 import pyrfc6266
 import requests
 from tqdm.auto import tqdm
+from urllib3 import HTTPResponse
+from urllib3.exceptions import ProtocolError, DecodeError, ReadTimeoutError, SSLError
 
-from .session import get_requests_session
+from .bandwidth import BandwidthLimiter, global_bandwidth, get_bandwidth_job
+from .cancel import CancelToken, get_cancel_token
+from .deadline import get_deadline
+from .hooks import EventHooks, emit_event, has_listeners
+from .progress import ProgressAggregator, get_current_progress
+from .session import get_requests_session, get_session_hooks
+from .stall import LowSpeedMonitor, get_low_speed_limit
 
 
 class _FakeClass:
@@ -14,20 +27,240 @@ class _FakeClass:
         pass
 
 
+class _AggregatedBar:
+    def __init__(self, progress: ProgressAggregator):
+        self.progress = progress
+
+    def update(self, n):
+        self.progress.update_bytes(n)
+
+
 @contextmanager
-def _with_tqdm(expected_size, desc, silent: bool = False):
-    with open(os.devnull, 'w') as of_:
+def _with_tqdm(expected_size, desc, silent: bool = False, progress: Optional[ProgressAggregator] = None):
+    if progress is not None:
+        # the bytes are reported to the shared progress, which is refreshed by its own thread
+        yield _AggregatedBar(progress)
+    elif silent:
+        yield _FakeClass()
+    else:
         with tqdm(total=expected_size, unit='B', unit_scale=True,
-                  unit_divisor=1024, file=of_ if silent else sys.stderr, desc=desc) as pbar:
+                  unit_divisor=1024, file=sys.stderr, desc=desc) as pbar:
             yield pbar
 
 
+class TransferBackend:
+    """
+    External engine moving the bytes of :func:`download_file`, while the urls, the headers and the cookies
+    are still resolved by netdriveurls. Use it with :func:`transfer_backend_scope` or
+    :func:`set_transfer_backend`.
+    """
+
+    def transfer(self, url: str, filename: Optional[str], output_directory: Optional[str],
+                 headers: dict, expected_size: Optional[int] = None, checksum: Optional[str] = None,
+                 cancel_token: Optional[CancelToken] = None,
+                 on_progress: Optional[Callable[[int], None]] = None) -> str:
+        """
+        Download the url and return the path of the file.
+
+        :param url: Direct url of the file.
+        :type url: str
+        :param filename: Path of the file, the backend names it (e.g. from ``Content-Disposition``) when not given.
+        :type filename: Optional[str]
+        :param output_directory: Directory of the file when filename is not given.
+        :type output_directory: Optional[str]
+        :param headers: Headers of the request, the cookies of the session included.
+        :type headers: dict
+        :param expected_size: Expected size of the file.
+        :type expected_size: Optional[int]
+        :param checksum: Expected checksum as ``<algorithm>=<hex digest>``, e.g. ``md5=...``.
+        :type checksum: Optional[str]
+        :param cancel_token: Token stopping the transfer when cancelled.
+        :type cancel_token: Optional[CancelToken]
+        :param on_progress: Called with the number of the newly downloaded bytes.
+        :type on_progress: Optional[Callable[[int], None]]
+        :returns: Path of the downloaded file.
+        :rtype: str
+        """
+        raise NotImplementedError  # pragma: no cover
+
+
+_default_backend: Optional[TransferBackend] = None
+_current_backend = ContextVar('transfer_backend', default=None)
+
+
+def set_transfer_backend(backend: Optional[TransferBackend]):
+    """
+    Set the default transfer backend of the process, ``None`` means downloading with the requests session.
+    """
+    global _default_backend
+    _default_backend = backend
+
+
+def get_transfer_backend() -> Optional[TransferBackend]:
+    """
+    Get the transfer backend of the current context, set by :func:`transfer_backend_scope` or
+    :func:`set_transfer_backend`.
+    """
+    return _current_backend.get() or _default_backend
+
+
+@contextmanager
+def transfer_backend_scope(backend: Optional[TransferBackend]):
+    """
+    Use a transfer backend for the downloads in the current context.
+
+    Example:
+    ```python
+    with transfer_backend_scope(Aria2Backend('http://127.0.0.1:6800/jsonrpc', secret='xxx')):
+        from_url('https://bunkr.si/a/xxxxxxxx').download_to_directory('dst')
+    ```
+    """
+    token = _current_backend.set(backend)
+    try:
+        yield backend
+    finally:
+        _current_backend.reset(token)
+
+
+def _new_hash(checksum: Optional[str]):
+    if checksum is None:
+        return None
+    algorithm, _ = checksum.split('=', 1)
+    return hashlib.new(algorithm.replace('-', ''))
+
+
+def _check_hash(hash_obj, checksum: Optional[str]):
+    if hash_obj is not None:
+        expected = checksum.split('=', 1)[1].lower()
+        if hash_obj.hexdigest() != expected:
+            raise requests.exceptions.HTTPError(f"Downloaded file does not match the checksum, "
+                                                f"{expected} expected but {hash_obj.hexdigest()} found.")
+
+
+def _iter_body(response: requests.Response, chunk_size: int):
+    raw = response.raw
+    if not isinstance(raw, HTTPResponse) or not hasattr(raw, 'read1'):
+        # the other transports yield the chunks as they arrive, and read1 is only there since urllib3 2.2
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+
+    # iter_content of urllib3 blocks until a whole chunk is received, which a trickling connection
+    # can take hours for, so the available bytes are read instead, and the errors raised as requests does
+    while True:
+        try:
+            chunk = raw.read1(chunk_size, decode_content=True)
+        except ProtocolError as err:
+            raise requests.exceptions.ChunkedEncodingError(err)
+        except DecodeError as err:
+            raise requests.exceptions.ContentDecodingError(err)
+        except ReadTimeoutError as err:
+            raise requests.exceptions.ConnectionError(err)
+        except SSLError as err:
+            raise requests.exceptions.SSLError(err)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _resume_request(session, url, offset: int, validator: Optional[str], **kwargs) -> Optional[requests.Response]:
+    # continue from the offset, None when the server cannot, or the file has changed (If-Range)
+    headers = dict(kwargs.pop('headers', None) or {})
+    headers['Range'] = f'bytes={offset}-'
+    if validator:
+        headers['If-Range'] = validator
+    response = session.get(url, stream=True, allow_redirects=True, headers=headers, **kwargs)
+    if response.status_code != 206 or \
+            not response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+        response.close()
+        return None
+    return response
+
+
+def _download_with_backend(backend: TransferBackend, url, filename, output_directory, expected_size, desc,
+                           session, silent, hooks, progress, cancel_token, checksum, **kwargs):
+    host = urlsplit(url).hostname
+    start_time = time.perf_counter()
+    # the headers and the cookies of the session are sent by the backend
+    prepared = session.prepare_request(requests.Request(
+        'GET', url, headers=kwargs.get('headers'), cookies=kwargs.get('cookies')))
+    headers = {key: value for key, value in prepared.headers.items()
+               if key.lower() not in {'accept-encoding', 'connection'}}
+    if filename is not None and output_directory is not None:
+        filename = os.path.join(output_directory, filename)
+    expected_size = int(expected_size) if expected_size is not None else expected_size
+
+    emit_event('file_start', hooks, url=url, host=host, filename=filename, expected_size=expected_size)
+    emit_progress = has_listeners('file_progress', hooks)
+    try:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        downloaded = 0
+        with _with_tqdm(expected_size, desc or os.path.basename(filename or url), silent, progress) as pbar:
+            def _on_progress(n):
+                nonlocal downloaded
+                pbar.update(n)
+                downloaded += n
+                if emit_progress:
+                    emit_event('file_progress', hooks, url=url, host=host, filename=filename,
+                               bytes=n, downloaded=downloaded, expected_size=expected_size)
+
+            filename = backend.transfer(url, filename, output_directory, headers, expected_size=expected_size,
+                                        checksum=checksum, cancel_token=cancel_token, on_progress=_on_progress)
+
+        actual_size = os.path.getsize(filename)
+        if expected_size is not None and actual_size != expected_size:
+            os.remove(filename)
+            raise requests.exceptions.HTTPError(f"Downloaded file is not of expected size, "
+                                                f"{expected_size} expected but {actual_size} found.")
+    except BaseException as err:
+        emit_event('file_failed', hooks, url=url, host=host, filename=filename, error=err,
+                   elapsed=time.perf_counter() - start_time)
+        raise
+
+    emit_event('file_done', hooks, url=url, host=host, filename=filename, size=actual_size,
+               elapsed=time.perf_counter() - start_time)
+    return filename
+
+
 def download_file(url, filename=None, output_directory=None,
                   expected_size: int = None, desc=None, session=None, silent: bool = False,
-                  **kwargs):
+                  hooks: Optional[EventHooks] = None, progress: Optional[ProgressAggregator] = None,
+                  chunk_size: int = 1 << 16, cancel_token: Optional[CancelToken] = None,
+                  bandwidth: Optional[BandwidthLimiter] = None,
+                  response: Optional[requests.Response] = None, checksum: Optional[str] = None,
+                  low_speed_limit: Optional[float] = None, low_speed_time: Optional[float] = None,
+                  max_resumes: int = 5, **kwargs):
+    # an open streaming response of the url (e.g. fetched when resolving it) can be given,
+    # then it is downloaded directly instead of requesting the url again
+    # checksum is ``<algorithm>=<hex digest>`` (e.g. ``md5=...``), verified while downloading
+    # a transfer staying under low_speed_limit bytes/s for low_speed_time seconds (see low_speed_scope),
+    # or dropped halfway, is reconnected up to max_resumes times and continued with a range request
     session = session or get_requests_session()
-    response = session.get(url, stream=True, allow_redirects=True, **kwargs)
-    response.raise_for_status()
+    progress = progress or get_current_progress()
+    cancel_token = cancel_token or get_cancel_token()
+    backend = get_transfer_backend()
+    if backend is not None and response is None:
+        return _download_with_backend(
+            backend, url, filename, output_directory, expected_size, desc, session, silent,
+            hooks or get_session_hooks(session), progress, cancel_token, checksum, **kwargs
+        )
+
+    bandwidth = bandwidth or global_bandwidth
+    hooks = hooks or get_session_hooks(session)
+    host = urlsplit(url).hostname
+    start_time = time.perf_counter()
+    try:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if response is None:
+            response = session.get(url, stream=True, allow_redirects=True, **kwargs)
+        response.raise_for_status()
+    except Exception as err:
+        if response is not None:
+            response.close()
+        emit_event('file_failed', hooks, url=url, host=host, filename=filename, error=err,
+                   elapsed=time.perf_counter() - start_time)
+        raise
     expected_size = expected_size or response.headers.get('Content-Length', None)
     if filename is None:
         filename = pyrfc6266.parse_filename(response.headers.get('Content-Disposition'))
@@ -40,19 +273,71 @@ def download_file(url, filename=None, output_directory=None,
     if directory:
         os.makedirs(directory, exist_ok=True)
 
+    emit_event('file_start', hooks, url=url, host=host, filename=filename, expected_size=expected_size)
+    emit_progress = has_listeners('file_progress', hooks)
+    deadline = get_deadline()
+    default_limit, default_time = get_low_speed_limit()
+    low_speed_limit = default_limit if low_speed_limit is None else low_speed_limit
+    low_speed_time = default_time if low_speed_time is None else low_speed_time
+    monitor = LowSpeedMonitor(low_speed_limit, low_speed_time) if low_speed_limit > 0 else None
+    # the ranges of an encoded body are not the ranges of the file, and the file should not change in between
+    resumable = response.headers.get('Content-Encoding', 'identity').lower() == 'identity'
+    etag = response.headers.get('ETag')
+    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
     try:
-        with open(filename, 'wb') as f:
-            with _with_tqdm(expected_size, desc, silent) as pbar:
-                for chunk in response.iter_content(chunk_size=1024):
-                    f.write(chunk)
-                    pbar.update(len(chunk))
+        downloaded, resumes = 0, 0
+        hash_obj = _new_hash(checksum)
+        with open(filename, 'wb') as f, bandwidth.transfer(host, get_bandwidth_job()) as throttle:
+            with _with_tqdm(expected_size, desc, silent, progress) as pbar:
+                while True:
+                    try:
+                        for chunk in _iter_body(response, chunk_size):
+                            if cancel_token is not None:
+                                cancel_token.raise_if_cancelled()
+                            if deadline is not None:
+                                deadline.raise_if_expired()
+                            waited = throttle(len(chunk))
+                            if monitor is not None and waited:
+                                # a rate limited under the low-speed limit is not a stall
+                                monitor.pause(waited)
+                            f.write(chunk)
+                            if hash_obj is not None:
+                                hash_obj.update(chunk)
+                            pbar.update(len(chunk))
+                            downloaded += len(chunk)
+                            if emit_progress:
+                                emit_event('file_progress', hooks, url=url, host=host, filename=filename,
+                                           bytes=len(chunk), downloaded=downloaded, expected_size=expected_size)
+                            if monitor is not None:
+                                monitor.update(len(chunk))
+                        break
+                    except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as err:
+                        response.close()
+                        if not resumable or resumes >= max_resumes:
+                            raise
+                        resumes += 1
+                        emit_event('file_resumed', hooks, url=url, host=host, filename=filename,
+                                   offset=downloaded, attempt=resumes, error=err)
+                        resumed = _resume_request(session, url, downloaded, validator, **kwargs)
+                        if resumed is None:
+                            raise
+                        response = resumed
+                        if monitor is not None:
+                            monitor.reset()
 
         actual_size = os.path.getsize(filename)
         if expected_size is not None and actual_size != expected_size:
             raise requests.exceptions.HTTPError(f"Downloaded file is not of expected size, "
                                                 f"{expected_size} expected but {actual_size} found.")
-    except BaseException:
+        _check_hash(hash_obj, checksum)
+    except BaseException as err:
+        # drop the connection instead of draining the rest of an aborted stream
+        response.close()
         os.remove(filename)
+        emit_event('file_failed', hooks, url=url, host=host, filename=filename, error=err,
+                   elapsed=time.perf_counter() - start_time)
         raise
 
+    emit_event('file_done', hooks, url=url, host=host, filename=filename, size=actual_size,
+               elapsed=time.perf_counter() - start_time)
     return filename
@@ -0,0 +1,195 @@
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Deque
+from urllib.parse import urlsplit
+
+import requests
+
+from .retry_budget import RetryBudget
+from .session import get_requests_session
+from .timing import RequestAbort, abort_scope
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().close()
+
+
+class HedgePolicy:
+    """
+    Hedging of the small latency-critical GETs, e.g. the file info APIs and the image pages. When no response
+    arrives within the host's ``quantile`` latency, a duplicate request is sent on another connection,
+    the first response is used and the other one is dropped.
+
+    The duplicates are limited by a :class:`RetryBudget` of ``max_ratio`` of the requests to each host,
+    and no duplicate is sent until ``min_samples`` latencies of the host are known.
+
+    :param quantile: Quantile of the host's latencies after which the duplicate is sent. (default: ``0.9``)
+    :type quantile: float
+    :param min_samples: Latencies of the host needed before hedging. (default: ``20``)
+    :type min_samples: int
+    :param max_samples: Latest latencies kept for each host. (default: ``200``)
+    :type max_samples: int
+    :param min_delay: Min seconds before the duplicate is sent. (default: ``0.05``)
+    :type min_delay: float
+    :param max_ratio: Duplicates allowed for each request to the host in the window. (default: ``0.1``)
+    :type max_ratio: float
+    :param min_hedges: Duplicates always allowed in the window. (default: ``2``)
+    :type min_hedges: int
+    :param window: Seconds of the budget's sliding window. (default: ``10``)
+    :type window: float
+    :param max_workers: Max threads sending the duplicates. (default: ``32``)
+    :type max_workers: int
+    :param enabled: Hedge the requests, otherwise they are sent once. (default: ``True``)
+    :type enabled: bool
+    """
+
+    def __init__(self, quantile: float = 0.9, min_samples: int = 20, max_samples: int = 200,
+                 min_delay: float = 0.05, max_ratio: float = 0.1, min_hedges: int = 2, window: float = 10.0,
+                 max_workers: int = 32, enabled: bool = True):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self.enabled = enabled
+        self.budget = RetryBudget(ratio=max_ratio, min_retries=min_hedges, window=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def observe(self, host: str, latency: float):
+        """
+        Record the latency of a finished request to the host.
+        """
+        with self._lock:
+            if host not in self._latencies:
+                self._latencies[host] = deque(maxlen=self.max_samples)
+            self._latencies[host].append(latency)
+
+    def delay(self, host: str) -> Optional[float]:
+        """
+        Seconds after which the duplicate of a request to the host is sent.
+
+        :returns: The delay, ``None`` if the latencies of the host are not known enough yet.
+        :rtype: Optional[float]
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(host, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        index = min(max(math.ceil(self.quantile * len(latencies)) - 1, 0), len(latencies) - 1)
+        return max(latencies[index], self.min_delay)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hedge')
+            return self._executor
+
+    def _timed_get(self, host: str, session: requests.Session, url: str, **kwargs) -> requests.Response:
+        start_time = time.perf_counter()
+        response = session.get(url, **kwargs)
+        self.observe(host, time.perf_counter() - start_time)
+        return response
+
+    def _send_hedge(self, host: str, session: requests.Session, url: str, send_time: float,
+                    primary_done: threading.Event, abort: RequestAbort, **kwargs) -> Optional[requests.Response]:
+        # waits for the primary until send_time, the time spent in the queue of the executor included
+        if primary_done.wait(max(send_time - time.perf_counter(), 0.0)) or not self.budget.try_retry(host):
+            return None
+        with self._lock:
+            self.hedges += 1
+        response = self._timed_get(host, session, url, **kwargs)
+        # the primary still running is stopped, the caller takes this response instead
+        abort.abort()
+        return response
+
+    def get(self, session: requests.Session, url: str, **kwargs) -> requests.Response:
+        """
+        Send a hedged GET request, only use it for the idempotent ones.
+
+        The request is sent on the caller's thread, only the duplicate is sent by the executor, and the request
+        is aborted once the duplicate wins (see :class:`netdriveurls.utils.timing.RequestAbort`).
+
+        :param session: Session to use.
+        :type session: requests.Session
+        :param url: Url of the request.
+        :type url: str
+        :param kwargs: Other arguments of ``session.get``.
+        :returns: The first response received.
+        :rtype: requests.Response
+        """
+        host = urlsplit(url).hostname or ''
+        delay = self.delay(host) if self.enabled else None
+        if delay is None:
+            return self._timed_get(host, session, url, **kwargs)
+
+        self.budget.record_request(host)
+        # the deadline and the cancel token of the caller apply to the duplicate, but not the abort scope
+        context = contextvars.copy_context()
+        primary_done, abort = threading.Event(), RequestAbort()
+        hedge = self._get_executor().submit(context.run, self._send_hedge, host, session, url,
+                                            time.perf_counter() + delay, primary_done, abort, **kwargs)
+        try:
+            with abort_scope(abort):
+                response = self._timed_get(host, session, url, **kwargs)
+        except Exception:
+            if abort.finish():
+                primary_done.set()
+                try:
+                    response = hedge.result()
+                except Exception:
+                    response = None
+                if response is None:
+                    # the error of the primary is reported when both failed
+                    raise
+            else:
+                response = hedge.result()
+        else:
+            if abort.finish():
+                primary_done.set()
+                # the duplicate still in flight cannot be aborted, its response is dropped once received
+                hedge.add_done_callback(_close_response)
+                return response
+            # aborted after the primary was received, the duplicate has won anyway
+            response.close()
+            response = hedge.result()
+
+        with self._lock:
+            self.hedge_wins += 1
+        return response
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self.hedges, self.hedge_wins = 0, 0
+        self.budget.clear()
+
+
+#: Process-wide policy used by :func:`hedged_get`.
+global_hedge_policy = HedgePolicy()
+
+
+def hedged_get(url: str, session: Optional[requests.Session] = None, policy: Optional[HedgePolicy] = None,
+               **kwargs) -> requests.Response:
+    """
+    Send a GET request hedged by the policy, see :class:`HedgePolicy`.
+
+    :param url: Url of the request.
+    :type url: str
+    :param session: Session to use. (default: :func:`get_requests_session`)
+    :type session: Optional[requests.Session]
+    :param policy: Hedging policy, ``None`` means :data:`global_hedge_policy`.
+    :type policy: Optional[HedgePolicy]
+    :param kwargs: Other arguments of ``session.get``.
+    :returns: The first response received.
+    :rtype: requests.Response
+    """
+    return (policy or global_hedge_policy).get(session or get_requests_session(), url, **kwargs)
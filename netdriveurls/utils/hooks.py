@@ -0,0 +1,170 @@
+import logging
+import threading
+from typing import Callable, Dict, Tuple, Optional
+
+#: Events emitted by the sessions and :func:`netdriveurls.utils.download_file`.
+#:
+#: * ``request_start``: ``method``, ``url``, ``host``
+#: * ``request_end``: ``method``, ``url``, ``host``, ``status``, ``bytes``, ``latency``, ``error``, ``timings``
+#: * ``request_timings``: ``method``, ``url``, ``host``, ``status``, ``timings``, emitted once the body is consumed
+#: * ``retry``: ``method``, ``url``, ``host``, ``attempt``, ``status``, ``error``
+#: * ``file_start``: ``url``, ``host``, ``filename``, ``expected_size``
+#: * ``file_progress``: ``url``, ``host``, ``filename``, ``bytes``, ``downloaded``, ``expected_size``
+#: * ``file_done``: ``url``, ``host``, ``filename``, ``size``, ``elapsed``
+#: * ``file_failed``: ``url``, ``host``, ``filename``, ``error``, ``elapsed``
+#: * ``file_resumed``: ``url``, ``host``, ``filename``, ``offset``, ``attempt``, ``error``, emitted when a stalled \
+#:   or dropped transfer is reconnected
+EVENTS = (
+    'request_start', 'request_end', 'request_timings', 'retry',
+    'file_start', 'file_progress', 'file_done', 'file_failed', 'file_resumed',
+)
+
+
+class EventHooks:
+    """
+    Registry of the callbacks listening to the download events.
+
+    The callbacks are called with the event's payload as keyword arguments, in the thread where the
+    event happened. Exceptions raised by callbacks are logged and never break the download.
+
+    Example:
+    ```python
+    hooks = EventHooks()
+    hooks.register('file_done', lambda filename, size, **_: print(filename, size))
+    session = get_requests_session(hooks=hooks)
+    ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # the tuples are replaced instead of modified, so emitting needs no lock
+        self._callbacks: Dict[str, Tuple[Callable, ...]] = {}
+
+    def register(self, event: str, callback: Callable) -> Callable:
+        """
+        Register a callback for the given event.
+
+        :param event: Name of the event, should be one of :data:`EVENTS`.
+        :type event: str
+        :param callback: Callback to be called with the payload of the event.
+        :type callback: Callable
+        :returns: The registered callback.
+        :rtype: Callable
+        :raises ValueError: If the event is unknown.
+        """
+        if event not in EVENTS:
+            raise ValueError(f'Unknown event {event!r}, should be one of {EVENTS!r}.')
+        with self._lock:
+            self._callbacks[event] = (*self._callbacks.get(event, ()), callback)
+        return callback
+
+    def unregister(self, event: str, callback: Callable):
+        """
+        Unregister a callback of the given event, nothing happens when it is not registered.
+
+        :param event: Name of the event.
+        :type event: str
+        :param callback: The registered callback.
+        :type callback: Callable
+        """
+        with self._lock:
+            self._callbacks[event] = tuple(cb for cb in self._callbacks.get(event, ()) if cb != callback)
+
+    def subscribe(self, observer):
+        """
+        Register all the ``on_<event>`` methods of the observer.
+
+        :param observer: Observer object, e.g. :class:`netdriveurls.utils.MetricsCollector`.
+        """
+        for event in EVENTS:
+            callback = getattr(observer, f'on_{event}', None)
+            if callback is not None:
+                self.register(event, callback)
+
+    def unsubscribe(self, observer):
+        """
+        Unregister all the ``on_<event>`` methods of the observer.
+
+        :param observer: The subscribed observer.
+        """
+        for event in EVENTS:
+            callback = getattr(observer, f'on_{event}', None)
+            if callback is not None:
+                self.unregister(event, callback)
+
+    def has_listeners(self, event: str) -> bool:
+        """
+        Check if any callback is listening to the event, used to skip building the payloads.
+
+        :param event: Name of the event.
+        :type event: str
+        :returns: ``True`` if any callback is registered.
+        :rtype: bool
+        """
+        return bool(self._callbacks.get(event))
+
+    def emit(self, event: str, **payload):
+        """
+        Call the callbacks of the event with the payload.
+
+        :param event: Name of the event.
+        :type event: str
+        :param payload: Payload of the event.
+        """
+        for callback in self._callbacks.get(event, ()):
+            try:
+                callback(**payload)
+            except Exception:
+                logging.exception(f'Error in hook {callback!r} of event {event!r}.')
+
+
+#: Process-wide hooks, receiving the events of all the sessions.
+global_hooks = EventHooks()
+
+
+def register_hook(event: str, callback: Callable) -> Callable:
+    """
+    Register a callback for the given event on :data:`global_hooks`.
+
+    :param event: Name of the event, should be one of :data:`EVENTS`.
+    :type event: str
+    :param callback: Callback to be called with the payload of the event.
+    :type callback: Callable
+    :returns: The registered callback.
+    :rtype: Callable
+    """
+    return global_hooks.register(event, callback)
+
+
+def unregister_hook(event: str, callback: Callable):
+    """
+    Unregister a callback of the given event from :data:`global_hooks`.
+
+    :param event: Name of the event.
+    :type event: str
+    :param callback: The registered callback.
+    :type callback: Callable
+    """
+    global_hooks.unregister(event, callback)
+
+
+def has_listeners(event: str, hooks: Optional[EventHooks] = None) -> bool:
+    """
+    Check if the event has any listener in the given hooks or :data:`global_hooks`.
+    """
+    return global_hooks.has_listeners(event) or (hooks is not None and hooks.has_listeners(event))
+
+
+def emit_event(event: str, hooks: Optional[EventHooks] = None, **payload):
+    """
+    Emit the event to the given hooks and :data:`global_hooks`.
+
+    :param event: Name of the event.
+    :type event: str
+    :param hooks: Hooks of the session, ``None`` means only :data:`global_hooks`.
+    :type hooks: Optional[EventHooks]
+    :param payload: Payload of the event.
+    """
+    if hooks is not None and hooks is not global_hooks:
+        hooks.emit(event, **payload)
+    global_hooks.emit(event, **payload)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional, Callable, Any
+
+import requests
+
+from .cache import DiskCache, get_cache_dir
+from ..config.meta import __VERSION__
+from .session import get_requests_session
+from .singleflight import request_key
+
+#: Seconds before an unused entry is dropped, the entries are revalidated on every use anyway.
+HTTP_CACHE_TTL = 30 * 24 * 60 * 60
+
+
+class HTTPCache:
+    """
+    Conditional cache of the listing pages, keeping the validators (``ETag`` / ``Last-Modified``) and the
+    parsed result of each page. The page is revalidated with ``If-None-Match`` / ``If-Modified-Since`` on every
+    fetch, and when the server answers ``304 Not Modified`` the parsed result is reused without downloading or
+    parsing the page again. Responses without validators or with ``Cache-Control: no-store`` are not stored.
+
+    The parsed result is stored as json, so tuples are loaded back as lists. The version of netdriveurls is
+    part of the key, so the results of the older parsers are not reused after an upgrade. The expired entries
+    are removed from the disk, the ones of the other pages when the first page is stored by the process.
+
+    :param directory: Directory of the entries. (default: ``http`` in :func:`get_cache_dir`)
+    :type directory: Optional[str]
+    :param ttl: Seconds before an unused entry is dropped. (default: :data:`HTTP_CACHE_TTL`)
+    :type ttl: float
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl: float = HTTP_CACHE_TTL):
+        self._directory = directory
+        self.ttl = ttl
+        self._pruned = False
+
+    @property
+    def directory(self) -> str:
+        return self._directory or os.path.join(get_cache_dir(), 'http')
+
+    def _store(self, key) -> DiskCache:
+        # one file for each page, so updating a page does not rewrite the others
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return DiskCache(digest, directory=self.directory)
+
+    def prune(self) -> int:
+        """
+        Remove the files of the expired pages, e.g. the listings not fetched for a long time.
+
+        :returns: Number of the files removed.
+        :rtype: int
+        """
+        directory = self.directory
+        try:
+            filenames = os.listdir(directory)
+        except OSError:
+            return 0
+
+        removed = 0
+        for filename in filenames:
+            if filename.endswith('.json'):
+                store = DiskCache(filename[:-len('.json')], directory=directory)
+                entry = store.get_entry('page')
+                if entry is None or entry.get('expires', 0) <= time.time():
+                    store.clear()
+                    removed += 1
+        return removed
+
+    def _set(self, store: DiskCache, value: Any, etag: Optional[str], last_modified: Optional[str]):
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+        store.set('page', value, self.ttl, etag=etag, last_modified=last_modified)
+
+    def fetch(self, url: str, parse: Callable[[requests.Response], Any],
+              session: Optional[requests.Session] = None, **kwargs) -> Any:
+        """
+        Get the url and return ``parse(response)``, or the cached result if the page is not modified.
+
+        :param url: Url of the page.
+        :type url: str
+        :param parse: Function parsing the response, its result should be json serializable.
+            It is part of the key, so different parsers of the same page do not share the entries.
+        :type parse: Callable[[requests.Response], Any]
+        :param session: Session to use. (default: :func:`get_requests_session`)
+        :type session: Optional[requests.Session]
+        :param kwargs: Other arguments of ``session.get``.
+        """
+        session = session or get_requests_session()
+        headers = dict(kwargs.pop('headers', None) or {})
+        store = self._store([__VERSION__, f'{parse.__module__}.{parse.__qualname__}',
+                             *request_key('GET', url, headers)])
+
+        entry = store.get_entry('page')
+        if entry is not None and entry.get('expires', 0) <= time.time():
+            store.clear()
+            entry = None
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        resp = session.get(url, headers=headers, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            self._set(store, entry['value'], etag=resp.headers.get('ETag') or entry.get('etag'),
+                      last_modified=resp.headers.get('Last-Modified') or entry.get('last_modified'))
+            return entry['value']
+
+        resp.raise_for_status()
+        value = parse(resp)
+        etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        if (etag or last_modified) and 'no-store' not in resp.headers.get('Cache-Control', '').lower():
+            self._set(store, value, etag=etag, last_modified=last_modified)
+        elif entry is not None:
+            store.clear()
+        return value
+
+
+#: Process-wide cache used by the listing helpers.
+global_http_cache = HTTPCache()
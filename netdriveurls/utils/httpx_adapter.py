@@ -0,0 +1,182 @@
+import os
+import ssl
+import threading
+from http.cookiejar import CookieJar
+from typing import Dict, Tuple, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.utils import select_proxy
+
+from .transport import ClientAdapter, ClientRaw, HOP_BY_HOP_HEADERS
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover
+        raise ImportError('httpx is required by the HTTP/2 transport, '
+                          'please install it with `pip install netdriveurls[http2]`.')
+    return httpx
+
+
+class _NoCookieJar(CookieJar):
+    # the cookies are kept by the requests session, the shared client must not keep them as well
+    def extract_cookies(self, response, request):
+        pass
+
+    def set_cookie(self, cookie):
+        pass
+
+
+class _HTTPXRaw(ClientRaw):
+    def __init__(self, response):
+        ClientRaw.__init__(self, response.status_code, response.headers.multi_items(),
+                           reason=response.reason_phrase, http_version=response.http_version)
+        self._response = response
+
+    def _iter_chunks(self, chunk_size: int):
+        httpx = _import_httpx()
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as err:
+            raise requests.exceptions.ConnectionError(err)
+        except httpx.StreamClosed:
+            return
+        except httpx.TransportError as err:
+            raise requests.exceptions.ChunkedEncodingError(err)
+
+    def release_conn(self):
+        # release the stream of the multiplexed connection
+        self._response.close()
+
+
+class _StreamOpening:
+    # held from before the request is sent until its headers are, released by the trace events of httpcore
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self._lock.acquire()
+        self._held = True
+
+    def trace(self, event: str, info: dict):
+        if event.endswith(('.send_request_headers.complete', '.send_request_headers.failed')):
+            self.release()
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._lock.release()
+
+
+def _to_httpx_timeout(timeout):
+    httpx = _import_httpx()
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+    return httpx.Timeout(timeout)
+
+
+class HTTPXAdapter(ClientAdapter):
+    """
+    Adapter sending the requests with `httpx <https://www.python-httpx.org/>`_, which can use HTTP/2 and
+    multiplex many concurrent requests over one connection per host. It is useful for the image hosts,
+    where thousands of tiny requests are dominated by the handshakes and the connection limits.
+
+    The timeouts, the retries (the same ``max_retries`` as :class:`TimeoutHTTPAdapter`) and the events work
+    in the same way, while the phase timings are not available (``response.timings`` is ``None``).
+    The HTTP version used is available as ``response.raw.http_version``.
+
+    The proxies of the session (including ``$HTTP(S)_PROXY``) are used, with one client for each proxy.
+
+    Requires the ``http2`` extra (``pip install netdriveurls[http2]``).
+
+    Example:
+    ```python
+    session = get_requests_session(http2=True)
+    ```
+
+    :param http2: Use HTTP/2 when the server supports it. (default: ``True``)
+    :type http2: bool
+    :param http1: Allow HTTP/1.1, set to ``False`` to use HTTP/2 with prior knowledge, \
+        e.g. on plain-text connections. (default: ``True``)
+    :type http1: bool
+    :param max_connections: Max connections of the client, each HTTP/2 connection carries many requests. \
+        (default: ``32``)
+    :type max_connections: int
+    """
+
+    def __init__(self, *args, http2: bool = True, http1: bool = True, max_connections: int = 32, **kwargs):
+        _import_httpx()
+        super().__init__(*args, **kwargs)
+        self.http2 = http2
+        self.http1 = http1
+        self.max_connections = max_connections
+        self._clients_lock = threading.Lock()
+        self._clients: Dict[Tuple[Any, Any, Optional[str]], Any] = {}
+        self._opening_locks: Dict[Tuple, threading.Lock] = {}
+
+    def _get_client(self, verify, cert, proxy: Optional[str] = None):
+        httpx = _import_httpx()
+        with self._clients_lock:
+            key = (verify, cert, proxy)
+            if key not in self._clients:
+                if isinstance(verify, str):
+                    # path of the ca bundle, e.g. from $REQUESTS_CA_BUNDLE
+                    if os.path.isdir(verify):
+                        ssl_context = ssl.create_default_context(capath=verify)
+                    else:
+                        ssl_context = ssl.create_default_context(cafile=verify)
+                else:
+                    ssl_context = verify
+                self._clients[key] = httpx.Client(
+                    http1=self.http1, http2=self.http2, verify=ssl_context, cert=cert, proxy=proxy,
+                    trust_env=False, follow_redirects=False, cookies=_NoCookieJar(),
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections),
+                )
+            return self._clients[key]
+
+    def _get_opening_lock(self, client, url: str) -> threading.Lock:
+        split = urlsplit(url)
+        with self._clients_lock:
+            key = (id(client), split.scheme, split.netloc)
+            if key not in self._opening_locks:
+                self._opening_locks[key] = threading.Lock()
+            return self._opening_locks[key]
+
+    @property
+    def retryable_errors(self):
+        return _import_httpx().TransportError,
+
+    def _to_requests_error(self, err: Exception, request: requests.PreparedRequest) -> requests.RequestException:
+        httpx = _import_httpx()
+        if isinstance(err, httpx.ConnectTimeout):
+            return requests.exceptions.ConnectTimeout(err, request=request)
+        elif isinstance(err, httpx.TimeoutException):
+            return requests.exceptions.ReadTimeout(err, request=request)
+        else:
+            return requests.exceptions.ConnectionError(err, request=request)
+
+    def _open(self, request, timeout, verify, cert, proxies) -> ClientRaw:
+        client = self._get_client(verify, cert, select_proxy(request.url, proxies or {}))
+        headers = [(key, value) for key, value in request.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS]
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        # httpcore picks the id of a new HTTP/2 stream and sends its headers without a lock, so the concurrent
+        # requests of a connection can send their ids out of order, which the server rejects with
+        # a PROTOCOL_ERROR killing all the streams, hence the streams of each origin are opened one by one
+        opening = _StreamOpening(self._get_opening_lock(client, request.url))
+        try:
+            resp = client.send(client.build_request(request.method, request.url, headers=headers, content=body,
+                                                    timeout=_to_httpx_timeout(timeout),
+                                                    extensions={'trace': opening.trace}), stream=True)
+        finally:
+            opening.release()
+        return _HTTPXRaw(resp)
+
+    def close(self):
+        super().close()
+        with self._clients_lock:
+            clients, self._clients = self._clients, {}
+            self._opening_locks.clear()
+        for client in clients.values():
+            client.close()
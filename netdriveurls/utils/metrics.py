@@ -0,0 +1,317 @@
+import bisect
+import json
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from .hooks import EventHooks, global_hooks
+
+#: Upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with fixed buckets, the last bucket is ``+Inf``.
+
+    :param buckets: Upper bounds of the buckets in seconds.
+    :type buckets: Tuple[float, ...]
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the quantile with the upper bound of the bucket it falls into.
+
+        :param q: Quantile between 0 and 1.
+        :type q: float
+        :returns: Estimated quantile, ``None`` when empty, ``inf`` when it falls into the last bucket.
+        :rtype: Optional[float]
+        """
+        if not self.count:
+            return None
+        rank, total = q * self.count, 0
+        for bound, count in zip((*self.buckets, float('inf')), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')  # pragma: no cover
+
+    def to_json(self) -> dict:
+        return {
+            'buckets': {str(bound): count for bound, count in zip((*self.buckets, '+Inf'), self.counts)},
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class _HostMetrics:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.requests = 0
+        self.request_errors = 0
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.response_bytes = 0
+        self.retries = 0
+        self.files_started = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.downloaded_bytes = 0
+        self.request_latency = LatencyHistogram(buckets)
+        self.file_latency = LatencyHistogram(buckets)
+
+    def to_json(self) -> dict:
+        return {
+            'requests': self.requests,
+            'request_errors': self.request_errors,
+            'statuses': dict(self.statuses),
+            'response_bytes': self.response_bytes,
+            'retries': self.retries,
+            'files_started': self.files_started,
+            'files_done': self.files_done,
+            'files_failed': self.files_failed,
+            'downloaded_bytes': self.downloaded_bytes,
+            'request_latency': self.request_latency.to_json(),
+            'file_latency': self.file_latency.to_json(),
+        }
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsCollector:
+    """
+    Low-overhead collector of per-host counters and latency histograms, fed by the download events.
+
+    Example:
+    ```python
+    collector = MetricsCollector().attach()  # listen to the global hooks
+    ...  # download something
+    print(collector.to_prometheus())
+    ```
+
+    :param buckets: Upper bounds of the latency histogram buckets in seconds.
+    :type buckets: Tuple[float, ...]
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostMetrics] = {}
+
+    def attach(self, hooks: Optional[EventHooks] = None) -> 'MetricsCollector':
+        """
+        Subscribe this collector to the hooks.
+
+        :param hooks: Hooks to listen to, ``None`` means the global hooks. (default: None)
+        :type hooks: Optional[EventHooks]
+        :returns: The collector itself.
+        :rtype: MetricsCollector
+        """
+        (hooks or global_hooks).subscribe(self)
+        return self
+
+    def detach(self, hooks: Optional[EventHooks] = None):
+        """
+        Unsubscribe this collector from the hooks.
+
+        :param hooks: Hooks listened to, ``None`` means the global hooks. (default: None)
+        :type hooks: Optional[EventHooks]
+        """
+        (hooks or global_hooks).unsubscribe(self)
+
+    def _host(self, host) -> _HostMetrics:
+        host = host or 'unknown'
+        if host not in self._hosts:
+            self._hosts[host] = _HostMetrics(self._buckets)
+        return self._hosts[host]
+
+    def on_request_end(self, host, status, bytes, latency, error, **kwargs):
+        with self._lock:
+            metrics = self._host(host)
+            metrics.requests += 1
+            if error is not None:
+                metrics.request_errors += 1
+                metrics.statuses['error'] += 1
+            else:
+                metrics.statuses[str(status)] += 1
+            metrics.response_bytes += bytes or 0
+            metrics.request_latency.observe(latency)
+
+    def on_retry(self, host, **kwargs):
+        with self._lock:
+            self._host(host).retries += 1
+
+    def on_file_start(self, host, **kwargs):
+        with self._lock:
+            self._host(host).files_started += 1
+
+    def on_file_progress(self, host, bytes, **kwargs):
+        with self._lock:
+            self._host(host).downloaded_bytes += bytes
+
+    def on_file_done(self, host, elapsed, **kwargs):
+        with self._lock:
+            metrics = self._host(host)
+            metrics.files_done += 1
+            metrics.file_latency.observe(elapsed)
+
+    def on_file_failed(self, host, **kwargs):
+        with self._lock:
+            self._host(host).files_failed += 1
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+    def to_json(self) -> dict:
+        """
+        Export the metrics as a json-compatible dict, keyed by host.
+        """
+        with self._lock:
+            return {host: metrics.to_json() for host, metrics in sorted(self._hosts.items())}
+
+    def dumps(self, **kwargs) -> str:
+        return json.dumps(self.to_json(), **kwargs)
+
+    def to_prometheus(self, prefix: str = 'netdriveurls') -> str:
+        """
+        Export the metrics in the Prometheus text exposition format.
+
+        :param prefix: Prefix of the metric names. (default: ``netdriveurls``)
+        :type prefix: str
+        :returns: Metrics text.
+        :rtype: str
+        """
+        counters = [
+            ('requests_total', 'Number of finished HTTP requests.', lambda m: m.requests),
+            ('request_errors_total', 'Number of HTTP requests failed without response.', lambda m: m.request_errors),
+            ('response_bytes_total', 'Declared content length of the HTTP responses.', lambda m: m.response_bytes),
+            ('retries_total', 'Number of HTTP retries.', lambda m: m.retries),
+            ('files_started_total', 'Number of started file downloads.', lambda m: m.files_started),
+            ('files_done_total', 'Number of finished file downloads.', lambda m: m.files_done),
+            ('files_failed_total', 'Number of failed file downloads.', lambda m: m.files_failed),
+            ('downloaded_bytes_total', 'Number of downloaded file bytes.', lambda m: m.downloaded_bytes),
+        ]
+        histograms = [
+            ('request_latency_seconds', 'Latency of HTTP requests until the headers are received.',
+             lambda m: m.request_latency),
+            ('file_duration_seconds', 'Duration of the finished file downloads.', lambda m: m.file_latency),
+        ]
+
+        with self._lock:
+            hosts = sorted(self._hosts.items())
+            lines = []
+            for name, help_, getter in counters:
+                lines.append(f'# HELP {prefix}_{name} {help_}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+                for host, metrics in hosts:
+                    lines.append(f'{prefix}_{name}{{host="{_escape_label(host)}"}} {getter(metrics)}')
+
+            lines.append(f'# HELP {prefix}_responses_total Number of HTTP responses by status.')
+            lines.append(f'# TYPE {prefix}_responses_total counter')
+            for host, metrics in hosts:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'{prefix}_responses_total{{host="{_escape_label(host)}",'
+                                 f'status="{_escape_label(status)}"}} {count}')
+
+            for name, help_, getter in histograms:
+                lines.append(f'# HELP {prefix}_{name} {help_}')
+                lines.append(f'# TYPE {prefix}_{name} histogram')
+                for host, metrics in hosts:
+                    hist, label = getter(metrics), _escape_label(host)
+                    total = 0
+                    for bound, count in zip((*hist.buckets, '+Inf'), hist.counts):
+                        total += count
+                        lines.append(f'{prefix}_{name}_bucket{{host="{label}",le="{bound}"}} {total}')
+                    lines.append(f'{prefix}_{name}_sum{{host="{label}"}} {hist.sum}')
+                    lines.append(f'{prefix}_{name}_count{{host="{label}"}} {hist.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+_PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer')
+
+
+def _percentile(sorted_samples, q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+
+class TimingsCollector:
+    """
+    Collector of the per-request phase timings (DNS, connect, TLS, TTFB, transfer) grouped by host,
+    fed by the ``request_timings`` events.
+
+    :param max_samples: Maximum number of samples kept for each host, the oldest ones are dropped.
+    :type max_samples: int
+    """
+
+    def __init__(self, max_samples: int = 100000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, list] = defaultdict(list)
+
+    def attach(self, hooks: Optional[EventHooks] = None) -> 'TimingsCollector':
+        (hooks or global_hooks).subscribe(self)
+        return self
+
+    def detach(self, hooks: Optional[EventHooks] = None):
+        (hooks or global_hooks).unsubscribe(self)
+
+    def on_request_timings(self, host, timings, **kwargs):
+        with self._lock:
+            samples = self._samples[host or 'unknown']
+            samples.append(timings)
+            if len(samples) > self.max_samples:
+                del samples[:len(samples) - self.max_samples]
+
+    def summary(self) -> dict:
+        """
+        Summarize the timings, keyed by host, with ``requests``, ``reused`` and the ``mean``, ``p50``
+        and ``p90`` of each phase in seconds.
+        """
+        with self._lock:
+            items = sorted((host, list(samples)) for host, samples in self._samples.items())
+
+        retval = {}
+        for host, samples in items:
+            info = {'requests': len(samples), 'reused': sum(1 for t in samples if t.reused)}
+            for phase in _PHASES:
+                values = sorted(getattr(t, phase) for t in samples if getattr(t, phase) is not None)
+                if values:
+                    info[phase] = {'mean': sum(values) / len(values),
+                                   'p50': _percentile(values, 0.5), 'p90': _percentile(values, 0.9)}
+                else:
+                    info[phase] = None
+            retval[host] = info
+        return retval
+
+    def format_report(self) -> str:
+        """
+        Format the summary as a plain-text table, times are in milliseconds (mean / p90).
+        """
+        header = ['host', 'requests', 'reused', *(f'{phase} ms' for phase in _PHASES)]
+        rows = []
+        for host, info in self.summary().items():
+            row = [host, str(info['requests']), f'{info["reused"] / info["requests"]:.0%}']
+            for phase in _PHASES:
+                stat = info[phase]
+                row.append('-' if stat is None else f'{stat["mean"] * 1000:.1f} / {stat["p90"] * 1000:.1f}')
+            rows.append(row)
+
+        widths = [max(len(line[i]) for line in [header, *rows]) for i in range(len(header))]
+        return '\n'.join(
+            '  '.join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                      for i, (cell, width) in enumerate(zip(line, widths)))
+            for line in [header, *rows]
+        )
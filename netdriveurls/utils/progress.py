@@ -0,0 +1,295 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List, Callable, TextIO
+
+from tqdm.auto import tqdm
+
+
+class ProgressSnapshot:
+    """
+    Snapshot of the aggregated progress.
+
+    ``bytes_total`` only counts the files whose sizes are known, ``eta`` is estimated with the bytes when
+    all the sizes are known, otherwise with the number of files.
+    """
+    __slots__ = ('desc', 'files_total', 'files_done', 'files_failed', 'files_sized',
+                 'bytes_total', 'bytes_done', 'elapsed', 'rate', 'eta')
+
+    def __init__(self, desc, files_total, files_done, files_failed, files_sized,
+                 bytes_total, bytes_done, elapsed):
+        self.desc = desc
+        self.files_total = files_total
+        self.files_done = files_done
+        self.files_failed = files_failed
+        self.files_sized = files_sized
+        self.bytes_total = bytes_total
+        self.bytes_done = bytes_done
+        self.elapsed = elapsed
+        self.rate = bytes_done / elapsed if elapsed > 0 else 0.0
+
+        files_finished = files_done + files_failed
+        if files_total and files_sized >= files_total and self.rate > 0:
+            self.eta = max(bytes_total - bytes_done, 0) / self.rate
+        elif files_finished and files_total:
+            self.eta = elapsed / files_finished * max(files_total - files_finished, 0)
+        else:
+            self.eta = None
+
+    def to_json(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class ProgressSink:
+    """
+    Output of the :class:`ProgressAggregator`, called from its refresher thread.
+    """
+
+    def update(self, snapshot: ProgressSnapshot):
+        raise NotImplementedError  # pragma: no cover
+
+    def close(self, snapshot: ProgressSnapshot):
+        self.update(snapshot)
+
+
+def _format_size(size: float) -> str:
+    return tqdm.format_sizeof(size, 'B', 1024)
+
+
+class TqdmProgressSink(ProgressSink):
+    """
+    One tqdm bar counting the files, the bytes, speed and ETA are shown as its postfix.
+
+    :param file: Stream of the bar. (default: ``sys.stderr``)
+    """
+
+    def __init__(self, file: Optional[TextIO] = None):
+        self._file = file
+        self._bar = None
+
+    def update(self, snapshot: ProgressSnapshot):
+        if self._bar is None:
+            self._bar = tqdm(total=snapshot.files_total, desc=snapshot.desc, unit='file',
+                             file=self._file or sys.stderr)
+        self._bar.total = snapshot.files_total
+        self._bar.n = snapshot.files_done + snapshot.files_failed
+        postfix = f'{_format_size(snapshot.bytes_done)}'
+        if snapshot.files_total and snapshot.files_sized >= snapshot.files_total:
+            postfix += f'/{_format_size(snapshot.bytes_total)}'
+        postfix += f', {_format_size(snapshot.rate)}/s'
+        if snapshot.files_failed:
+            postfix += f', {snapshot.files_failed} failed'
+        self._bar.set_postfix_str(postfix, refresh=False)
+        self._bar.refresh()
+
+    def close(self, snapshot: ProgressSnapshot):
+        self.update(snapshot)
+        self._bar.close()
+
+
+class LoggingProgressSink(ProgressSink):
+    """
+    Log one line on each refresh.
+
+    :param logger: Logger to use. (default: the root logger)
+    :param level: Level of the logs. (default: ``logging.INFO``)
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger()
+        self.level = level
+
+    def update(self, snapshot: ProgressSnapshot):
+        eta = f'{snapshot.eta:.1f}s' if snapshot.eta is not None else 'unknown'
+        self.logger.log(
+            self.level,
+            f'{snapshot.desc or "Progress"}: {snapshot.files_done}/{snapshot.files_total} files '
+            f'({snapshot.files_failed} failed), {_format_size(snapshot.bytes_done)} '
+            f'at {_format_size(snapshot.rate)}/s, ETA {eta}.'
+        )
+
+
+class JsonProgressSink(ProgressSink):
+    """
+    Write one json line of the snapshot on each refresh.
+
+    :param stream: Stream to write to. (default: ``sys.stderr``)
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+
+    def update(self, snapshot: ProgressSnapshot):
+        stream = self.stream or sys.stderr
+        stream.write(json.dumps(snapshot.to_json()) + '\n')
+        stream.flush()
+
+
+class ProgressAggregator:
+    """
+    Thread-safe progress of many files downloaded by many threads or jobs, refreshed to the sinks by a
+    background thread at a fixed rate. Without sinks, no thread is started and updating costs only a
+    counter increment.
+
+    :param sinks: Outputs of the progress.
+    :type sinks: List[ProgressSink]
+    :param desc: Description of the progress.
+    :type desc: Optional[str]
+    :param interval: Refresh interval in seconds. (default: 0.5)
+    :type interval: float
+    """
+
+    def __init__(self, sinks: Optional[List[ProgressSink]] = None, desc: Optional[str] = None,
+                 interval: float = 0.5):
+        self.sinks = list(sinks or [])
+        self.desc = desc
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._files_total = 0
+        self._files_done = 0
+        self._files_failed = 0
+        self._files_sized = 0
+        self._bytes_total = 0
+        self._bytes_done = 0
+        self._start_time = time.monotonic()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_files(self, count: int = 1, total_bytes: Optional[int] = None, sized: int = 0):
+        """
+        Declare files to be downloaded.
+
+        :param count: Number of files.
+        :param total_bytes: Total size of the files whose sizes are known.
+        :param sized: Number of the files whose sizes are known.
+        """
+        with self._lock:
+            self._files_total += count
+            self._bytes_total += total_bytes or 0
+            self._files_sized += sized
+
+    def add_file_size(self, size: int):
+        """
+        Declare the size of a declared file, once it is known (e.g. after the resolution).
+        """
+        with self._lock:
+            self._bytes_total += size
+            self._files_sized += 1
+
+    def update_bytes(self, size: int):
+        with self._lock:
+            self._bytes_done += size
+
+    def file_done(self):
+        with self._lock:
+            self._files_done += 1
+
+    def file_failed(self):
+        with self._lock:
+            self._files_failed += 1
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            return ProgressSnapshot(
+                self.desc, self._files_total, self._files_done, self._files_failed, self._files_sized,
+                self._bytes_total, self._bytes_done, time.monotonic() - self._start_time,
+            )
+
+    def _refresh_loop(self):
+        while not self._stopped.wait(self.interval):
+            self._emit(lambda sink, snapshot: sink.update(snapshot))
+
+    def _emit(self, fn: Callable[[ProgressSink, ProgressSnapshot], None]):
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            try:
+                fn(sink, snapshot)
+            except Exception:
+                logging.exception(f'Error in progress sink {sink!r}.')
+
+    def start(self) -> 'ProgressAggregator':
+        if self.sinks and self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._emit(lambda sink, snapshot: sink.close(snapshot))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_PROGRESS_MODES = {
+    'tqdm': lambda: [TqdmProgressSink()],
+    'logging': lambda: [LoggingProgressSink()],
+    'json': lambda: [JsonProgressSink()],
+    'silent': lambda: [],
+}
+_progress_mode = 'tqdm'
+_current_progress = ContextVar('progress', default=None)
+
+
+def set_progress_mode(mode: str):
+    """
+    Set the default output of the progress of album downloads.
+
+    :param mode: One of ``tqdm`` (default), ``logging``, ``json`` and ``silent``.
+    :type mode: str
+    """
+    global _progress_mode
+    if mode not in _PROGRESS_MODES:
+        raise ValueError(f'Unknown progress mode {mode!r}, should be one of {list(_PROGRESS_MODES)!r}.')
+    _progress_mode = mode
+
+
+def get_current_progress() -> Optional[ProgressAggregator]:
+    """
+    Get the progress aggregator of the current context, set by :func:`progress_scope`.
+    """
+    return _current_progress.get()
+
+
+@contextmanager
+def progress_scope(desc: Optional[str] = None, progress: Optional[ProgressAggregator] = None):
+    """
+    Use one progress aggregator in the current context. When the context already has one (e.g. an album
+    downloaded as part of a larger job), it is reused, so all the jobs share one progress.
+
+    :param desc: Description of the newly created aggregator.
+    :type desc: Optional[str]
+    :param progress: Aggregator to use, its lifecycle is left to the caller. A new one with the default \
+        sinks is created and closed afterwards if not given.
+    :type progress: Optional[ProgressAggregator]
+    """
+    if progress is not None:
+        token = _current_progress.set(progress)
+        try:
+            yield progress
+        finally:
+            _current_progress.reset(token)
+        return
+
+    current = _current_progress.get()
+    if current is not None:
+        yield current
+        return
+
+    progress = ProgressAggregator(_PROGRESS_MODES[_progress_mode](), desc=desc)
+    token = _current_progress.set(progress)
+    try:
+        with progress:
+            yield progress
+    finally:
+        _current_progress.reset(token)
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import deque, defaultdict
+from typing import Dict, Deque
+
+
+class _HostWindow:
+    __slots__ = ('requests', 'retries')
+
+    def __init__(self):
+        self.requests: Deque[float] = deque()
+        self.retries: Deque[float] = deque()
+
+
+class RetryBudget:
+    """
+    Retry budget shared by the sessions for each host, so a failing host does not turn every request into
+    a retry storm. Within the sliding window, the retries to a host are limited to ``min_retries`` plus
+    ``ratio`` of its requests, then the retries are refused until the budget refills.
+
+    :param ratio: Retries allowed for each request in the window. (default: ``0.2``)
+    :type ratio: float
+    :param min_retries: Retries always allowed in the window, for the hosts with few requests. (default: ``10``)
+    :type min_retries: int
+    :param window: Seconds of the sliding window. (default: ``10``)
+    :type window: float
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostWindow] = defaultdict(_HostWindow)
+
+    def _expire(self, host_window: _HostWindow, now: float):
+        for queue in (host_window.requests, host_window.retries):
+            while queue and queue[0] <= now - self.window:
+                queue.popleft()
+
+    def _sweep(self, now: float):
+        # the CDN hosts often change from one file to another, the idle ones are dropped
+        for host in list(self._hosts):
+            host_window = self._hosts[host]
+            self._expire(host_window, now)
+            if not host_window.requests and not host_window.retries:
+                del self._hosts[host]
+
+    def record_request(self, host: str):
+        """
+        Record a request (not a retry) to the host, which refills its budget.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if host not in self._hosts and len(self._hosts) >= 1024:
+                self._sweep(now)
+            host_window = self._hosts[host]
+            self._expire(host_window, now)
+            host_window.requests.append(now)
+
+    def try_retry(self, host: str) -> bool:
+        """
+        Withdraw a retry to the host from the budget.
+
+        :returns: ``False`` if the budget of the host is exhausted, then the request should not be retried.
+        :rtype: bool
+        """
+        now = time.monotonic()
+        with self._lock:
+            host_window = self._hosts[host]
+            self._expire(host_window, now)
+            if len(host_window.retries) >= self.min_retries + self.ratio * len(host_window.requests):
+                return False
+            host_window.retries.append(now)
+            return True
+
+    def available(self, host: str) -> float:
+        """
+        Retries to the host currently allowed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            host_window = self._hosts[host]
+            self._expire(host_window, now)
+            return max(self.min_retries + self.ratio * len(host_window.requests) - len(host_window.retries), 0.0)
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+#: Process-wide budget used by the sessions of :func:`netdriveurls.utils.get_requests_session`.
+global_retry_budget = RetryBudget()
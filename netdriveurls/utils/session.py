@@ -1,14 +1,90 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 from functools import lru_cache
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, List
+from urllib.parse import urlsplit
 
 import requests
 from random_user_agent.params import SoftwareName, OperatingSystem
 from random_user_agent.user_agent import UserAgent
 from requests.adapters import HTTPAdapter, Retry
+from requests.utils import select_proxy
+
+from .deadline import get_deadline, DeadlineExceededError
+from .hooks import EventHooks, emit_event, has_listeners
+from .retry_budget import RetryBudget, global_retry_budget
+from .timing import TIMED_POOL_CLASSES, pop_last_timings
 
 DEFAULT_TIMEOUT = 10  # seconds
 
 
+class HookedRetry(Retry):
+    """
+    Retry configuration emitting the ``retry`` event on each retry.
+
+    The retries also stop early, as if they were exhausted, when the deadline of the context
+    (see :func:`netdriveurls.utils.deadline_scope`) would be reached before the next attempt, or when the
+    retry budget of the host is exhausted.
+
+    :param hooks: Hooks of the session, the event is emitted to the global hooks as well. (default: None)
+    :type hooks: Optional[EventHooks]
+    :param jitter: Part of the backoff time randomized, ``1.0`` means a random backoff between ``0`` and \
+        the exponential one (full jitter), so the retries of the concurrent requests do not land at once. \
+        (default: ``0.0``)
+    :type jitter: float
+    :param budget: Retry budget shared by the requests to the same host. (default: None)
+    :type budget: Optional[RetryBudget]
+    """
+
+    def __init__(self, *args, hooks: Optional[EventHooks] = None, jitter: float = 0.0,
+                 budget: Optional[RetryBudget] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hooks = hooks
+        self.jitter = jitter
+        self.budget = budget
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.hooks = self.hooks
+        retry.jitter = self.jitter
+        retry.budget = self.budget
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if self.jitter and backoff > 0:
+            backoff *= random.uniform(1.0 - self.jitter, 1.0)
+        return backoff
+
+    def _next_wait(self, response) -> float:
+        if response is not None and self.respect_retry_after_header:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None:
+                return retry_after
+        return self.get_backoff_time()
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        host = getattr(_pool, 'host', None) or urlsplit(url or '').hostname
+        deadline = get_deadline()
+        if (deadline is not None and deadline.remaining() <= new_retry._next_wait(response)) or \
+                (self.budget is not None and host and not self.budget.try_retry(host)):
+            # no retry left in time or in the budget, raised as the exhausted retries
+            return Retry.increment(self.new(total=0), method, url, response, error, _pool, _stacktrace)
+
+        if has_listeners('retry', self.hooks):
+            emit_event(
+                'retry', self.hooks,
+                method=method, url=url, host=getattr(_pool, 'host', None),
+                attempt=len(new_retry.history), status=response.status if response is not None else None,
+                error=error,
+            )
+        return new_retry
+
+
 class TimeoutHTTPAdapter(HTTPAdapter):
     """
     Custom HTTP adapter that sets a default timeout for requests.
@@ -28,6 +104,12 @@ class TimeoutHTTPAdapter(HTTPAdapter):
 
     :param timeout: The default timeout value in seconds. (default: 10)
     :type timeout: int
+    :param hooks: Hooks receiving the ``request_start``, ``request_end`` and ``request_timings`` events. \
+        (default: None)
+    :type hooks: Optional[EventHooks]
+
+    The connections are instrumented, the phase timings of each response are available as
+    ``response.timings`` (see :class:`netdriveurls.utils.RequestTimings`).
     """
 
     def __init__(self, *args, **kwargs):
@@ -35,6 +117,9 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         if "timeout" in kwargs:
             self.timeout = kwargs["timeout"]
             del kwargs["timeout"]
+        self.hooks: Optional[EventHooks] = kwargs.pop("hooks", None)
+        self._prewarm_lock = threading.Lock()
+        self._prewarming = set()
         super().__init__(*args, **kwargs)
 
     def send(self, request, **kwargs):
@@ -51,12 +136,110 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         timeout = kwargs.get("timeout")
         if timeout is None:
             kwargs["timeout"] = self.timeout
+        deadline = get_deadline()
+        if deadline is not None:
+            deadline.raise_if_expired()
+            kwargs["timeout"] = deadline.clamp_timeout(kwargs["timeout"])
+        budget = getattr(self.max_retries, 'budget', None)
+        if budget is not None:
+            budget.record_request(urlsplit(request.url).hostname)
+        pop_last_timings()
+        if not has_listeners('request_start', self.hooks) and not has_listeners('request_end', self.hooks) and \
+                not has_listeners('request_timings', self.hooks):
+            response = self._send_in_time(request, deadline, **kwargs)
+            response.timings = pop_last_timings()
+            return response
+
+        method, url, host = request.method, request.url, urlsplit(request.url).hostname
+        emit_event('request_start', self.hooks, method=method, url=url, host=host)
+        start_time = time.perf_counter()
+        try:
+            response = self._send_in_time(request, deadline, **kwargs)
+        except Exception as err:
+            emit_event('request_end', self.hooks, method=method, url=url, host=host,
+                       status=None, bytes=None, latency=time.perf_counter() - start_time, error=err,
+                       timings=pop_last_timings())
+            raise
+
+        timings = response.timings = pop_last_timings()
+        content_length = response.headers.get('Content-Length')
+        emit_event('request_end', self.hooks, method=method, url=url, host=host,
+                   status=response.status_code, bytes=int(content_length) if content_length else None,
+                   latency=time.perf_counter() - start_time, error=None, timings=timings)
+        if timings is not None and has_listeners('request_timings', self.hooks):
+            status = response.status_code
+            timings.when_finished(lambda t: emit_event(
+                'request_timings', self.hooks, method=method, url=url, host=host, status=status, timings=t))
+        return response
+
+    def _send_in_time(self, request, deadline, **kwargs):
+        try:
+            return self._send(request, **kwargs)
+        except requests.exceptions.RequestException as err:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceededError(f'Deadline exceeded when requesting {request.url!r}.',
+                                            request=request) from err
+            raise
+
+    def _send(self, request, **kwargs):
+        # the actual transport, replaced by the adapters of the other clients
         return super().send(request, **kwargs)
 
+    def prewarm(self, url: str, verify=True, cert=None, proxies=None) -> bool:
+        """
+        Open a connection (TLS handshake included) to the host of the url and keep it in the pool, so the next
+        request to the host skips the setup. Nothing is done when the pool already has an idle connection,
+        or when the host is reached through a proxy.
+
+        :param url: Url of the host.
+        :type url: str
+        :returns: Whether a new connection is opened.
+        :rtype: bool
+        """
+        if select_proxy(url, proxies):
+            return False
+        split = urlsplit(url)
+        key = (split.scheme, split.hostname, split.port)
+        with self._prewarm_lock:
+            if key in self._prewarming:
+                return False
+            self._prewarming.add(key)
+        try:
+            if hasattr(self, 'get_connection_with_tls_context'):
+                pool = self.get_connection_with_tls_context(requests.Request('GET', url).prepare(), verify,
+                                                            proxies=proxies, cert=cert)
+            else:  # pragma: no cover
+                pool = self.get_connection(url, proxies)
+                self.cert_verify(pool, url, verify, cert)
+            if pool.pool is None or any(conn is not None for conn in list(pool.pool.queue)):
+                return False
+
+            conn = pool._get_conn()
+            try:
+                if conn.is_connected:
+                    return False
+                conn.connect()
+                # the setup is not paid by the next request, which is measured as on a reused connection
+                conn._connect_phases = None
+                return True
+            except Exception:
+                conn.close()
+                raise
+            finally:
+                pool._put_conn(conn)
+        finally:
+            with self._prewarm_lock:
+                self._prewarming.discard(key)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+
 
 def get_requests_session(max_retries: int = 5, timeout: int = DEFAULT_TIMEOUT, verify: bool = True,
-                         headers: Optional[Dict[str, str]] = None, session: Optional[requests.Session] = None) \
-        -> requests.Session:
+                         headers: Optional[Dict[str, str]] = None, session: Optional[requests.Session] = None,
+                         hooks: Optional[EventHooks] = None, http2: bool = False,
+                         transport: Optional[str] = None) -> requests.Session:
     """
     Returns a requests Session object configured with retry and timeout settings.
 
@@ -68,18 +251,38 @@ def get_requests_session(max_retries: int = 5, timeout: int = DEFAULT_TIMEOUT, v
     :type headers: Optional[Dict[str, str]]
     :param session: An existing requests Session object to use. If not provided, a new Session object is created. (default: None)
     :type session: Optional[requests.Session]
+    :param hooks: Hooks receiving the events of this session, in addition to the global hooks. (default: None)
+    :type hooks: Optional[EventHooks]
+    :param http2: Send the requests with HTTP/2 through :class:`netdriveurls.utils.HTTPXAdapter`, \
+        which requires the ``http2`` extra. (default: False)
+    :type http2: bool
+    :param transport: Name of the transport sending the requests, ``requests``, ``httpx`` or ``pycurl``. \
+        The one set by :func:`netdriveurls.utils.set_transport` is used when not given, \
+        as well as the ones set for the specific hosts. (default: None)
+    :type transport: Optional[str]
     :returns: The requests Session object.
     :rtype: requests.Session
     """
     session = session or requests.session()
-    retries = Retry(
+    retries = HookedRetry(
         total=max_retries, backoff_factor=1,
         status_forcelist=[408, 413, 429, 500, 501, 502, 503, 504, 505, 506, 507, 509, 510, 511],
         allowed_methods=["HEAD", "GET", "POST", "PUT", "DELETE", "OPTIONS", "TRACE"],
+        hooks=hooks, jitter=1.0, budget=global_retry_budget,
     )
-    adapter = TimeoutHTTPAdapter(max_retries=retries, timeout=timeout, pool_connections=32, pool_maxsize=32)
+    from .transport import get_transport, get_host_transports, create_transport_adapter
+    if http2:
+        transport = 'httpx'
+    adapter = create_transport_adapter(transport or get_transport(), max_retries=retries, timeout=timeout,
+                                       hooks=hooks)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    if not transport:
+        for host, host_transport in get_host_transports().items():
+            host_adapter = create_transport_adapter(host_transport, max_retries=retries, timeout=timeout,
+                                                    hooks=hooks)
+            session.mount(f'http://{host}/', host_adapter)
+            session.mount(f'https://{host}/', host_adapter)
     session.headers.update({
         "User-Agent": get_random_ua(),
         **dict(headers or {}),
@@ -90,6 +293,80 @@ def get_requests_session(max_retries: int = 5, timeout: int = DEFAULT_TIMEOUT, v
     return session
 
 
+def get_session_hooks(session: requests.Session) -> Optional[EventHooks]:
+    """
+    Get the hooks attached to the session by :func:`get_requests_session`.
+
+    :param session: The requests Session object.
+    :type session: requests.Session
+    :returns: The hooks of the session, ``None`` if no hooks attached.
+    :rtype: Optional[EventHooks]
+    """
+    adapter = session.adapters.get('https://')
+    return getattr(adapter, 'hooks', None)
+
+
+_prewarm_executor: Optional[ThreadPoolExecutor] = None
+_prewarm_executor_lock = threading.Lock()
+
+
+def _get_prewarm_executor() -> ThreadPoolExecutor:
+    global _prewarm_executor
+    with _prewarm_executor_lock:
+        if _prewarm_executor is None:
+            _prewarm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prewarm')
+        return _prewarm_executor
+
+
+def _prewarm_one(adapter, url: str, verify, cert, proxies):
+    try:
+        adapter.prewarm(url, verify=verify, cert=cert, proxies=proxies)
+    except Exception as err:
+        # the request itself will report the error
+        logging.debug(f'Failed to prewarm the connection to {url!r} - {err!r}.')
+
+
+def prewarm_connections(session: requests.Session, urls: Iterable[str], max_hosts: int = 8,
+                        wait: bool = False) -> List[str]:
+    """
+    Open the connections to the hosts of the urls in the background, e.g. to the CDN hosts of the upcoming
+    items while the listing is still being processed, so their downloads skip the DNS, TCP and TLS setup.
+
+    Only the adapters of the ``requests`` transport keep the opened connections, the others ignore it.
+
+    :param session: The session sending the requests later.
+    :type session: requests.Session
+    :param urls: Urls of the upcoming requests, only one connection is opened for each host.
+    :type urls: Iterable[str]
+    :param max_hosts: Max number of the hosts prewarmed. (default: ``8``)
+    :type max_hosts: int
+    :param wait: Wait for the connections to be opened. (default: ``False``)
+    :type wait: bool
+    :returns: Base urls of the hosts prewarmed.
+    :rtype: List[str]
+    """
+    hosts = {}
+    for url in urls:
+        split = urlsplit(url)
+        if split.scheme in ('http', 'https') and split.netloc:
+            hosts.setdefault(f'{split.scheme}://{split.netloc}/', None)
+            if len(hosts) >= max_hosts:
+                break
+
+    executor = _get_prewarm_executor()
+    futures = []
+    for base_url in hosts:
+        adapter = session.get_adapter(base_url)
+        if isinstance(adapter, TimeoutHTTPAdapter):
+            # the same settings as the requests (e.g. $REQUESTS_CA_BUNDLE), so they share the same pool
+            settings = session.merge_environment_settings(base_url, {}, None, None, None)
+            futures.append(executor.submit(_prewarm_one, adapter, base_url, settings['verify'], settings['cert'],
+                                           settings['proxies']))
+    if wait:
+        wait_futures(futures)
+    return list(hosts)
+
+
 @lru_cache()
 def _ua_pool():
     software_names = [SoftwareName.CHROME.value, SoftwareName.FIREFOX.value, SoftwareName.EDGE.value]
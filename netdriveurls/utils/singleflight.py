@@ -0,0 +1,104 @@
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Mapping, Tuple
+
+import requests
+
+#: Request headers which change the response, so they are part of the key of :func:`request_key`.
+RELEVANT_HEADERS = ('Accept', 'Authorization', 'Cookie', 'Range')
+
+
+def request_key(method: str, url: str, headers: Optional[Mapping[str, str]] = None) -> Tuple:
+    """
+    Key of a request for :class:`SingleFlight`, the same method, url and relevant headers give the same key.
+    """
+    headers = {key.lower(): value for key, value in (headers or {}).items()}
+    return (method.upper(), url,
+            tuple((name, headers[name.lower()]) for name in RELEVANT_HEADERS if name.lower() in headers))
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce the identical concurrent calls, the callers arriving while a call with the same key is running
+    wait for it and share its result (or its error) instead of running it again.
+    Nothing is kept once the call is finished, so later calls run again.
+
+    Example:
+    ```python
+    flight = SingleFlight()
+    data = flight.do(request_key('GET', url), lambda: session.get(url).json())
+    ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        #: Number of the calls served by another caller's call.
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+#: Process-wide instance shared by the resolving helpers.
+global_singleflight = SingleFlight()
+
+
+def single_flight(method: str = 'GET', flight: Optional[SingleFlight] = None):
+    """
+    Decorate a helper like ``fn(url, session=None)``, so the concurrent calls with the same url share one
+    request and its parsed result. The relevant headers sent by the session for the url (e.g. its
+    ``Authorization`` and its cookies, see :data:`RELEVANT_HEADERS`) are part of the key, so the calls of
+    different accounts are not shared.
+
+    :param method: Method of the request made for the url. (default: ``GET``)
+    :type method: str
+    :param flight: Instance to use. (default: :data:`global_singleflight`)
+    :type flight: Optional[SingleFlight]
+    """
+
+    def _decorator(fn):
+        name = f'{fn.__module__}.{fn.__qualname__}'
+
+        @wraps(fn)
+        def _wrapped(url: str, *args, **kwargs):
+            session = kwargs.get('session', args[0] if args else None)
+            # the headers the session would send, its cookies for the url included
+            headers = session.prepare_request(requests.Request(method, url)).headers \
+                if isinstance(session, requests.Session) else None
+            key = (name, request_key(method, url, headers))
+            return (flight or global_singleflight).do(key, fn, url, *args, **kwargs)
+
+        return _wrapped
+
+    return _decorator
@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+import requests
+
+#: Bytes per second under which a transfer is considered stalled by default.
+LOW_SPEED_LIMIT = 1024
+#: Seconds the speed has to stay under the limit before the transfer is aborted by default.
+LOW_SPEED_TIME = 30.0
+
+
+class StalledTransferError(requests.exceptions.ConnectionError):
+    """
+    Raised when a transfer stays under the low-speed limit for too long.
+    """
+    pass
+
+
+class LowSpeedMonitor:
+    """
+    Curl-style low-speed check of a transfer, like ``--speed-limit`` and ``--speed-time``. The average speed
+    is measured over windows of ``seconds``, the transfer is aborted once one of them is under ``limit``.
+
+    :param limit: Bytes per second.
+    :type limit: float
+    :param seconds: Length of the windows in seconds.
+    :type seconds: float
+    """
+
+    def __init__(self, limit: float, seconds: float):
+        self.limit = limit
+        self.seconds = seconds
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+    def reset(self):
+        """
+        Start a new window, e.g. after reconnecting.
+        """
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+    def pause(self, seconds: float):
+        """
+        Leave a wait of our own out of the current window, e.g. of the bandwidth limit.
+        """
+        self._window_start += seconds
+
+    def update(self, n: int):
+        """
+        Count the newly received bytes.
+
+        :raises StalledTransferError: If the speed of the elapsed window is under the limit.
+        """
+        self._window_bytes += n
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= self.seconds:
+            if self._window_bytes < self.limit * elapsed:
+                raise StalledTransferError(f'Transfer stalled, {self._window_bytes / elapsed:.1f} bytes/s '
+                                           f'in the last {elapsed:.1f}s, under {self.limit} bytes/s.')
+            self._window_start, self._window_bytes = now, 0
+
+
+_current_low_speed = ContextVar('low_speed', default=None)
+
+
+def get_low_speed_limit() -> Tuple[float, float]:
+    """
+    Get the ``(limit, seconds)`` low-speed limit of the current context, set by :func:`low_speed_scope`.
+    """
+    return _current_low_speed.get() or (LOW_SPEED_LIMIT, LOW_SPEED_TIME)
+
+
+@contextmanager
+def low_speed_scope(limit: Optional[float] = None, seconds: Optional[float] = None):
+    """
+    Set the low-speed limit of the downloads in the context. A download staying under ``limit`` bytes per second
+    for ``seconds`` is reconnected and continued from where it stopped.
+
+    Example:
+    ```python
+    with low_speed_scope(10 * 1024, 20):  # under 10KiB/s for 20s
+        from_url('https://bunkr.si/a/xxxxxxxx').download_to_directory('dst')
+    ```
+
+    :param limit: Bytes per second, ``0`` disables the check, ``None`` keeps the current one.
+    :type limit: Optional[float]
+    :param seconds: Seconds under the limit, ``None`` keeps the current one.
+    :type seconds: Optional[float]
+    """
+    current_limit, current_seconds = get_low_speed_limit()
+    token = _current_low_speed.set((
+        limit if limit is not None else current_limit,
+        seconds if seconds is not None else current_seconds,
+    ))
+    try:
+        yield
+    finally:
+        _current_low_speed.reset(token)
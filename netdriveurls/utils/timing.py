@@ -0,0 +1,309 @@
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable, List, Tuple
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection as _connection
+
+from .dns import global_dns_cache
+
+
+class RequestTimings:
+    """
+    Phase timings (in seconds) of one HTTP request.
+
+    * ``dns``: name resolution, ``0`` on reused connections.
+    * ``connect``: TCP connection, ``0`` on reused connections.
+    * ``tls``: TLS handshake, ``0`` on reused or plain-text connections.
+    * ``ttfb``: from the request being sent to the response headers being received.
+    * ``transfer``: from the response headers to the body being consumed, ``None`` until then.
+    * ``reused``: whether the connection was reused from the pool.
+    """
+    __slots__ = ('dns', 'connect', 'tls', 'ttfb', 'transfer', 'reused', '_headers_time', '_callbacks')
+
+    def __init__(self, dns: float = 0.0, connect: float = 0.0, tls: float = 0.0, ttfb: float = 0.0,
+                 reused: bool = False):
+        self.dns = dns
+        self.connect = connect
+        self.tls = tls
+        self.ttfb = ttfb
+        self.transfer: Optional[float] = None
+        self.reused = reused
+        self._headers_time = time.perf_counter()
+        self._callbacks: List[Callable[['RequestTimings'], None]] = []
+
+    @property
+    def total(self) -> float:
+        return self.dns + self.connect + self.tls + self.ttfb + (self.transfer or 0.0)
+
+    def finish_transfer(self):
+        if self.transfer is None:
+            self.transfer = time.perf_counter() - self._headers_time
+            callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                callback(self)
+
+    def when_finished(self, callback: Callable[['RequestTimings'], None]):
+        """
+        Call the callback once the transfer is finished, immediately if it already is.
+        """
+        if self.transfer is None:
+            self._callbacks.append(callback)
+        else:
+            callback(self)
+
+    def to_json(self) -> dict:
+        return {
+            'dns': self.dns, 'connect': self.connect, 'tls': self.tls,
+            'ttfb': self.ttfb, 'transfer': self.transfer, 'reused': self.reused,
+        }
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} ' \
+               f'{", ".join(f"{key}: {value!r}" for key, value in self.to_json().items())}>'
+
+
+_local = threading.local()
+
+
+def pop_last_timings() -> Optional[RequestTimings]:
+    """
+    Pop the timings of the latest response received in the current thread.
+    """
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings
+
+
+def set_last_timings(timings: Optional[RequestTimings]):
+    """
+    Set the timings of the latest response received in the current thread, used by the other transports.
+    """
+    _local.timings = timings
+
+
+def resolve_host(host: str, port: int) -> List[Tuple]:
+    """
+    Resolve the host into the address infos used to open TCP connections, cached by
+    :data:`netdriveurls.utils.global_dns_cache`.
+    """
+    return global_dns_cache.resolve(host, port)
+
+
+class RequestAbortedError(Exception):
+    """
+    Raised by the requests stopped by :meth:`RequestAbort.abort`, they are not retried.
+    """
+    pass
+
+
+class RequestAbort:
+    """
+    Handle to stop the requests of a context (see :func:`abort_scope`) from another thread, e.g. the primary
+    request of a hedge once the duplicate has won. The connection of the running request is shut down, so its
+    blocking read returns at once.
+
+    Only the connections of :class:`netdriveurls.utils.TimeoutHTTPAdapter` can be aborted, the requests of the
+    other transports run to their end.
+    """
+
+    def __init__(self):
+        self.aborted = False
+        self.finished = False
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def attach(self, connection):
+        """
+        Called by the connections before sending each request in the context.
+
+        :raises RequestAbortedError: If already aborted.
+        """
+        with self._lock:
+            if self.aborted:
+                raise RequestAbortedError('Request aborted.')
+            self._connection = connection
+
+    def finish(self) -> bool:
+        """
+        Mark the requests of the context as finished, so they are not aborted any more.
+
+        :returns: ``False`` if they were aborted before.
+        :rtype: bool
+        """
+        with self._lock:
+            if not self.aborted:
+                self.finished = True
+            return not self.aborted
+
+    def abort(self) -> bool:
+        """
+        Abort the running request, and the ones sent later in the context.
+
+        :returns: ``False`` if the requests were already finished or aborted.
+        :rtype: bool
+        """
+        with self._lock:
+            if self.finished or self.aborted:
+                return False
+            self.aborted = True
+            connection = self._connection
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            try:
+                # the plain socket, so the TLS state used by the reading thread is left as it is
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return True
+
+
+_current_abort = ContextVar('request_abort', default=None)
+
+
+@contextmanager
+def abort_scope(abort: RequestAbort):
+    """
+    Make the requests sent in the context abortable by the handle, see :class:`RequestAbort`.
+    """
+    token = _current_abort.set(abort)
+    try:
+        yield abort
+    finally:
+        _current_abort.reset(token)
+
+
+class _TimedConnectionMixin:
+    """
+    Connection measuring the DNS, TCP and TLS phases when connecting, and the time-to-first-byte
+    of each request. The timings of the latest request are kept in ``timings``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings: Optional[RequestTimings] = None
+        self._connect_phases: Optional[Tuple[float, float, float]] = None
+        self._dns_seconds = 0.0
+        self._tcp_seconds = 0.0
+        self._request_sent_time = None
+
+    def _new_conn(self) -> socket.socket:
+        start_time = time.perf_counter()
+        try:
+            address_infos = resolve_host(self._dns_host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        self._dns_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        sock, last_error = None, None
+        for _, _, _, _, sockaddr in address_infos:
+            # like urllib3, the next address is tried when one of them fails, e.g. a dead A or AAAA record
+            try:
+                sock = _connection.create_connection(
+                    sockaddr[:2],
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options,
+                )
+                break
+            except OSError as e:
+                last_error = e
+        if sock is None:
+            # the cached addresses may be stale, the next connection resolves the host again
+            global_dns_cache.invalidate(self._dns_host)
+            if isinstance(last_error, socket.timeout):
+                raise ConnectTimeoutError(
+                    self,
+                    f"Connection to {self.host} timed out. (connect timeout={self.timeout})",
+                ) from last_error
+            raise NewConnectionError(self, f"Failed to establish a new connection: {last_error}") from last_error
+        self._tcp_seconds = time.perf_counter() - start_time
+
+        sys.audit("http.client.connect", self, self.host, self.port)
+        return sock
+
+    def connect(self):
+        self._dns_seconds, self._tcp_seconds = 0.0, 0.0
+        start_time = time.perf_counter()
+        super().connect()
+        total = time.perf_counter() - start_time
+        self._connect_phases = (self._dns_seconds, self._tcp_seconds,
+                                max(total - self._dns_seconds - self._tcp_seconds, 0.0))
+
+    def request(self, *args, **kwargs):
+        abort = _current_abort.get()
+        if abort is not None:
+            abort.attach(self)
+        super().request(*args, **kwargs)
+        self._request_sent_time = time.perf_counter()
+        if abort is not None and abort.aborted:
+            # aborted while connecting, before the socket could be shut down
+            raise RequestAbortedError('Request aborted.')
+
+    def getresponse(self, *args, **kwargs):
+        try:
+            response = super().getresponse(*args, **kwargs)
+        except Exception as err:
+            abort = _current_abort.get()
+            if abort is not None and abort.aborted:
+                # not one of the errors of urllib3, so the aborted request is not retried
+                raise RequestAbortedError('Request aborted.') from err
+            raise
+        ttfb = time.perf_counter() - (self._request_sent_time or time.perf_counter())
+        if self._connect_phases is not None:
+            dns, connect, tls = self._connect_phases
+            self.timings = RequestTimings(dns, connect, tls, ttfb, reused=False)
+        else:
+            self.timings = RequestTimings(ttfb=ttfb, reused=True)
+        self._connect_phases = None
+        _local.timings = self.timings
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedPoolMixin:
+    def _put_conn(self, conn):
+        timings = getattr(conn, 'timings', None)
+        if timings is not None:
+            timings.finish_transfer()
+        return super()._put_conn(conn)
+
+
+class TimedHTTPConnectionPool(_TimedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(_TimedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+#: Pool classes used by :class:`netdriveurls.utils.TimeoutHTTPAdapter`.
+TIMED_POOL_CLASSES = {
+    'http': TimedHTTPConnectionPool,
+    'https': TimedHTTPSConnectionPool,
+}
+
+
+def get_response_timings(response) -> Optional[RequestTimings]:
+    """
+    Get the phase timings of a requests response sent through :class:`netdriveurls.utils.TimeoutHTTPAdapter`.
+
+    :param response: The requests response.
+    :returns: The timings, ``None`` if not available.
+    :rtype: Optional[RequestTimings]
+    """
+    return getattr(response, 'timings', None)
@@ -0,0 +1,265 @@
+import os
+import threading
+from http.client import HTTPMessage
+from typing import Optional, Dict, Callable, List, Tuple, Iterator
+
+import requests
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import MaxRetryError, ResponseError
+
+from .hooks import EventHooks
+from .session import TimeoutHTTPAdapter
+from .timing import RequestTimings, set_last_timings
+
+#: Environment variable of the default transport of the process, e.g. ``NETDRIVEURLS_TRANSPORT=pycurl``.
+TRANSPORT_ENV = 'NETDRIVEURLS_TRANSPORT'
+
+#: Connection-specific headers, which are managed by the clients themselves (and forbidden in HTTP/2).
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade', 'te'}
+
+
+class _OriginalResponse:
+    # what requests reads to extract the cookies
+    def __init__(self, headers: List[Tuple[str, str]]):
+        self.msg = HTTPMessage()
+        for key, value in headers:
+            self.msg[key] = value
+
+
+class _RetryResponse:
+    # what urllib3's Retry reads from a response
+    def __init__(self, status: int, headers: CaseInsensitiveDict):
+        self.status = status
+        self.headers = headers
+
+    def get_redirect_location(self):
+        return False
+
+
+class ClientRaw:
+    """
+    Body of a response received by a :class:`ClientAdapter`, used as ``response.raw`` by requests.
+
+    :param status: Status code.
+    :type status: int
+    :param headers: Header pairs in the order received, duplicated names (e.g. ``Set-Cookie``) included.
+    :type headers: List[Tuple[str, str]]
+    :param reason: Reason phrase.
+    :type reason: str
+    :param http_version: HTTP version, e.g. ``HTTP/2``.
+    :type http_version: str
+    :param timings: Phase timings of the request, if the client measures them.
+    :type timings: Optional[RequestTimings]
+    """
+
+    def __init__(self, status: int, headers: List[Tuple[str, str]], reason: str = '', http_version: str = '',
+                 timings: Optional[RequestTimings] = None):
+        self.status = status
+        self.header_pairs = headers
+        self.reason = reason
+        self.http_version = http_version
+        self.timings = timings
+        self.headers = CaseInsensitiveDict()
+        for key, value in headers:
+            self.headers[key] = f'{self.headers[key]}, {value}' if key in self.headers else value
+        self._original_response = _OriginalResponse(headers)
+        self._buffer = b''
+        self._iter = None
+
+    def _iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        # decoded body chunks, the client's errors raised as the ones of requests
+        raise NotImplementedError  # pragma: no cover
+
+    def stream(self, chunk_size: Optional[int] = None, decode_content: bool = True) -> Iterator[bytes]:
+        if self._buffer:
+            buffer, self._buffer = self._buffer, b''
+            yield buffer
+        try:
+            yield from self._iter_chunks(chunk_size or (1 << 16))
+        finally:
+            self.release_conn()
+        if self.timings is not None:
+            self.timings.finish_transfer()
+
+    def read(self, amt: Optional[int] = None, decode_content: bool = True) -> bytes:
+        if self._iter is None:
+            self._iter = self.stream(max(amt or 0, 1 << 16))
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._iter, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self.release_conn()
+
+    def release_conn(self):
+        raise NotImplementedError  # pragma: no cover
+
+
+class ClientAdapter(TimeoutHTTPAdapter):
+    """
+    Base of the adapters sending the requests with other HTTP clients, so the sessions, the drives and the
+    resolvers use them without any change. The timeouts, the retries (the same ``max_retries``) and the events
+    work in the same way as :class:`TimeoutHTTPAdapter`.
+
+    Subclasses implement :meth:`_open`, which sends the request once and returns a :class:`ClientRaw` once the
+    headers are received, raising the client's own errors listed in :attr:`retryable_errors` so they are retried.
+    """
+
+    #: Errors of the client raised by :meth:`_open` which can be retried.
+    retryable_errors: Tuple[type, ...] = ()
+
+    def _open(self, request: requests.PreparedRequest, timeout, verify, cert, proxies) -> ClientRaw:
+        raise NotImplementedError  # pragma: no cover
+
+    def _to_requests_error(self, err: Exception, request: requests.PreparedRequest) -> requests.RequestException:
+        return requests.exceptions.ConnectionError(err, request=request)
+
+    def prewarm(self, url: str, verify=True, cert=None, proxies=None) -> bool:
+        # the connections are kept by the client itself
+        return False
+
+    def _build_response(self, request: requests.PreparedRequest, raw: ClientRaw) -> requests.Response:
+        response = requests.Response()
+        response.status_code = raw.status
+        response.headers = CaseInsensitiveDict(raw.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = raw
+        response.reason = raw.reason
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, raw)
+        return response
+
+    def _send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        method, url = request.method, request.url
+        retries = self.max_retries
+        while True:
+            try:
+                raw = self._open(request, timeout, verify, cert, proxies)
+            except self.retryable_errors as err:
+                try:
+                    retries = retries.increment(method, url, error=err)
+                except MaxRetryError:
+                    raise self._to_requests_error(err, request)
+                retries.sleep()
+                continue
+
+            if retries.is_retry(method, raw.status, 'Retry-After' in raw.headers):
+                retry_response = _RetryResponse(raw.status, raw.headers)
+                try:
+                    retries = retries.increment(method, url, response=retry_response)
+                except MaxRetryError as err:
+                    if retries.raise_on_status:
+                        raw.close()
+                        if isinstance(err.reason, ResponseError):
+                            raise requests.exceptions.RetryError(err, request=request)
+                        raise requests.exceptions.ConnectionError(err, request=request)  # pragma: no cover
+                else:
+                    raw.close()
+                    retries.sleep(retry_response)
+                    continue
+
+            set_last_timings(raw.timings)
+            return self._build_response(request, raw)
+
+
+#: Factories of the transports, called with ``max_retries``, ``timeout`` and ``hooks``.
+_TRANSPORTS: Dict[str, Callable[..., TimeoutHTTPAdapter]] = {}
+_lock = threading.Lock()
+_default_transport: Optional[str] = None
+_host_transports: Dict[str, str] = {}
+
+
+def register_transport(name: str, factory: Callable[..., TimeoutHTTPAdapter]):
+    """
+    Register a transport, the factory is called with ``max_retries``, ``timeout`` and ``hooks``,
+    and returns the adapter mounted to the sessions.
+    """
+    _TRANSPORTS[name] = factory
+
+
+def _requests_transport(**kwargs):
+    return TimeoutHTTPAdapter(pool_connections=32, pool_maxsize=32, **kwargs)
+
+
+def _httpx_transport(**kwargs):
+    from .httpx_adapter import HTTPXAdapter
+    return HTTPXAdapter(**kwargs)
+
+
+def _pycurl_transport(**kwargs):
+    from .curl_adapter import PycurlAdapter
+    return PycurlAdapter(**kwargs)
+
+
+register_transport('requests', _requests_transport)
+register_transport('httpx', _httpx_transport)
+register_transport('pycurl', _pycurl_transport)
+
+
+def _check_transport(name: str):
+    if name not in _TRANSPORTS:
+        raise ValueError(f'Unknown transport {name!r}, {sorted(_TRANSPORTS)!r} expected.')
+
+
+def set_transport(name: Optional[str], host: Optional[str] = None):
+    """
+    Set the transport of the sessions created afterwards by :func:`netdriveurls.utils.get_requests_session`.
+
+    Example:
+    ```python
+    set_transport('pycurl')  # default of the process
+    set_transport('httpx', host='imgbox.com')  # many small images, HTTP/2 is faster
+    set_transport(None, host='imgbox.com')  # back to the default
+    ```
+
+    :param name: Name of the transport, ``requests`` (the default), ``httpx`` or ``pycurl``. \
+        ``None`` means the default.
+    :type name: Optional[str]
+    :param host: Only use the transport for this host. (default: all the hosts)
+    :type host: Optional[str]
+    """
+    global _default_transport
+    if name is not None:
+        _check_transport(name)
+    with _lock:
+        if host is None:
+            _default_transport = name
+        elif name is None:
+            _host_transports.pop(host.lower(), None)
+        else:
+            _host_transports[host.lower()] = name
+
+
+def get_transport(host: Optional[str] = None) -> str:
+    """
+    Get the name of the transport used for the host, or the default one when host is not given.
+    """
+    with _lock:
+        if host is not None and host.lower() in _host_transports:
+            return _host_transports[host.lower()]
+        return _default_transport or os.environ.get(TRANSPORT_ENV) or 'requests'
+
+
+def get_host_transports() -> Dict[str, str]:
+    """
+    Get the transports set for the specific hosts.
+    """
+    with _lock:
+        return dict(_host_transports)
+
+
+def create_transport_adapter(name: str, max_retries, timeout, hooks: Optional[EventHooks] = None) \
+        -> TimeoutHTTPAdapter:
+    _check_transport(name)
+    return _TRANSPORTS[name](max_retries=max_retries, timeout=timeout, hooks=hooks)
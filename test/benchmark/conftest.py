@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from netdriveurls.drives.gofile import gofile_token_pool
+from .server import StandInServer, make_routing_adapter_class
+
+
+def _env_int_list(name: str, default: str):
+    return [int(item) for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+#: Album sizes to benchmark, ``BENCHMARK_ALBUM_SIZES=10,100`` for a quick run.
+ALBUM_SIZES = _env_int_list('BENCHMARK_ALBUM_SIZES', '10,100,1000,10000')
+#: Size of each file in bytes.
+FILE_SIZE = int(os.environ.get('BENCHMARK_FILE_SIZE', str(16 * 1024)))
+#: Injected latency in seconds before each response.
+LATENCY = float(os.environ.get('BENCHMARK_LATENCY', '0'))
+#: Bandwidth cap in bytes per second for each response, 0 means unlimited.
+BANDWIDTH = int(os.environ.get('BENCHMARK_BANDWIDTH', '0'))
+#: Where the results of the end-to-end benchmarks are recorded.
+REPORT_FILE = os.environ.get('BENCHMARK_E2E_JSON', 'benchmark_e2e.json')
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get('BENCHMARK'):
+        return
+
+    skip = pytest.mark.skip(reason='benchmarks only run with BENCHMARK=1, see "make benchmark".')
+    for item in items:
+        if 'benchmark' in item.keywords and str(item.fspath).startswith(os.path.dirname(__file__)):
+            item.add_marker(skip)
+
+
+class PeakRSSSampler:
+    def __init__(self, interval: float = 0.01):
+        import psutil
+        self._process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+
+@pytest.fixture(scope='session')
+def e2e_report():
+    records = []
+    yield records
+    if records:
+        with open(REPORT_FILE, 'w') as f:
+            json.dump({
+                'timestamp': time.time(),
+                'file_size': FILE_SIZE,
+                'latency': LATENCY,
+                'bandwidth': BANDWIDTH or None,
+                'records': records,
+            }, f, indent=4, sort_keys=True)
+
+
+@pytest.fixture()
+def stand_in_factory(mocker, tmp_path):
+    servers = []
+    # isolate the on-disk caches (e.g. gofile tokens) from the real ones
+    mocker.patch.dict(os.environ, {'NETDRIVEURLS_CACHE_DIR': str(tmp_path / 'cache')})
+    mocker.patch('netdriveurls.drives.gofile._wt_memo', None)
+    mocker.patch.object(gofile_token_pool, '_tokens', [])
+
+    def _create(n_items: int) -> StandInServer:
+        server = StandInServer(n_items=n_items, file_size=FILE_SIZE,
+                               latency=LATENCY, bandwidth=BANDWIDTH or None).start()
+        servers.append(server)
+        server.adapter_cls = make_routing_adapter_class(server)
+        mocker.patch.dict('netdriveurls.utils.transport._TRANSPORTS', {
+            'requests': lambda **kwargs: server.adapter_cls(pool_connections=32, pool_maxsize=32, **kwargs),
+        })
+        mocker.patch('netdriveurls.utils.transport._default_transport', 'requests')
+        mocker.patch('netdriveurls.utils.transport._host_transports', {})
+        return server
+
+    yield _create
+    for s in servers:
+        s.stop()
@@ -0,0 +1,390 @@
+"""
+Local stand-in server imitating the pages and APIs of the supported hosts.
+
+Every request sent through a session created by :func:`netdriveurls.utils.get_requests_session` is
+routed to this server by :class:`LocalRoutingAdapter`, the original host is kept in the
+``X-Forwarded-Host`` header, so the drives can be benchmarked end-to-end without touching the real
+hosts.
+"""
+import hashlib
+import html
+import io
+import json
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from netdriveurls.utils import TimeoutHTTPAdapter
+
+JPG5SU_PAGE_SIZE = 42
+GOFILE_WT_CODE = '4fd6sg89d7s6'
+GOFILE_TOKEN = 'benchmarkguesttoken'
+
+
+class StandInContent:
+    def __init__(self, file_size: int):
+        self.file_size = file_size
+        self.data = (bytes(range(256)) * (file_size // 256 + 1))[:file_size]
+        self.md5 = hashlib.md5(self.data).hexdigest()
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def zip_of(self, count: int) -> bytes:
+        with io.BytesIO() as bf:
+            with zipfile.ZipFile(bf, 'w', compression=zipfile.ZIP_STORED) as zf:
+                for i in range(count):
+                    zf.writestr(f'file_{i}.bin', self.data)
+            return bf.getvalue()
+
+
+class StandInServer:
+    """
+    Threading HTTP server holding one album of ``n_items`` files for each supported host.
+
+    :param n_items: Number of files in each album.
+    :param file_size: Size of each file in bytes.
+    :param latency: Injected latency in seconds before each response.
+    :param bandwidth: Bandwidth cap in bytes per second for each response body, ``None`` means unlimited.
+    """
+
+    def __init__(self, n_items: int = 10, file_size: int = 16384,
+                 latency: float = 0.0, bandwidth: Optional[int] = None):
+        self.n_items = n_items
+        self.content = StandInContent(file_size)
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+        self._lock = threading.Lock()
+        self.request_counts: Dict[str, int] = defaultdict(int)
+        self.bytes_sent = 0
+        self._zip_cache: Dict[int, bytes] = {}
+
+        server = self
+
+        class _Handler(_StandInRequestHandler):
+            stand_in = server
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.request_counts.clear()
+            self.bytes_sent = 0
+
+    @property
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def _count(self, host: str, size: int):
+        with self._lock:
+            self.request_counts[host] += 1
+            self.bytes_sent += size
+
+    def zip_of(self, count: int) -> bytes:
+        with self._lock:
+            if count not in self._zip_cache:
+                self._zip_cache[count] = self.content.zip_of(count)
+            return self._zip_cache[count]
+
+    # album urls of each host, used as the entry of the benchmarks
+    @property
+    def album_urls(self) -> Dict[str, str]:
+        return {
+            'bunkr': 'https://bunkr.si/a/benchalbum',
+            'jpg5su': 'https://jpg5.su/a/benchalbum.AbCd',
+            'gofile': 'https://gofile.io/d/benchfolder',
+            'pixeldrain': 'https://pixeldrain.com/l/benchlist',
+            'cyberdrop': 'https://cyberdrop.me/a/benchalbum',
+            'dropbox': 'https://www.dropbox.com/scl/fo/benchfolder/benchkey?rlkey=x',
+            'pixhost': 'https://pixhost.to/gallery/benchgallery',
+        }
+
+    @property
+    def file_counts(self) -> Dict[str, int]:
+        return {name: self.n_items for name in self.album_urls}
+
+
+def _page(body: str) -> str:
+    return f'<!DOCTYPE html><html><head><title>stand-in</title></head><body>{body}</body></html>'
+
+
+def _og_page(image_url: str) -> str:
+    return ('<!DOCTYPE html><html><head>'
+            f'<meta property="og:image" content="{html.escape(image_url)}">'
+            '</head><body></body></html>')
+
+
+def render_bunkr_album(n_items: int) -> str:
+    items = ''.join(
+        f'<div><a href="https://bunkr.si/i/item{i}"><img src="https://i-cdn1.bunkr.si/item{i}-thumb.png"></a>'
+        f'<div class="details"><p>file_{i}.jpg</p><p>16 KB</p></div></div>'
+        for i in range(n_items)
+    )
+    return _page(f'<div class="grid-images">{items}</div>')
+
+
+def render_bunkr_image(id_: str) -> str:
+    return _page(f'<div class="lightgallery"><img src="https://cdn1.bunkr.si/{id_}.jpg"></div>')
+
+
+def render_jpg5su_album_page(n_items: int, page: int) -> str:
+    start = (page - 1) * JPG5SU_PAGE_SIZE
+    end = min(start + JPG5SU_PAGE_SIZE, n_items)
+    items = ''.join(
+        f'<div class="list-item"><div class="list-item-desc-title">'
+        f'<a href="https://jpg5.su/img/file-{i}.id{i}">file_{i}</a></div></div>'
+        for i in range(start, end)
+    )
+    nav = ''
+    if end < n_items:
+        nav = f'<a data-pagination="next" href="https://jpg5.su/a/benchalbum.AbCd/?page={page + 1}">Next</a>'
+    return _page(f'<div class="pad-content-listing">{items}</div>{nav}')
+
+
+def render_jpg5su_image(id_: str) -> str:
+    return _og_page(f'https://simp6.jpg5.su/images/{id_}.jpg')
+
+
+def render_cyberdrop_album(n_items: int) -> str:
+    items = ''.join(
+        f'<div><a id="file" href="/f/file{i}" title="file_{i}.bin">file_{i}.bin</a></div>'
+        for i in range(n_items)
+    )
+    return _page(f'<div id="table">{items}</div>')
+
+
+def render_imgbox_gallery(n_items: int) -> str:
+    items = ''.join(f'<a href="https://imgbox.com/item{i:04d}"><img src="https://thumbs2.imgbox.com/t{i}.jpg"></a>'
+                    for i in range(n_items))
+    return _page(f'<div id="gallery-view-content">{items}</div>')
+
+
+def render_postimg_gallery(n_items: int) -> str:
+    items = ''.join(f'<div data-image="item{i}" data-name="file_{i}" data-ext="jpg"></div>'
+                    for i in range(n_items))
+    return _page(f'<div id="thumb-list">{items}</div>')
+
+
+def render_pixhost_show(id_: str) -> str:
+    return _page(f'<div class="image"><img id="image" src="https://img1.pixhost.to/images/1/{id_}.jpg"></div>')
+
+
+def render_saint2_embed(id_: str) -> str:
+    return _page(f'<video><source src="https://data.saint2.cr/data/{id_}.mp4" type="video/mp4"></video>')
+
+
+def build_gofile_contents(n_items: int, file_size: int, md5: str) -> dict:
+    children = {}
+    for i in range(n_items):
+        id_ = f'gofile{i}'
+        children[id_] = {
+            'id': id_, 'type': 'file', 'name': f'file_{i}.bin', 'parentFolder': 'benchfolder',
+            'link': f'https://store1.gofile.io/download/web/{id_}/file_{i}.bin',
+            'size': file_size, 'md5': md5,
+        }
+    return {
+        'id': 'benchfolder', 'type': 'folder', 'name': 'benchfolder', 'code': 'benchfolder',
+        'children': children,
+    }
+
+
+class _StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stand_in: StandInServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/html; charset=utf-8',
+              headers: Optional[List[Tuple[str, str]]] = None):
+        server = self.stand_in
+        if server.latency:
+            time.sleep(server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or []):
+            self.send_header(key, value)
+        self.end_headers()
+        server._count(self._host, len(body))
+        if self.command == 'HEAD':
+            return
+
+        if server.bandwidth:
+            chunk_size = max(1024, server.bandwidth // 20)
+            for i in range(0, len(body), chunk_size):
+                self.wfile.write(body[i:i + chunk_size])
+                time.sleep(min(chunk_size, len(body) - i) / server.bandwidth)
+        else:
+            self.wfile.write(body)
+
+    def _send_html(self, text: str):
+        self._send(200, text.encode('utf-8'))
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data).encode('utf-8'), content_type='application/json')
+
+    def _send_file(self, filename: Optional[str] = None, body: Optional[bytes] = None):
+        headers = []
+        if filename:
+            headers.append(('Content-Disposition', f'attachment; filename="{filename}"'))
+        self._send(200, body if body is not None else self.stand_in.content.data,
+                   content_type='application/octet-stream', headers=headers)
+
+    def _not_found(self):
+        self._send(404, b'Not Found', content_type='text/plain')
+
+    @property
+    def _host(self) -> str:
+        return self.headers.get('X-Forwarded-Host') or self.headers.get('Host')
+
+    def do_HEAD(self):
+        self._dispatch()
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch()
+
+    def _dispatch(self):
+        host = self._host
+        split = urlsplit(self.path)
+        segments = [s for s in split.path.split('/') if s]
+        query = parse_qs(split.query)
+        server = self.stand_in
+        n_items = server.n_items
+        content = server.content
+
+        # bunkr
+        if host == 'bunkr.si' and segments[:1] == ['a']:
+            return self._send_html(render_bunkr_album(n_items))
+        elif host == 'bunkr.si' and segments[:1] == ['i']:
+            return self._send_html(render_bunkr_image(segments[1]))
+        elif host == 'cdn1.bunkr.si':
+            return self._send_file()
+
+        # jpg5su
+        elif host == 'jpg5.su' and segments[:1] == ['a']:
+            page = int(query.get('page', ['1'])[0])
+            return self._send_html(render_jpg5su_album_page(n_items, page))
+        elif host == 'jpg5.su' and segments[:1] == ['img']:
+            return self._send_html(render_jpg5su_image(segments[1].rsplit('.', maxsplit=1)[-1]))
+        elif host == 'simp6.jpg5.su':
+            return self._send_file()
+
+        # gofile
+        elif host == 'api.gofile.io' and segments == ['accounts'] and self.command == 'POST':
+            return self._send_json({'status': 'ok', 'data': {'token': GOFILE_TOKEN}})
+        elif host == 'gofile.io' and segments == ['dist', 'js', 'alljs.js']:
+            return self._send(200, f'var appdata = {{ wt: "{GOFILE_WT_CODE}" }};'.encode(),
+                              content_type='application/javascript')
+        elif host == 'api.gofile.io' and segments[:1] == ['contents']:
+            if query.get('wt') != [GOFILE_WT_CODE] or \
+                    self.headers.get('Authorization') != f'Bearer {GOFILE_TOKEN}':
+                return self._send_json({'status': 'error-notPremium'})
+            return self._send_json({'status': 'ok', 'data': build_gofile_contents(
+                n_items, content.file_size, content.md5)})
+        elif host == 'store1.gofile.io':
+            return self._send_file()
+
+        # pixeldrain
+        elif host == 'pixeldrain.com' and segments[:2] == ['api', 'list']:
+            return self._send_json({'id': segments[2], 'files': [
+                {'id': f'pd{i}', 'name': f'file_{i}.bin', 'size': content.file_size,
+                 'hash_sha256': content.sha256}
+                for i in range(n_items)
+            ]})
+        elif host == 'pixeldrain.com' and segments[:2] == ['api', 'file'] and segments[3:4] == ['info']:
+            return self._send_json({'id': segments[2], 'name': f'{segments[2]}.bin', 'size': content.file_size,
+                                    'hash_sha256': content.sha256})
+        elif host == 'pixeldrain.com' and segments[:2] == ['api', 'file']:
+            return self._send_file()
+
+        # cyberdrop
+        elif host == 'cyberdrop.me' and segments[:1] == ['a']:
+            return self._send_html(render_cyberdrop_album(n_items))
+        elif host == 'api.cyberdrop.me' and segments[:3] == ['api', 'file', 'info']:
+            id_ = segments[3]
+            return self._send_json({'name': f'{id_}.bin', 'size': content.file_size,
+                                    'auth_url': f'https://api.cyberdrop.me/api/file/auth/{id_}'})
+        elif host == 'api.cyberdrop.me' and segments[:3] == ['api', 'file', 'auth']:
+            return self._send_json({'url': f'https://k1-cd.cdn.gigachad-cdn.ru/api/file/d/{segments[3]}'})
+        elif host == 'k1-cd.cdn.gigachad-cdn.ru':
+            return self._send_file()
+
+        # dropbox / pixhost zips
+        elif host == 'www.dropbox.com' and segments[:2] == ['scl', 'fo']:
+            return self._send_file('benchfolder.zip', server.zip_of(n_items))
+        elif host == 'pixhost.to' and segments[:1] == ['gallery'] and segments[2:3] == ['download']:
+            return self._send_file('benchgallery.zip', server.zip_of(n_items))
+
+        return self._not_found()
+
+
+class LocalRoutingAdapter(TimeoutHTTPAdapter):
+    """
+    Adapter routing every request to the stand-in server, the response urls are restored afterwards,
+    so the drives see exactly the urls they requested.
+
+    The ``elapsed`` time of every response (time until the headers are parsed) is recorded as the
+    time-to-first-byte samples.
+    """
+    target: str = None
+    ttfb_samples: List[float] = None
+
+    def send(self, request, **kwargs):
+        origin_url = request.url
+        split = urlsplit(origin_url)
+        request.url = f'{self.target}{split.path or "/"}{"?" + split.query if split.query else ""}'
+        request.headers['X-Forwarded-Host'] = split.hostname
+        start_time = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        finally:
+            request.url = origin_url
+        self.ttfb_samples.append(time.perf_counter() - start_time)
+        response.url = origin_url
+        return response
+
+    def prewarm(self, url: str, verify=True, cert=None, proxies=None) -> bool:
+        # every host is the stand-in server, whose connections are already pooled
+        return False
+
+
+def make_routing_adapter_class(server: StandInServer):
+    return type('_RoutingAdapter', (LocalRoutingAdapter,), {
+        'target': server.address,
+        'ttfb_samples': [],
+    })
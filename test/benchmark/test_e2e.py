@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+from hbutils.system import TemporaryDirectory
+
+from netdriveurls.drives import from_url
+from .conftest import ALBUM_SIZES, PeakRSSSampler
+
+_HOSTS = ['bunkr', 'jpg5su', 'gofile', 'pixeldrain', 'cyberdrop', 'dropbox', 'pixhost']
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def _count_files(directory: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+@pytest.mark.benchmark
+class TestEndToEnd:
+    @pytest.mark.parametrize('n_items', ALBUM_SIZES)
+    @pytest.mark.parametrize('host', _HOSTS)
+    def test_album_download(self, host, n_items, stand_in_factory, e2e_report):
+        server = stand_in_factory(n_items)
+        url = server.album_urls[host]
+        ttfb_samples = server.adapter_cls.ttfb_samples
+
+        with TemporaryDirectory() as td:
+            session = from_url(url)
+            with PeakRSSSampler() as rss:
+                start_time = time.perf_counter()
+                session.download_to_directory(td)
+                elapsed = time.perf_counter() - start_time
+
+            files = _count_files(td)
+            total_bytes = files * server.content.file_size
+
+        assert files == n_items
+        record = {
+            'host': host,
+            'items': n_items,
+            'seconds': elapsed,
+            'files_per_second': files / elapsed,
+            'bytes_per_second': total_bytes / elapsed,
+            'requests': server.total_requests,
+            'requests_per_file': server.total_requests / files,
+            'ttfb_mean': sum(ttfb_samples) / len(ttfb_samples),
+            'ttfb_p50': _percentile(ttfb_samples, 0.5),
+            'ttfb_p95': _percentile(ttfb_samples, 0.95),
+            'peak_rss': rss.peak,
+        }
+        e2e_report.append(record)
@@ -0,0 +1,206 @@
+import tracemalloc
+
+import pytest
+
+from netdriveurls.drives import from_url, get_file_urls_for_bunkr_album, get_direct_url_for_bunkr_image, \
+    get_file_urls_for_jpg5su, get_og_image_url, get_file_links_for_cyberdrop, get_file_urls_for_imgbox, \
+    get_file_urls_from_postimg_gallery, get_direct_url_for_pixhost, get_direct_url_for_saint2, \
+    ResourceInvalidError
+from netdriveurls.drives.gofile import _extract_files
+from netdriveurls.resolve import is_resolvable
+from .server import render_bunkr_album, render_bunkr_image, render_jpg5su_album_page, render_jpg5su_image, \
+    render_cyberdrop_album, render_imgbox_gallery, render_postimg_gallery, render_pixhost_show, render_saint2_embed
+
+#: Urls of every supported net drive, none of them needs network to be classified.
+_DRIVE_URLS = [
+    'https://www.mediafire.com/file/abcdefghijklmno/file.zip/file',
+    'https://www.dropbox.com/scl/fo/abcdefgh/ijklmn?rlkey=x&dl=0',
+    'https://www.dropbox.com/scl/fi/abcdefgh/file.zip?rlkey=x&dl=0',
+    'https://gofile.io/d/AbCdEf',
+    'https://cyberdrop.me/f/AbCdEfGh',
+    'https://cyberdrop.me/a/AbCdEfGh',
+    'https://jpg5.su/img/file-name.AbCdEf',
+    'https://jpg5.su/a/album-name.AbCd',
+    'https://ibb.co/AbCdEfG',
+    'https://saint2.su/embed/AbCdEfGh',
+    'https://bunkr.si/i/AbCdEfGh',
+    'https://bunkr.si/a/AbCdEfGh',
+    'https://bunkr.si/v/AbCdEfGh',
+    'https://bunkr.si/d/AbCdEfGh',
+    'https://pixhost.to/gallery/AbCdE',
+    'https://pixhost.to/show/123/45678_file.jpg',
+    'https://imgbox.com/AbCdEfGh',
+    'https://imgbox.com/g/AbCdEfGh',
+    'https://pixeldrain.com/u/AbCdEfGh',
+    'https://pixeldrain.com/l/AbCdEfGh',
+    'https://www.imagebam.com/image/AbCdEfGh',
+    'https://www.imagebam.com/view/AbCdEfGh',
+    'https://postimg.cc/AbCdEfGh',
+    'https://postimg.cc/gallery/AbCdEfGh',
+    'https://cyberfile.me/AbCd',
+    'https://imgvb.com/image/AbCdEf',
+]
+#: Urls no net drive is able to handle.
+_UNKNOWN_URLS = [
+    'https://example.com/some/page.html',
+    'https://github.com/deepghs/netdriveurls',
+    'https://huggingface.co/datasets/deepghs/some_dataset',
+]
+#: Urls handled by the resolvers, only used without network access.
+_RESOLVABLE_URLS = [
+    'https://cyberdrop.me/e/AbCdEfGh',
+    'https://cyberdrop.me/AbCdEfGh',
+    'https://www.dropbox.com/s/abcdefgh/file.zip?dl=0',
+    'https://www.dropbox.com/sh/abcdefgh/ijklmn?dl=0',
+    'https://cdn9.bunkr.si/file-AbCdEfGh.mp4',
+]
+_CORPUS_REPEAT = 40
+
+
+def _traced_peak(func, *args, **kwargs) -> int:
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _run(benchmark, func, *args, **kwargs):
+    # the peak memory is measured once outside the timed rounds, so tracemalloc does not skew the timings
+    benchmark.extra_info['peak_memory'] = _traced_peak(func, *args, **kwargs)
+    return benchmark(func, *args, **kwargs)
+
+
+class _FixtureResponse:
+    # no validators, so the pages are parsed on every round instead of being served by the http cache
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class _FixtureSession:
+    """
+    Session replaying saved fixture pages, so only the extraction is measured.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, **kwargs):
+        return _FixtureResponse(url, self.pages[url])
+
+
+def _make_gofile_tree(n_nodes: int, fanout: int = 10):
+    root = {'id': 'root', 'type': 'folder', 'name': 'root', 'children': {}}
+    folders = [root]
+    count, f = 1, 0
+    while count < n_nodes:
+        parent = folders[f]
+        f += 1
+        for i in range(fanout):
+            if count >= n_nodes:
+                break
+            id_ = f'node{count}'
+            if count % 3 == 0:
+                node = {'id': id_, 'type': 'folder', 'name': f'folder_{count}',
+                        'parentFolder': parent['id'], 'children': {}}
+                folders.append(node)
+            else:
+                node = {'id': id_, 'type': 'file', 'name': f'file_{count}.bin', 'parentFolder': parent['id'],
+                        'link': f'https://store1.gofile.io/download/web/{id_}/file_{count}.bin',
+                        'size': count, 'md5': '0' * 32}
+            parent['children'][id_] = node
+            count += 1
+    return root
+
+
+def _classify(urls):
+    for url in urls:
+        try:
+            from_url(url)
+        except ResourceInvalidError:
+            pass
+
+
+@pytest.mark.benchmark
+class TestDispatchMicro:
+    def test_from_url(self, benchmark):
+        _run(benchmark, _classify, (_DRIVE_URLS + _UNKNOWN_URLS) * _CORPUS_REPEAT)
+
+    def test_is_resolvable(self, benchmark):
+        urls = (_DRIVE_URLS + _UNKNOWN_URLS + _RESOLVABLE_URLS) * _CORPUS_REPEAT
+        _run(benchmark, lambda: [is_resolvable(url) for url in urls])
+
+    @pytest.mark.parametrize('url', _DRIVE_URLS)
+    def test_get_resource_id(self, benchmark, url):
+        session = from_url(url)
+        _run(benchmark, session._get_resource_id)
+
+
+@pytest.mark.benchmark
+class TestExtractorMicro:
+    @pytest.mark.parametrize('n_items', [100, 1000])
+    def test_bunkr_album(self, benchmark, n_items):
+        url = 'https://bunkr.si/a/benchalbum'
+        session = _FixtureSession({url: render_bunkr_album(n_items)})
+        assert len(_run(benchmark, get_file_urls_for_bunkr_album, url, session=session)) == n_items
+
+    def test_bunkr_image(self, benchmark):
+        url = 'https://bunkr.si/i/item0'
+        session = _FixtureSession({url: render_bunkr_image('item0')})
+        _run(benchmark, get_direct_url_for_bunkr_image, url, session=session)
+
+    def test_jpg5su_album_page(self, benchmark):
+        url = 'https://jpg5.su/a/benchalbum.AbCd'
+        session = _FixtureSession({url: render_jpg5su_album_page(42, 1)})
+        assert len(_run(benchmark, get_file_urls_for_jpg5su, url, session=session)) == 42
+
+    def test_og_image(self, benchmark):
+        url = 'https://jpg5.su/img/file-0.id0'
+        session = _FixtureSession({url: render_jpg5su_image('id0')})
+        _run(benchmark, get_og_image_url, url, session=session)
+
+    @pytest.mark.parametrize('n_items', [100, 1000])
+    def test_cyberdrop_album(self, benchmark, n_items):
+        url = 'https://cyberdrop.me/a/benchalbum'
+        session = _FixtureSession({url: render_cyberdrop_album(n_items)})
+        assert len(_run(benchmark, get_file_links_for_cyberdrop, url, session=session)) == n_items
+
+    @pytest.mark.parametrize('n_items', [100, 1000])
+    def test_imgbox_gallery(self, benchmark, n_items):
+        url = 'https://imgbox.com/g/benchgallery'
+        session = _FixtureSession({url: render_imgbox_gallery(n_items)})
+        assert len(_run(benchmark, get_file_urls_for_imgbox, url, session=session)) == n_items
+
+    @pytest.mark.parametrize('n_items', [100, 1000])
+    def test_postimg_gallery(self, benchmark, n_items):
+        url = 'https://postimg.cc/gallery/benchgallery'
+        session = _FixtureSession({url: render_postimg_gallery(n_items)})
+        assert len(_run(benchmark, get_file_urls_from_postimg_gallery, url, session=session)) == n_items
+
+    def test_pixhost_show(self, benchmark):
+        url = 'https://pixhost.to/show/1/item0_file.jpg'
+        session = _FixtureSession({url: render_pixhost_show('item0')})
+        _run(benchmark, get_direct_url_for_pixhost, url, session=session)
+
+    def test_saint2_embed(self, benchmark):
+        url = 'https://saint2.su/embed/item0'
+        session = _FixtureSession({url: render_saint2_embed('item0')})
+        _run(benchmark, get_direct_url_for_saint2, url, session=session)
+
+
+@pytest.mark.benchmark
+class TestGoFileMicro:
+    @pytest.mark.parametrize('n_nodes', [1000, 100000])
+    def test_extract_files(self, benchmark, n_nodes):
+        tree = _make_gofile_tree(n_nodes)
+        benchmark.extra_info['nodes'] = n_nodes
+        _run(benchmark, _extract_files, tree)
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from importlib.util import find_spec
+
+import pytest
+
+from netdriveurls.utils import get_requests_session
+
+#: Transports compared, the ones whose client is not installed are skipped.
+_TRANSPORTS = [
+    pytest.param(name, marks=pytest.mark.skipif(module is not None and find_spec(module) is None,
+                                                reason=f'{module} not installed'))
+    for name, module in [('requests', None), ('httpx', 'httpx'), ('pycurl', 'pycurl')]
+]
+_BULK_SIZE = 64 * 1024 * 1024
+_SMALL_SIZE = 4 * 1024
+_SMALL_COUNT = 200
+_CHUNK = b'\0' * (1 << 20)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately, delayed acks must not dominate the small requests
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        size = _BULK_SIZE if self.path.startswith('/bulk') else _SMALL_SIZE
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        while size > 0:
+            self.wfile.write(_CHUNK[:min(size, len(_CHUNK))])
+            size -= len(_CHUNK)
+
+
+@pytest.fixture(scope='module')
+def transport_server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address[:2]
+    try:
+        yield f'http://{host}:{port}'
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _bulk(session, url):
+    total = 0
+    with session.get(url, stream=True) as resp:
+        for chunk in resp.iter_content(1 << 16):
+            total += len(chunk)
+    assert total == _BULK_SIZE
+
+
+def _small(session, url):
+    def _get(i):
+        return len(session.get(f'{url}?i={i}').content)
+
+    with ThreadPoolExecutor(8) as pool:
+        assert sum(pool.map(_get, range(_SMALL_COUNT))) == _SMALL_SIZE * _SMALL_COUNT
+
+
+@pytest.mark.benchmark
+class TestTransportBenchmark:
+    @pytest.mark.parametrize('transport', _TRANSPORTS)
+    def test_bulk(self, benchmark, transport_server, transport):
+        session = get_requests_session(transport=transport)
+        benchmark.extra_info['bytes'] = _BULK_SIZE
+        benchmark(_bulk, session, f'{transport_server}/bulk')
+
+    @pytest.mark.parametrize('transport', _TRANSPORTS)
+    def test_small(self, benchmark, transport_server, transport):
+        session = get_requests_session(transport=transport)
+        benchmark.extra_info['requests'] = _SMALL_COUNT
+        benchmark(_small, session, f'{transport_server}/small')
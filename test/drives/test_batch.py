@@ -0,0 +1,367 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+from netdriveurls.drives import batch_config, get_batch_config, is_fatal_error, classify_error, BatchDownloadError
+from netdriveurls.drives.base import ResourceDownloadError, ResourceInvalidError
+from netdriveurls.drives.batch import download_items, sum_sizes, ByteBudget
+from netdriveurls.utils import ProgressAggregator, progress_scope, get_current_progress, get_cancel_token
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f'{status} error', response=response)
+
+
+@pytest.mark.unittest
+class TestDrivesBatch:
+    def test_download_items(self):
+        progress = ProgressAggregator()
+        seen = []
+
+        def _download(name, size):
+            assert get_current_progress() is progress
+            get_current_progress().update_bytes(size)
+            seen.append(name)
+
+        with progress_scope(progress=progress):
+            download_items('https://example.com/a/album', [(f'f{i}', 10) for i in range(50)], _download,
+                           total_bytes=500, sized=50)
+
+        assert sorted(seen) == sorted(f'f{i}' for i in range(50))
+        snapshot = progress.snapshot()
+        assert snapshot.files_total == 50
+        assert snapshot.files_done == 50
+        assert snapshot.bytes_done == snapshot.bytes_total == 500
+
+    def test_download_items_errors(self):
+        progress = ProgressAggregator()
+
+        def _download(i):
+            if i % 10 == 0:
+                raise ValueError(i)
+
+        with progress_scope(progress=progress):
+            with pytest.raises(ResourceDownloadError, match=r'^3 errors found when downloading'):
+                download_items('https://example.com/a/album', [(i,) for i in range(30)], _download)
+
+        assert progress.snapshot().files_failed == 3
+        assert progress.snapshot().files_done == 27
+
+    def test_sum_sizes(self):
+        assert sum_sizes([1, None, 3]) == (4, 2)
+        assert sum_sizes([]) == (0, 0)
+
+    def test_bounded_submission(self):
+        lock = threading.Lock()
+        state = {'drawn': 0, 'finished': 0, 'max_ahead': 0}
+
+        def _items():
+            for i in range(500):
+                with lock:
+                    state['drawn'] += 1
+                    state['max_ahead'] = max(state['max_ahead'], state['drawn'] - state['finished'])
+                yield i,
+
+        def _download(i):
+            time.sleep(0.001)
+            with lock:
+                state['finished'] += 1
+
+        progress = ProgressAggregator()
+        with batch_config(max_workers=4, max_in_flight=8), progress_scope(progress=progress):
+            download_items('https://example.com/a/album', _items(), _download)
+
+        assert state['finished'] == 500
+        assert state['max_ahead'] <= 9
+        assert progress.snapshot().files_total == 500
+
+    def test_byte_budget(self):
+        lock = threading.Lock()
+        state = {'bytes': 0}
+        observed = set()
+
+        def _download(size):
+            with lock:
+                state['bytes'] += size
+                observed.add(state['bytes'])
+            time.sleep(0.005)
+            with lock:
+                state['bytes'] -= size
+
+        with batch_config(max_workers=8, byte_budget=300):
+            download_items('https://example.com/a/album', [(100,)] * 40 + [(1000,)], _download,
+                           size_of=lambda item: item[0])
+        # the oversized item is only started when nothing else is in flight
+        assert all(value <= 300 or value == 1000 for value in observed)
+        assert 1000 in observed
+
+    def test_batch_config(self):
+        assert get_batch_config().max_workers == 12
+        assert get_batch_config().fail_fast == 'never'
+        assert get_batch_config().in_flight_limit == 24
+        with batch_config(byte_budget=1024) as outer:
+            with batch_config(max_workers=2) as inner:
+                assert inner.byte_budget == 1024
+                assert inner.in_flight_limit == 4
+            assert get_batch_config() is outer
+        assert get_batch_config().byte_budget is None
+
+    def test_byte_budget_oversized(self):
+        budget = ByteBudget(100)
+        assert budget.acquire(1000) == 1000
+        budget.release(1000)
+        assert budget.acquire(None) == 0
+        assert budget.in_flight == 0
+
+    def test_is_fatal_error(self):
+        assert is_fatal_error(_http_error(404))
+        assert is_fatal_error(_http_error(403))
+        assert not is_fatal_error(_http_error(503))
+        assert not is_fatal_error(ValueError('x'))
+
+    @pytest.mark.parametrize(['fail_fast', 'status', 'cancelled'], [
+        ('fatal', 403, True),
+        ('fatal', 503, False),
+        ('any', 503, True),
+        ('never', 404, False),
+    ])
+    def test_fail_fast(self, fail_fast, status, cancelled):
+        lock = threading.Lock()
+        started = []
+
+        def _download(i):
+            with lock:
+                started.append(i)
+            if i == 0:
+                raise _http_error(status)
+            # stand-in of a streaming download checking the token on each chunk
+            for _ in range(5):
+                get_cancel_token().raise_if_cancelled()
+                time.sleep(0.002)
+
+        with batch_config(max_workers=2, max_in_flight=2, fail_fast=fail_fast):
+            if cancelled:
+                with pytest.raises(ResourceDownloadError, match='cancelled') as ei:
+                    download_items('https://example.com/a/album', [(i,) for i in range(40)], _download)
+                assert isinstance(ei.value.__cause__, requests.HTTPError)
+                assert len(started) < 5
+            else:
+                with pytest.raises(ResourceDownloadError, match='^1 error found'):
+                    download_items('https://example.com/a/album', [(i,) for i in range(40)], _download)
+                assert len(set(started)) == 40
+
+        with pytest.raises(ValueError):
+            with batch_config(fail_fast='sometimes'):
+                pass
+
+    def test_deleted_item(self):
+        # one deleted file does not cancel the rest of the album by default
+        seen = []
+
+        def _download(i):
+            if i == 0:
+                raise _http_error(404)
+            seen.append(i)
+
+        with batch_config(max_workers=2, max_in_flight=2), pytest.raises(BatchDownloadError) as err:
+            download_items('https://example.com/a/album', [(i,) for i in range(10)], _download)
+        assert sorted(seen) == list(range(1, 10))
+        assert err.value.summary.cancel_reason is None
+        assert (err.value.summary.failed, err.value.summary.skipped) == (1, 0)
+
+    def test_classify_error(self):
+        assert classify_error(_http_error(404)) == 'fatal'
+        assert classify_error(_http_error(503)) == 'transient'
+        assert classify_error(_http_error(400)) == 'permanent'
+        assert classify_error(requests.ConnectionError('reset')) == 'transient'
+        assert classify_error(ResourceInvalidError('no image')) == 'permanent'
+
+    def test_retry_deferred(self):
+        lock = threading.Lock()
+        attempts = {}
+        retry_threads = set()
+
+        def _download(i):
+            with lock:
+                attempts[i] = attempts.get(i, 0) + 1
+                if attempts[i] > 1:
+                    retry_threads.add(threading.get_ident())
+            if i % 10 == 0 and attempts[i] == 1:
+                raise requests.ConnectionError('reset by peer')
+            if i == 5:
+                raise ResourceInvalidError('no image found')
+
+        with batch_config(max_workers=8, retry_workers=1):
+            with pytest.raises(BatchDownloadError, match='^1 error found') as ei:
+                download_items('https://example.com/a/album', [(i,) for i in range(50)], _download)
+
+        summary = ei.value.summary
+        assert isinstance(ei.value, ResourceDownloadError)
+        assert summary.total == 50
+        assert summary.done == 49
+        assert summary.recovered == 5
+        assert len(retry_threads) == 1
+        assert attempts[5] == 1
+        assert summary.to_json()['failures'] == [{
+            'item': ['5'], 'error': 'ResourceInvalidError: no image found', 'kind': 'permanent', 'attempts': 1,
+        }]
+
+    def test_retry_exhausted(self):
+        def _download(i):
+            raise requests.ConnectionError('reset by peer')
+
+        with batch_config(retry_rounds=2):
+            with pytest.raises(BatchDownloadError, match='^3 errors found') as ei:
+                download_items('https://example.com/a/album', [(i,) for i in range(3)], _download)
+        assert [failure.attempts for failure in ei.value.summary.failures] == [3, 3, 3]
+        assert {failure.kind for failure in ei.value.summary.failures} == {'transient'}
+
+        with batch_config(retry_rounds=0):
+            with pytest.raises(BatchDownloadError) as ei:
+                download_items('https://example.com/a/album', [(i,) for i in range(3)], _download)
+        assert [failure.attempts for failure in ei.value.summary.failures] == [1, 1, 1]
+
+    def test_deadlines(self):
+        from netdriveurls.utils import get_deadline
+
+        remaining = {}
+
+        def _download(i):
+            deadline = get_deadline()
+            remaining[i] = deadline.remaining()
+            if i == 0:
+                time.sleep(0.3)
+                deadline.raise_if_expired()
+
+        with batch_config(job_timeout=60, file_timeout=0.2, retry_rounds=0):
+            with pytest.raises(BatchDownloadError) as err:
+                download_items('https://example.com/a/album', [(i,) for i in range(4)], _download)
+        failure, = err.value.summary.failures
+        assert failure.item == (0,)
+        assert failure.error.__class__.__name__ == 'DeadlineExceededError'
+        # each item has its own deadline, within the one of the job
+        assert all(0 < value <= 0.2 for value in remaining.values())
+        assert get_deadline() is None
+
+    def test_adaptive(self, monkeypatch):
+        from netdriveurls.drives import batch
+        from netdriveurls.utils import AdaptiveConcurrency
+
+        concurrency = AdaptiveConcurrency(initial=3, max_limit=6, cooldown=10)
+        monkeypatch.setattr(batch, 'global_concurrency', concurrency)
+        lock = threading.Lock()
+        state = {'running': 0, 'max_running': 0}
+
+        def _download(i):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.005)
+            with lock:
+                state['running'] -= 1
+
+        def _overloaded(i):
+            raise _http_error(503)
+
+        with batch_config(adaptive=True):
+            assert get_batch_config().adaptive
+            download_items('https://example.com/a/album', [(i,) for i in range(100)], _download)
+            assert state['max_running'] == 6
+            assert concurrency.limit('example.com') == 6
+
+            with batch_config(retry_rounds=0, fail_fast='never'), pytest.raises(BatchDownloadError):
+                download_items('https://example.com/a/album', [(i,) for i in range(4)], _overloaded)
+            # cut once by the burst of 503
+            assert concurrency.limit('example.com') == 3
+            assert concurrency.to_json()['example.com']['in_flight'] == 0
+        assert get_batch_config().adaptive is False
+
+    def test_interrupted(self):
+        chunks = []
+
+        def _items():
+            for i in range(30):
+                if i == 10:
+                    raise KeyboardInterrupt
+                yield i,
+
+        def _download(i):
+            # 100 chunks of 20ms, stopped at the next chunk once cancelled
+            for _ in range(100):
+                get_cancel_token().raise_if_cancelled()
+                chunks.append(i)
+                time.sleep(0.02)
+
+        start_time = time.monotonic()
+        with batch_config(max_workers=4, max_in_flight=10), pytest.raises(KeyboardInterrupt):
+            download_items('https://example.com/a/album', _items(), _download)
+        assert time.monotonic() - start_time < 0.5
+        assert len(chunks) < 4 * 10
+
+    def test_adaptive_hosts(self, monkeypatch):
+        from netdriveurls.drives import batch
+        from netdriveurls.utils import AdaptiveConcurrency
+
+        concurrency = AdaptiveConcurrency(initial=1, max_limit=1)
+        monkeypatch.setattr(batch, 'global_concurrency', concurrency)
+        slow_done = threading.Event()
+        fast_times = []
+
+        def _download(host, i):
+            if host == 'slow.example.com':
+                time.sleep(0.2)
+                if i == 3:
+                    slow_done.set()
+            else:
+                fast_times.append(time.monotonic())
+
+        # the items of the saturated host come first, the other host is not held up by them
+        items = [('slow.example.com', i) for i in range(4)] + [('fast.example.com', i) for i in range(4)]
+        start_time = time.monotonic()
+        with batch_config(adaptive=True):
+            download_items('https://example.com/a/album', items, _download,
+                           url_of=lambda item: f'https://{item[0]}/f/{item[1]}')
+        assert slow_done.is_set()
+        assert len(fast_times) == 4
+        assert max(fast_times) - start_time < 0.15
+        assert concurrency.to_json()['slow.example.com']['in_flight'] == 0
+
+    def test_prewarm_resolved(self, monkeypatch):
+        from netdriveurls.drives import batch, prewarm_resolved_url
+
+        prewarmed = []
+        monkeypatch.setattr(batch, 'prewarm_connections', lambda session, urls: prewarmed.extend(urls))
+
+        def _download(i):
+            # e.g. the CDN url resolved from the page of the item
+            prewarm_resolved_url(f'https://cdn{i % 3}.example.com/files/{i}')
+
+        items = [(i,) for i in range(30)]
+        download_items('https://example.com/a/album', items, _download,
+                       url_of=lambda item: f'https://example.com/f/{item[0]}', session=requests.Session())
+        assert prewarmed[0] == 'https://example.com/f/0'
+        assert sorted(urlsplit(url).netloc for url in prewarmed) == \
+               ['cdn0.example.com', 'cdn1.example.com', 'cdn2.example.com', 'example.com']
+
+        # nothing is prewarmed without the session, or outside the batches
+        prewarmed.clear()
+        download_items('https://example.com/a/album', items, _download)
+        prewarm_resolved_url('https://cdn0.example.com/files/0')
+        assert prewarmed == []
+
+    def test_is_overload_error(self):
+        from netdriveurls.drives import is_overload_error
+        from netdriveurls.utils import DeadlineExceededError
+
+        assert is_overload_error(_http_error(429))
+        assert is_overload_error(_http_error(503))
+        assert not is_overload_error(_http_error(404))
+        assert is_overload_error(requests.exceptions.ReadTimeout())
+        assert is_overload_error(requests.exceptions.ConnectionError())
+        assert not is_overload_error(DeadlineExceededError())
+        assert not is_overload_error(ValueError())
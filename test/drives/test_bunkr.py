@@ -0,0 +1,38 @@
+import pytest
+import responses
+
+from netdriveurls.drives import sep_from_url, BunkrImageDownloadSession, BunkrVideoDownloadSession, \
+    BunkrFileDownloadSession
+
+_ALBUM_URL = 'https://bunkr.si/a/album'
+
+
+def _album_item(href, title):
+    return f'<div><a href="{href}"></a><div class="details"><p>{title}</p></div></div>'
+
+
+@pytest.mark.unittest
+class TestDrivesBunkr:
+    def test_separate(self, tmp_path):
+        page = '<html><body><div class="grid-images">' + ''.join([
+            _album_item('/i/img1', 'first.jpg'),
+            _album_item('/v/vid1', 'clip.mp4'),
+            _album_item('/d/file1', ''),
+        ]) + '</div></body></html>'
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALBUM_URL, body=page)
+            sessions = sep_from_url(_ALBUM_URL)
+            assert [type(session) for session in sessions] == [
+                BunkrImageDownloadSession, BunkrVideoDownloadSession, BunkrFileDownloadSession,
+            ]
+            assert [session.page_url for session in sessions] == [
+                'https://bunkr.si/i/img1', 'https://bunkr.si/v/vid1', 'https://bunkr.si/d/file1',
+            ]
+            assert [session.filename for session in sessions] == ['first.jpg', 'clip.mp4', None]
+
+            # the album title is used instead of the name in the direct url
+            rsps.add(responses.GET, 'https://bunkr.si/i/img1',
+                     body='<div class="lightgallery"><img src="https://cdn1.bunkr.si/abc-123.jpg"></div>')
+            rsps.add(responses.GET, 'https://cdn1.bunkr.si/abc-123.jpg', body=b'image')
+            sessions[0].download_to_directory(str(tmp_path))
+        assert (tmp_path / 'first.jpg').read_bytes() == b'image'
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import sys
+
+import pytest
+import responses
+
+from netdriveurls.drives import gofile, iter_direct_urls_for_gofile_folder, sep_from_url, from_url, \
+    GoFileFileDownloadSession
+from netdriveurls.drives.gofile import GoFileTokenPool, GoFileLinkInvalidError, _get_wd_code, _CACHE, \
+    _extract_files
+
+_ACCOUNTS_URL = 'https://api.gofile.io/accounts'
+_ALLJS_URL = 'https://gofile.io/dist/js/alljs.js'
+
+
+@pytest.fixture()
+def gofile_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('NETDRIVEURLS_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(gofile, '_wt_memo', None)
+    monkeypatch.setattr(gofile.gofile_token_pool, '_tokens', [])
+    yield tmp_path
+
+
+def _add_accounts(rsps, *tokens):
+    for token in tokens:
+        rsps.add(responses.POST, _ACCOUNTS_URL, json={'status': 'ok', 'data': {'token': token}})
+
+
+def _file_node(name):
+    return {'id': name, 'type': 'file', 'name': name, 'link': f'https://store1.gofile.io/{name}',
+            'size': 1, 'md5': 'md5'}
+
+
+def _folder_ref(id_):
+    # sub folder listed without its children, as the api does for the nested folders
+    return {'id': id_, 'type': 'folder', 'name': id_, 'childrenCount': 1}
+
+
+def _add_contents(rsps, id_, children):
+    rsps.add(responses.GET, f'https://api.gofile.io/contents/{id_}', json={'status': 'ok', 'data': {
+        'id': id_, 'type': 'folder', 'name': id_, 'children': children,
+    }})
+
+
+@pytest.mark.unittest
+class TestDrivesGoFile:
+    def test_token_persisted(self, gofile_cache):
+        with responses.RequestsMock() as rsps:
+            _add_accounts(rsps, 'token1')
+            assert GoFileTokenPool().acquire() == 'token1'
+            # a new process reuses the persisted token instead of creating a guest account
+            assert GoFileTokenPool().acquire() == 'token1'
+            assert len(rsps.calls) == 1
+
+    def test_token_expired(self, gofile_cache):
+        with responses.RequestsMock() as rsps:
+            _add_accounts(rsps, 'token1', 'token2')
+            assert GoFileTokenPool(ttl=-1).acquire() == 'token1'
+            assert GoFileTokenPool().acquire() == 'token2'
+
+    def test_token_pool(self, gofile_cache):
+        with responses.RequestsMock() as rsps:
+            _add_accounts(rsps, 'token1', 'token2')
+            pool = GoFileTokenPool(size=2)
+            tokens = [pool.acquire() for _ in range(6)]
+            assert tokens[:2] == ['token1', 'token2']
+            assert sorted(set(tokens)) == ['token1', 'token2']
+            assert tokens[2:].count('token1') == tokens[2:].count('token2') == 2
+
+            pool.discard('token1')
+            assert GoFileTokenPool(size=1).acquire() == 'token2'
+
+    @pytest.mark.parametrize(['value', 'size'], [('3', 3), ('auto', 1), ('0', 1), ('', 1)])
+    def test_token_pool_size_env(self, monkeypatch, value, size):
+        monkeypatch.setenv('NETDRIVEURLS_GOFILE_TOKENS', value)
+        assert gofile._get_token_pool_size() == size
+
+    def test_wt_code_revalidated(self, gofile_cache, monkeypatch):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, body='var appdata = { wt: "code1" };', headers={'ETag': '"v1"'})
+            assert _get_wd_code() == 'code1'
+            monkeypatch.setattr(gofile, '_wt_memo', None)
+            assert _get_wd_code() == 'code1'
+            assert len(rsps.calls) == 1
+
+        # expire the entry, the unchanged file is not downloaded again
+        _CACHE.set('wt', 'code1', ttl=-1, etag='"v1"', last_modified=None)
+        monkeypatch.setattr(gofile, '_wt_memo', None)
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, status=304)
+            assert _get_wd_code() == 'code1'
+            assert rsps.calls[0].request.headers['If-None-Match'] == '"v1"'
+        assert _CACHE.get('wt') == 'code1'
+
+        _CACHE.set('wt', 'code1', ttl=-1, etag='"v1"', last_modified=None)
+        monkeypatch.setattr(gofile, '_wt_memo', None)
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, body='var appdata = { wt: "code2" };', headers={'ETag': '"v2"'})
+            assert _get_wd_code() == 'code2'
+        assert _CACHE.get_entry('wt')['etag'] == '"v2"'
+
+    def test_deep_tree(self):
+        depth = sys.getrecursionlimit() * 2
+        root = node = {'id': 'root', 'type': 'folder', 'name': 'root', 'children': {}}
+        for i in range(depth):
+            child = {'id': f'f{i}', 'type': 'folder', 'name': f'f{i}', 'children': {}}
+            node['children'] = {f'file{i}': _file_node(f'file{i}'), f'f{i}': child}
+            node = child
+        files = _extract_files(root)
+        assert len(files) == depth
+        assert (('f0', 'f1', 'file2'), 'https://store1.gofile.io/file2', 1, 'md5') in files
+        assert max(len(segs) for segs, _, _, _ in files) == depth
+
+    def test_iter_not_inlined(self, gofile_cache):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, body='var appdata = { wt: "code1" };')
+            _add_contents(rsps, 'root', {'a.bin': _file_node('a.bin'), 'sub': _folder_ref('sub')})
+            _add_contents(rsps, 'sub', {'b.bin': _file_node('b.bin'), 'deep': _folder_ref('deep'),
+                                        'inline': {'id': 'inline', 'type': 'folder', 'name': 'inline',
+                                                   'children': {'c.bin': _file_node('c.bin')}}})
+            _add_contents(rsps, 'deep', {'d.bin': _file_node('d.bin')})
+
+            iterator = iter_direct_urls_for_gofile_folder('https://gofile.io/d/root', token='token')
+            # the root is fetched eagerly, the sub folders only when iterated
+            assert len(rsps.calls) == 2
+            assert next(iterator)[0] == ('a.bin',)
+            assert sorted(segs for segs, _, _, _ in iterator) == [
+                ('sub', 'b.bin'), ('sub', 'deep', 'd.bin'), ('sub', 'inline', 'c.bin'),
+            ]
+            assert all(call.request.headers['Authorization'] == 'Bearer token' for call in rsps.calls[1:])
+
+    def test_iter_invalid(self, gofile_cache):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, body='var appdata = { wt: "code1" };')
+            rsps.add(responses.GET, 'https://api.gofile.io/contents/root', json={'status': 'error-notFound'})
+            with pytest.raises(GoFileLinkInvalidError):
+                iter_direct_urls_for_gofile_folder('https://gofile.io/d/root', token='token')
+
+    def test_separate(self, gofile_cache, tmp_path):
+        content = b'gofile content'
+        link = 'https://store1.gofile.io/download/web/fileid/a%20b.bin'
+        other_link = 'https://store1.gofile.io/download/web/otherid/a%20b.bin'
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _ALLJS_URL, body='var appdata = { wt: "code1" };')
+            _add_accounts(rsps, 'token1')
+            _add_contents(rsps, 'root', {'sub': _folder_ref('sub'), 'other': _folder_ref('other')})
+            _add_contents(rsps, 'sub', {'a b.bin': {
+                'id': 'fileid', 'type': 'file', 'name': 'a b.bin', 'link': link,
+                'size': len(content), 'md5': hashlib.md5(content).hexdigest(),
+            }})
+            # the same name in another sub folder
+            _add_contents(rsps, 'other', {'a b.bin': {
+                'id': 'otherid', 'type': 'file', 'name': 'a b.bin', 'link': other_link,
+                'size': 5, 'md5': hashlib.md5(b'other').hexdigest(),
+            }})
+
+            sessions = sorted(sep_from_url('https://gofile.io/d/root'), key=lambda x: x.segs)
+            assert len(sessions) == 2
+            other_session, session = sessions
+            assert isinstance(session, GoFileFileDownloadSession)
+            assert session.resource_id == 'gofile_file_fileid'
+            assert (session.segs, session.size, session.token) == (('sub', 'a b.bin'), len(content), 'token1')
+            assert other_session.segs == ('other', 'a b.bin')
+
+            rsps.add(responses.GET, link, body=content)
+            rsps.add(responses.GET, other_link, body=b'other')
+            session.download_to_directory(str(tmp_path / 'dst'))
+            assert rsps.calls[-1].request.headers['Cookie'] == 'accountToken=token1'
+            other_session.download_to_directory(str(tmp_path / 'dst'))
+            session.download_to_file(str(tmp_path / 'file.bin'))
+        with open(tmp_path / 'dst' / 'sub' / 'a b.bin', 'rb') as f:
+            assert f.read() == content
+        with open(tmp_path / 'dst' / 'other' / 'a b.bin', 'rb') as f:
+            assert f.read() == b'other'
+        with open(tmp_path / 'file.bin', 'rb') as f:
+            assert f.read() == content
+
+    def test_file_from_url(self, gofile_cache, tmp_path):
+        link = 'https://store1.gofile.io/download/web/fileid/a%20b.bin'
+        session = from_url(link)
+        assert isinstance(session, GoFileFileDownloadSession)
+        assert session.filename == 'a b.bin'
+        assert (session.size, session.md5_expected, session.token) == (None, None, None)
+
+        with responses.RequestsMock() as rsps:
+            _add_accounts(rsps, 'token1')
+            rsps.add(responses.GET, link, body=b'content')
+            session.download_to_file(str(tmp_path / 'file.bin'))
+            assert rsps.calls[-1].request.headers['Cookie'] == 'accountToken=token1'
+        assert os.path.getsize(tmp_path / 'file.bin') == 7
@@ -0,0 +1,29 @@
+import pytest
+import responses
+
+from netdriveurls.drives import MediaFireDownloadSession, get_direct_url_and_filename_for_mediafire
+
+_PAGE_URL = 'https://www.mediafire.com/file/abc123/file.zip/file'
+_DIRECT_URL = 'https://download1.mediafire.com/abc123/file.zip'
+
+
+def _add_pages(rsps):
+    rsps.add(responses.GET, _PAGE_URL, body=f'<a id="downloadButton" href="{_DIRECT_URL}">Download</a>')
+    rsps.add(responses.GET, _DIRECT_URL, body=b'zip content',
+             headers={'Content-Disposition': 'attachment; filename="file.zip"'})
+
+
+@pytest.mark.unittest
+class TestDrivesMediaFire:
+    def test_resolve(self):
+        with responses.RequestsMock() as rsps:
+            _add_pages(rsps)
+            assert get_direct_url_and_filename_for_mediafire(_PAGE_URL) == (_DIRECT_URL, 'file.zip')
+
+    def test_download_reuses_response(self, tmp_path):
+        with responses.RequestsMock() as rsps:
+            _add_pages(rsps)
+            MediaFireDownloadSession.from_url(_PAGE_URL).download_to_directory(str(tmp_path))
+            # the direct url is requested only once, by the resolver
+            assert [call.request.url for call in rsps.calls] == [_PAGE_URL, _DIRECT_URL]
+        assert (tmp_path / 'file.zip').read_bytes() == b'zip content'
@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import responses
+
+from netdriveurls.drives import PixelDrainListDownloadSession, get_direct_url_and_name_for_pixeldrain, \
+    get_list_info_for_pixeldrain
+
+_LIST = {'files': [{'id': 'f1', 'name': 'a.bin', 'size': 1, 'hash_sha256': 'x'}]}
+
+
+@pytest.mark.unittest
+class TestDrivesPixelDrain:
+    def test_list_fetched_once(self):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, 'https://pixeldrain.com/api/list/abc', json=_LIST)
+            session = PixelDrainListDownloadSession.from_url('https://pixeldrain.com/l/abc')
+            assert [s.page_url for s in session.separate()] == ['https://pixeldrain.com/u/f1']
+            assert [s.page_url for s in session.separate()] == ['https://pixeldrain.com/u/f1']
+            assert len(rsps.calls) == 1
+
+    def test_info_coalesced(self):
+        def _slow_info(request):
+            time.sleep(0.3)
+            return 200, {}, json.dumps({'name': 'a.bin', 'size': 1, 'hash_sha256': 'x'})
+
+        with responses.RequestsMock() as rsps:
+            rsps.add_callback(responses.GET, 'https://pixeldrain.com/api/file/f1/info', callback=_slow_info)
+            barrier = threading.Barrier(4)
+
+            def _resolve(_):
+                barrier.wait()
+                return get_direct_url_and_name_for_pixeldrain('https://pixeldrain.com/u/f1')
+
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(_resolve, range(4)))
+            assert len(rsps.calls) == 1
+            assert results == [('a.bin', 'https://pixeldrain.com/api/file/f1?download=1', 1, 'x')] * 4
+
+    def test_list_revalidated(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('NETDRIVEURLS_CACHE_DIR', str(tmp_path))
+        expected = [('f1', 'a.bin', 'https://pixeldrain.com/api/file/f1?download=1', 1, 'x')]
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, 'https://pixeldrain.com/api/list/abc', json=_LIST, headers={'ETag': '"v1"'})
+            rsps.add(responses.GET, 'https://pixeldrain.com/api/list/abc', status=304)
+            assert get_list_info_for_pixeldrain('https://pixeldrain.com/l/abc') == expected
+            assert get_list_info_for_pixeldrain('https://pixeldrain.com/l/abc') == expected
+            assert rsps.calls[1].request.headers['If-None-Match'] == '"v1"'
@@ -0,0 +1,79 @@
+import pytest
+import requests
+import responses
+
+from netdriveurls.resolve import url_redirect, RedirectMemo, resolve_url, redirect_memo
+
+
+def _redirect(rsps, url, location, status=302, **headers):
+    rsps.add(responses.HEAD, url, status=status, headers={'Location': location, **headers})
+
+
+@pytest.fixture(autouse=True)
+def clean_memo():
+    redirect_memo.clear()
+    yield
+    redirect_memo.clear()
+
+
+@pytest.mark.unittest
+class TestResolveRedirect:
+    def test_memo_permanent(self):
+        memo = RedirectMemo()
+        with responses.RequestsMock() as rsps:
+            _redirect(rsps, 'https://a.example.com/x', 'https://b.example.com/x', status=301)
+            _redirect(rsps, 'https://b.example.com/x', '/y', status=302)
+            rsps.add(responses.HEAD, 'https://b.example.com/y', status=200)
+            assert url_redirect('https://a.example.com/x', memo=memo) == 'https://b.example.com/y'
+            assert url_redirect('https://a.example.com/x', memo=memo) == 'https://b.example.com/y'
+            # the permanent hop is memorized, the temporary one is requested again
+            assert [call.request.url for call in rsps.calls] == [
+                'https://a.example.com/x', 'https://b.example.com/x', 'https://b.example.com/y',
+                'https://b.example.com/x', 'https://b.example.com/y',
+            ]
+        assert len(memo) == 1
+
+    @pytest.mark.parametrize(['status', 'cache_control', 'cached'], [
+        (302, 'max-age=60', True),
+        (307, 'private, max-age=60', True),
+        (302, 'max-age=0', False),
+        (301, 'no-store', False),
+        (308, None, True),
+        (303, None, False),
+    ])
+    def test_memo_cache_control(self, status, cache_control, cached):
+        memo = RedirectMemo()
+        headers = {'Cache-Control': cache_control} if cache_control else {}
+        with responses.RequestsMock() as rsps:
+            _redirect(rsps, 'https://a.example.com/x', 'https://b.example.com/x', status=status, **headers)
+            rsps.add(responses.HEAD, 'https://b.example.com/x', status=200)
+            url_redirect('https://a.example.com/x', memo=memo)
+        assert (memo.get('https://a.example.com/x') == 'https://b.example.com/x') == cached
+
+    def test_memo_lru(self):
+        memo = RedirectMemo(maxsize=2)
+        memo.set('a', 'x', ttl=float('inf'))
+        memo.set('b', 'x', ttl=float('inf'))
+        assert memo.get('a') == 'x'
+        memo.set('c', 'x', ttl=float('inf'))
+        assert (memo.get('a'), memo.get('b'), memo.get('c')) == ('x', None, 'x')
+
+        memo.set('d', 'x', ttl=-1)
+        assert memo.get('d') is None
+
+    def test_redirect_loop(self):
+        with responses.RequestsMock() as rsps:
+            _redirect(rsps, 'https://a.example.com/x', 'https://a.example.com/y')
+            _redirect(rsps, 'https://a.example.com/y', 'https://a.example.com/x')
+            with pytest.raises(requests.TooManyRedirects):
+                url_redirect('https://a.example.com/x', max_redirects=5)
+            assert len(rsps.calls) == 6
+
+    def test_dropbox(self):
+        url = 'https://www.dropbox.com/s/abc/file.zip'
+        location = 'https://www.dropbox.com/scl/fi/abc/file.zip?rlkey=x'
+        with responses.RequestsMock() as rsps:
+            _redirect(rsps, url, location, status=301)
+            assert resolve_url(url) == location
+            assert resolve_url(url) == location
+            assert len(rsps.calls) == 1
@@ -0,0 +1,78 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    routes = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        route = self.routes.get(self.path.split('?')[0])
+        if route is None:
+            body = b'Not Found'
+            self.send_response(404)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            route(self)
+
+    do_GET = do_HEAD = do_POST = _handle
+
+
+class LocalServer:
+    """
+    Local HTTP server, routes are ``path -> handler(request_handler)`` functions.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.hits = {}
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), type('_H', (_Handler,), {'routes': self.routes}))
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path: str) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}{path}'
+
+    def route(self, path: str):
+        def _decorator(func):
+            def _wrapped(handler):
+                self.hits[path] = self.hits.get(path, 0) + 1
+                return func(handler)
+
+            self.routes[path] = _wrapped
+            return func
+
+        return _decorator
+
+    def add_bytes(self, path: str, body: bytes, status: int = 200, headers=None):
+        @self.route(path)
+        def _send(handler):
+            handler.send_response(status)
+            handler.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                handler.send_header(key, value)
+            handler.end_headers()
+            if handler.command != 'HEAD':
+                handler.wfile.write(body)
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture()
+def local_server():
+    server = LocalServer()
+    try:
+        yield server
+    finally:
+        server.close()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+from netdriveurls.utils import Aria2Backend, Aria2Error, transfer_backend_scope, get_transfer_backend, \
+    download_file, get_requests_session, EventHooks, CancelToken, DownloadCancelledError
+
+
+class _StubAria2:
+    """
+    Stub of the JSON-RPC interface of aria2, the downloads complete on the second status check.
+    """
+
+    def __init__(self, local_server, content: bytes = b'aria2 content', secret: str = 'secret'):
+        self.content = content
+        self.secret = secret
+        self.error_code = None
+        self.stalled = False
+        self.total_length = None
+        self.downloads = {}
+        self.calls = []
+        self._lock = threading.Lock()
+        self.url = local_server.url('/jsonrpc')
+        local_server.route('/jsonrpc')(self._handle)
+
+    def _handle(self, handler):
+        request = json.loads(handler.rfile.read(int(handler.headers['Content-Length'])))
+        method, params = request['method'], request['params']
+        with self._lock:
+            self.calls.append(method)
+            if params[:1] != [f'token:{self.secret}']:
+                result = {'error': {'code': 1, 'message': 'Unauthorized'}}
+            else:
+                result = {'result': getattr(self, '_' + method.split('.')[1])(*params[1:])}
+        body = json.dumps({'jsonrpc': '2.0', 'id': request['id'], **result}).encode()
+        handler.send_response(200)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _addUri(self, uris, options):
+        gid = f'{len(self.downloads) + 1:016x}'
+        path = os.path.join(options['dir'], options.get('out', 'named_by_server.bin'))
+        self.downloads[gid] = {'uris': uris, 'options': options, 'path': path, 'checks': 0}
+        return gid
+
+    def _tellStatus(self, gid, keys):
+        download = self.downloads[gid]
+        download['checks'] += 1
+        if self.stalled:
+            # the partial file and the control file are already on the disk
+            for path in (download['path'], download['path'] + '.aria2'):
+                with open(path, 'wb') as f:
+                    f.write(self.content[:4])
+            return {'status': 'active', 'completedLength': '4', 'files': [{'path': download['path']}]}
+        elif self.total_length is not None:
+            return {'status': 'active', 'totalLength': str(self.total_length), 'completedLength': '0',
+                    'files': []}
+        elif download['checks'] == 1:
+            return {'status': 'active', 'completedLength': str(len(self.content) // 2), 'files': []}
+        elif self.error_code is not None:
+            return {'status': 'error', 'errorCode': str(self.error_code), 'errorMessage': 'Resource not found',
+                    'completedLength': '0', 'files': []}
+        with open(download['path'], 'wb') as f:
+            f.write(self.content)
+        return {'status': 'complete', 'completedLength': str(len(self.content)),
+                'files': [{'path': download['path']}]}
+
+    def _forceRemove(self, gid):
+        self.downloads[gid]['removed'] = True
+        return gid
+
+    def _removeDownloadResult(self, gid):
+        return 'OK'
+
+
+@pytest.fixture()
+def aria2(local_server):
+    return _StubAria2(local_server)
+
+
+@pytest.mark.unittest
+class TestUtilsAria2:
+    def test_download(self, aria2, tmp_path):
+        backend = Aria2Backend(aria2.url, secret='secret', poll_interval=0.01, options={'split': '4'})
+        session = get_requests_session(headers={'User-Agent': 'test-agent'})
+        session.cookies.set('session_id', 'abc', domain='example.com')
+        hooks = EventHooks()
+        progress = []
+        hooks.register('file_progress', lambda bytes, **_: progress.append(bytes))
+
+        checksum = f'sha256={hashlib.sha256(aria2.content).hexdigest()}'
+        with transfer_backend_scope(backend):
+            assert get_transfer_backend() is backend
+            dst = download_file('https://example.com/file.bin', filename=str(tmp_path / 'sub' / 'file.bin'),
+                                session=session, hooks=hooks, silent=True, checksum=checksum,
+                                expected_size=len(aria2.content), cookies={'token': 'xyz'})
+        assert get_transfer_backend() is None
+        assert dst == str(tmp_path / 'sub' / 'file.bin')
+        with open(dst, 'rb') as f:
+            assert f.read() == aria2.content
+        assert sum(progress) == len(aria2.content)
+
+        download, = aria2.downloads.values()
+        options = download['options']
+        assert download['uris'] == ['https://example.com/file.bin']
+        assert (options['dir'], options['out']) == (str(tmp_path / 'sub'), 'file.bin')
+        assert options['split'] == '4' and options['max-connection-per-server'] == '8'
+        assert options['checksum'] == f'sha-256={hashlib.sha256(aria2.content).hexdigest()}'
+        headers = dict(item.split(': ', 1) for item in options['header'])
+        assert headers['User-Agent'] == 'test-agent'
+        assert sorted(headers['Cookie'].split('; ')) == ['session_id=abc', 'token=xyz']
+        assert 'Accept-Encoding' not in headers
+        assert aria2.calls[-1] == 'aria2.removeDownloadResult'
+
+    def test_named_by_server(self, aria2, tmp_path):
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            dst = download_file('https://example.com/file.bin', output_directory=str(tmp_path), silent=True)
+        assert dst == str(tmp_path / 'named_by_server.bin')
+        assert 'out' not in next(iter(aria2.downloads.values()))['options']
+
+    def test_errors(self, aria2, tmp_path):
+        aria2.error_code = 3
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            with pytest.raises(requests.exceptions.HTTPError):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True)
+
+            aria2.error_code = 1
+            with pytest.raises(Aria2Error) as err:
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True)
+            assert err.value.code == 1
+
+        aria2.error_code = None
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='wrong', poll_interval=0.01)):
+            with pytest.raises(Aria2Error, match='Unauthorized'):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True)
+
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            with pytest.raises(requests.exceptions.HTTPError, match='expected size'):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True,
+                              expected_size=1)
+        assert not os.path.exists(tmp_path / 'file.bin')
+
+    @pytest.mark.parametrize(['code', 'status', 'kind'], [
+        (3, 404, 'fatal'),
+        (24, 401, 'fatal'),
+        (29, 503, 'transient'),
+        (6, None, 'transient'),
+    ])
+    def test_error_kinds(self, aria2, tmp_path, code, status, kind):
+        from netdriveurls.drives import classify_error
+
+        aria2.error_code = code
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            with pytest.raises(requests.exceptions.RequestException) as err:
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True)
+        # the same as the statuses received by the requests session
+        assert (err.value.response.status_code if err.value.response is not None else None) == status
+        assert classify_error(err.value) == kind
+
+    def test_cancel(self, aria2, tmp_path):
+        aria2.stalled = True
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            with pytest.raises(DownloadCancelledError):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True,
+                              cancel_token=token)
+        assert next(iter(aria2.downloads.values()))['removed']
+        assert not os.path.exists(tmp_path / 'file.bin')
+        assert not os.path.exists(tmp_path / 'file.bin.aria2')
+
+    def test_expected_size(self, aria2, tmp_path):
+        # the length reported by aria2 differs, the download is stopped before it finishes
+        aria2.total_length = len(aria2.content) + 1
+        with transfer_backend_scope(Aria2Backend(aria2.url, secret='secret', poll_interval=0.01)):
+            with pytest.raises(requests.exceptions.HTTPError, match='expected size'):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'), silent=True,
+                              expected_size=len(aria2.content))
+        assert next(iter(aria2.downloads.values()))['removed']
+        assert not os.path.exists(tmp_path / 'file.bin')
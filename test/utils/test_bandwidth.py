@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from netdriveurls.utils import TokenBucket, BandwidthLimiter, bandwidth_job, get_bandwidth_job, download_file
+
+
+def _pump(limiter, seconds, host=None, job=None, chunk=4096):
+    total = 0
+    with limiter.transfer(host, job) as throttle:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            throttle(chunk)
+            total += chunk
+    return total
+
+
+@pytest.mark.unittest
+class TestUtilsBandwidth:
+    def test_token_bucket(self):
+        bucket = TokenBucket(20000)
+        start_time = time.monotonic()
+        for _ in range(10):
+            bucket.consume(1000)
+        assert time.monotonic() - start_time == pytest.approx(0.5, abs=0.1)
+
+        bucket.rate = None
+        start_time = time.monotonic()
+        for _ in range(1000):
+            bucket.consume(1000)
+        assert time.monotonic() - start_time < 0.1
+
+    def test_global_cap(self):
+        limiter = BandwidthLimiter(200000)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(_pump(limiter, 0.5))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sum(results) == pytest.approx(100000, rel=0.3)
+
+    def test_weighted_jobs(self):
+        limiter = BandwidthLimiter(400000)
+        results = {}
+
+        def _run(job, weight):
+            with limiter.job(job, weight):
+                results[job] = _pump(limiter, 0.6, job=job)
+
+        threads = [threading.Thread(target=_run, args=('high', 3.0)), threading.Thread(target=_run, args=('low', 1.0))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results['high'] / results['low'] == pytest.approx(3.0, rel=0.35)
+
+    def test_weighted_hosts(self):
+        limiter = BandwidthLimiter(400000)
+        limiter.set_host_weight('a.example.com', 1.0)
+        limiter.set_host_weight('b.example.com', 2.0)
+        results = {}
+
+        def _run(host):
+            results[host] = _pump(limiter, 0.6, host=host)
+
+        threads = [threading.Thread(target=_run, args=(host,)) for host in ('a.example.com', 'b.example.com')]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results['b.example.com'] / results['a.example.com'] == pytest.approx(2.0, rel=0.35)
+
+    def test_runtime_adjust(self):
+        limiter = BandwidthLimiter(10000)
+        threading.Timer(0.2, lambda: limiter.set_rate(None)).start()
+        start_time = time.monotonic()
+        with limiter.transfer('example.com') as throttle:
+            for _ in range(100):
+                throttle(4096)
+        assert time.monotonic() - start_time < 1.0
+        assert not limiter.limited
+
+    def test_download_file(self, local_server, tmp_path):
+        local_server.add_bytes('/file.bin', b'x' * 200000)
+        limiter = BandwidthLimiter(400000)
+        with bandwidth_job('job', limiter=limiter):
+            assert get_bandwidth_job() == 'job'
+            start_time = time.monotonic()
+            download_file(local_server.url('/file.bin'), filename=str(tmp_path / 'file.bin'), silent=True,
+                          bandwidth=limiter, chunk_size=8192)
+            assert time.monotonic() - start_time >= 0.35
+        assert get_bandwidth_job() is None
+
+    def test_download_file_low_speed(self, local_server, tmp_path):
+        # limited under the low-speed limit, the waits of the limiter are not a stall
+        local_server.add_bytes('/file.bin', b'x' * 12000)
+        limiter = BandwidthLimiter(8000)
+        start_time = time.monotonic()
+        download_file(local_server.url('/file.bin'), filename=str(tmp_path / 'file.bin'), silent=True,
+                      bandwidth=limiter, chunk_size=1024, low_speed_limit=16000, low_speed_time=0.3, max_resumes=0)
+        assert time.monotonic() - start_time >= 0.5
+        assert (tmp_path / 'file.bin').read_bytes() == b'x' * 12000
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from netdriveurls.utils import DiskCache, get_cache_dir
+
+
+@pytest.mark.unittest
+class TestUtilsCache:
+    def test_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('NETDRIVEURLS_CACHE_DIR', str(tmp_path))
+        assert get_cache_dir() == str(tmp_path)
+        assert DiskCache('name').path == os.path.join(str(tmp_path), 'name.json')
+
+    def test_get_set(self, tmp_path):
+        cache = DiskCache('test', directory=str(tmp_path))
+        assert cache.get('key') is None
+        cache.set('key', {'a': 1}, ttl=60, etag='"x"')
+        cache.set('expired', 'value', ttl=-1)
+
+        other = DiskCache('test', directory=str(tmp_path))
+        assert other.get('key') == {'a': 1}
+        assert other.get_entry('key')['etag'] == '"x"'
+        assert other.get('expired', 'default') == 'default'
+        assert other.get_entry('expired')['value'] == 'value'
+
+        other.delete('key')
+        assert cache.get('key') is None
+
+    def test_broken_file(self, tmp_path):
+        cache = DiskCache('test', directory=str(tmp_path))
+        with open(cache.path, 'w') as f:
+            f.write('{not json')
+        assert cache.get('key') is None
+        cache.set('key', 1, ttl=60)
+        assert cache.get('key') == 1
+        assert os.listdir(str(tmp_path)) == ['test.json']
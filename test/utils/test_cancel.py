@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+from netdriveurls.utils import CancelToken, DownloadCancelledError, cancel_scope, get_cancel_token, EventHooks, \
+    download_file, get_requests_session
+
+
+@pytest.mark.unittest
+class TestUtilsCancel:
+    def test_token(self):
+        parent = CancelToken()
+        child = CancelToken(parent=parent)
+        assert not child.cancelled
+        child.raise_if_cancelled()
+
+        err = ValueError('x')
+        assert parent.cancel('stop', err)
+        assert not parent.cancel('again')
+        assert child.cancelled
+        assert child.reason == 'stop'
+        assert child.error is err
+        with pytest.raises(DownloadCancelledError, match='stop'):
+            child.raise_if_cancelled()
+
+    def test_scope(self):
+        assert get_cancel_token() is None
+        with cancel_scope() as outer:
+            with cancel_scope() as inner:
+                assert get_cancel_token() is inner
+                assert inner.parent is outer
+                outer.cancel()
+                assert inner.cancelled
+        assert get_cancel_token() is None
+
+    def test_abort_stream(self, local_server, tmp_path):
+        @local_server.route('/slow.bin')
+        def _slow(handler):
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(100 << 16))
+            handler.end_headers()
+            try:
+                for _ in range(100):
+                    handler.wfile.write(b'x' * (1 << 16))
+                    time.sleep(0.01)
+            except OSError:
+                pass
+
+        token = CancelToken()
+        hooks = EventHooks()
+        hooks.register('file_progress', lambda downloaded, **_: downloaded >= (1 << 18) and token.cancel('test'))
+        filename = str(tmp_path / 'slow.bin')
+        start_time = time.perf_counter()
+        with pytest.raises(DownloadCancelledError):
+            download_file(local_server.url('/slow.bin'), filename=filename, silent=True,
+                          session=get_requests_session(hooks=hooks), cancel_token=token)
+        assert time.perf_counter() - start_time < 0.8
+        assert not os.path.exists(filename)
+
+        with cancel_scope(token), pytest.raises(DownloadCancelledError):
+            download_file(local_server.url('/slow.bin'), filename=filename, silent=True)
+        assert local_server.hits['/slow.bin'] == 1
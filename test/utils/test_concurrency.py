@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from netdriveurls.utils import AdaptiveConcurrency, DiskCache
+
+
+@pytest.mark.unittest
+class TestUtilsConcurrency:
+    def test_additive_increase(self):
+        concurrency = AdaptiveConcurrency(initial=2, max_limit=4)
+        assert concurrency.limit('example.com') == 2
+        for _ in range(20):
+            for _ in range(concurrency.limit('example.com')):
+                concurrency.acquire('example.com')
+            for _ in range(concurrency.limit('example.com')):
+                concurrency.release('example.com', elapsed=1.0, size=1000)
+        assert concurrency.limit('example.com') == 4
+
+    def test_not_saturated(self):
+        concurrency = AdaptiveConcurrency(initial=2)
+        for _ in range(20):
+            concurrency.acquire('example.com')
+            concurrency.release('example.com', elapsed=1.0)
+        assert concurrency.limit('example.com') == 2
+
+    def test_latency_growth(self):
+        concurrency = AdaptiveConcurrency(initial=1, tolerance=2.0)
+        concurrency.acquire('example.com')
+        concurrency.release('example.com', elapsed=0.1)
+        assert concurrency.limit('example.com') == 2
+        for _ in range(10):
+            concurrency.acquire('example.com')
+            concurrency.acquire('example.com')
+            concurrency.release('example.com', elapsed=1.0)
+            concurrency.release('example.com', elapsed=1.0)
+        assert concurrency.limit('example.com') == 2
+
+    def test_multiplicative_decrease(self):
+        concurrency = AdaptiveConcurrency(initial=16, cooldown=0.1)
+        for _ in range(3):
+            concurrency.acquire('example.com')
+        for _ in range(3):
+            # a burst of failures only cuts it once
+            concurrency.release('example.com', overloaded=True)
+        assert concurrency.limit('example.com') == 8
+        time.sleep(0.1)
+        concurrency.acquire('example.com')
+        concurrency.release('example.com', overloaded=True)
+        assert concurrency.limit('example.com') == 4
+        assert concurrency.limit('other.example.com') == 16
+
+    def test_acquire_blocks(self):
+        concurrency = AdaptiveConcurrency(initial=1)
+        concurrency.acquire('example.com')
+        acquired = threading.Event()
+
+        def _acquire():
+            concurrency.acquire('example.com')
+            acquired.set()
+
+        t = threading.Thread(target=_acquire)
+        t.start()
+        assert not acquired.wait(0.1)
+        concurrency.release('example.com')
+        assert acquired.wait(1.0)
+        t.join()
+
+    def test_acquire_then(self):
+        concurrency = AdaptiveConcurrency(initial=1)
+        taken = []
+        concurrency.acquire_then('example.com', lambda: taken.append(1))
+        concurrency.acquire_then('example.com', lambda: taken.append(2))
+        concurrency.acquire_then('example.com', lambda: taken.append(3))
+        concurrency.acquire_then('other.example.com', lambda: taken.append(4))
+        assert taken == [1, 4]
+        assert concurrency.to_json()['example.com'] == {'limit': 1, 'in_flight': 1, 'waiting': 2}
+
+        # the slot given back goes to the waiting callbacks in order
+        concurrency.release('example.com')
+        assert taken == [1, 4, 2]
+        concurrency.release('example.com')
+        assert taken == [1, 4, 2, 3]
+        assert concurrency.to_json()['example.com'] == {'limit': 1, 'in_flight': 1, 'waiting': 0}
+
+    def test_persisted(self, tmp_path):
+        cache = DiskCache('concurrency', directory=str(tmp_path))
+        concurrency = AdaptiveConcurrency(initial=8, cache=cache)
+        concurrency.acquire('example.com')
+        concurrency.release('example.com', overloaded=True)
+        assert concurrency.limit('example.com') == 4
+
+        other = AdaptiveConcurrency(initial=8, cache=cache)
+        assert other.limit('example.com') == 4
+        assert other.limit('other.example.com') == 8
@@ -0,0 +1,114 @@
+import gzip
+import socket
+import time
+
+import pytest
+import requests
+
+from netdriveurls.utils import EventHooks, HookedRetry, get_requests_session, download_file
+
+pytest.importorskip('pycurl')
+
+from netdriveurls.utils import PycurlAdapter  # noqa: E402
+
+
+def _curl_session(**kwargs):
+    session = get_requests_session()
+    session.mount('http://', PycurlAdapter(**kwargs))
+    return session
+
+
+@pytest.mark.unittest
+class TestUtilsPycurlAdapter:
+    def test_get(self, local_server):
+        local_server.add_bytes('/file.bin', b'x' * 300000, headers={'Content-Type': 'application/octet-stream'})
+        session = _curl_session()
+        resp = session.get(local_server.url('/file.bin'))
+        assert resp.status_code == 200
+        assert resp.headers['Content-Type'] == 'application/octet-stream'
+        assert resp.content == b'x' * 300000
+        assert resp.timings is not None and not resp.timings.reused
+        assert resp.timings.transfer is not None
+
+        # the connection is kept by the idle handle
+        resp = session.get(local_server.url('/file.bin'), stream=True)
+        assert b''.join(resp.iter_content(1000)) == b'x' * 300000
+        assert resp.timings.reused
+        assert session.head(local_server.url('/file.bin')).headers['Content-Length'] == '300000'
+        assert session.get(local_server.url('/not_found')).status_code == 404
+
+    def test_gzip_and_post(self, local_server):
+        local_server.add_bytes('/gzip', gzip.compress(b'plain' * 100), headers={'Content-Encoding': 'gzip'})
+
+        @local_server.route('/echo')
+        def _echo(handler):
+            body = handler.rfile.read(int(handler.headers['Content-Length']))
+            body = handler.command.encode() + b' ' + handler.headers['X-Test'].encode() + b' ' + body
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(len(body)))
+            handler.send_header('Set-Cookie', 'token=abc; Path=/')
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        session = _curl_session()
+        assert session.get(local_server.url('/gzip')).content == b'plain' * 100
+        resp = session.post(local_server.url('/echo'), data={'a': '1'}, headers={'X-Test': 'yes'})
+        assert resp.content == b'POST yes a=1'
+        assert session.cookies['token'] == 'abc'
+
+    def test_download(self, local_server, tmp_path):
+        local_server.add_bytes('/file.bin', b'y' * 100000)
+        dst = str(tmp_path / 'file.bin')
+        download_file(local_server.url('/file.bin'), dst, session=_curl_session())
+        with open(dst, 'rb') as f:
+            assert f.read() == b'y' * 100000
+
+    def test_retry(self, local_server):
+        calls = []
+
+        @local_server.route('/flaky')
+        def _flaky(handler):
+            calls.append(1)
+            status, body = (503, b'busy') if len(calls) <= 2 else (200, b'done')
+            handler.send_response(status)
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        hooks = EventHooks()
+        retried = []
+        hooks.register('retry', lambda status, **_: retried.append(status))
+        session = get_requests_session()
+        session.mount('http://', PycurlAdapter(
+            hooks=hooks, max_retries=HookedRetry(total=3, status_forcelist=[503], hooks=hooks)))
+        assert session.get(local_server.url('/flaky')).content == b'done'
+        assert retried == [503, 503]
+
+        calls.clear()
+        with pytest.raises(requests.exceptions.RetryError):
+            _curl_session(max_retries=HookedRetry(total=1, status_forcelist=[503])).get(local_server.url('/flaky'))
+
+    def test_timeout(self, local_server):
+        @local_server.route('/slow')
+        def _slow(handler):
+            time.sleep(2.5)
+            try:
+                handler.send_response(200)
+                handler.send_header('Content-Length', '4')
+                handler.end_headers()
+                handler.wfile.write(b'late')
+            except OSError:
+                # closed by the client after the timeout
+                pass
+
+        session = _curl_session(max_retries=0, timeout=1)
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            session.get(local_server.url('/slow'))
+
+    def test_connection_error(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        with pytest.raises(requests.exceptions.ConnectionError):
+            _curl_session(max_retries=1).get(f'http://127.0.0.1:{port}/')
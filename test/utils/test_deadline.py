@@ -0,0 +1,88 @@
+import time
+
+import pytest
+import requests
+
+from netdriveurls.utils import Deadline, DeadlineExceededError, get_deadline, deadline_scope, \
+    get_requests_session, download_file, HookedRetry, TimeoutHTTPAdapter
+
+
+def _slow_body(handler, size: int = 1 << 20, delay: float = 0.05):
+    handler.send_response(200)
+    handler.send_header('Content-Length', str(size))
+    handler.end_headers()
+    try:
+        for _ in range(size // 8192):
+            handler.wfile.write(b'x' * 8192)
+            time.sleep(delay)
+    except OSError:
+        # closed by the client
+        pass
+
+
+@pytest.mark.unittest
+class TestUtilsDeadline:
+    def test_scope(self):
+        assert get_deadline() is None
+        with deadline_scope(10) as outer:
+            assert get_deadline() is outer
+            assert 9 < outer.remaining() <= 10
+            with deadline_scope(None) as same:
+                assert same is outer
+            with deadline_scope(100) as inner:
+                # a nested scope cannot extend the outer deadline
+                assert inner.remaining() <= 10
+            with deadline_scope(1) as inner:
+                assert inner.remaining() <= 1
+                assert inner.clamp_timeout(10) <= 1
+                assert inner.clamp_timeout((0.5, None))[0] == 0.5
+                assert inner.clamp_timeout((0.5, None))[1] <= 1
+        assert get_deadline() is None
+
+        deadline = Deadline(-1)
+        assert deadline.expired and deadline.remaining() == 0
+        with pytest.raises(DeadlineExceededError):
+            deadline.raise_if_expired()
+        assert issubclass(DeadlineExceededError, requests.exceptions.Timeout)
+
+    def test_request(self, local_server):
+        @local_server.route('/slow')
+        def _slow(handler):
+            time.sleep(1.0)
+            try:
+                handler.send_response(200)
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+            except OSError:
+                pass
+
+        session = get_requests_session(timeout=10)
+        start_time = time.perf_counter()
+        with deadline_scope(0.3):
+            with pytest.raises(DeadlineExceededError):
+                session.get(local_server.url('/slow'))
+            # expired before sending
+            with pytest.raises(DeadlineExceededError):
+                session.get(local_server.url('/slow'))
+        assert time.perf_counter() - start_time < 0.9
+
+    def test_retries_stop(self, local_server):
+        local_server.add_bytes('/busy', b'busy', status=503)
+        session = requests.Session()
+        session.mount('http://', TimeoutHTTPAdapter(max_retries=HookedRetry(
+            total=5, backoff_factor=1, status_forcelist=[503])))
+        start_time = time.perf_counter()
+        with deadline_scope(0.5):
+            with pytest.raises(requests.exceptions.RetryError):
+                session.get(local_server.url('/busy'))
+        # the backoff of the 2nd retry (2s) does not fit in the deadline
+        assert time.perf_counter() - start_time < 0.5
+        assert local_server.hits['/busy'] == 2
+
+    def test_transfer(self, local_server, tmp_path):
+        local_server.route('/slow.bin')(_slow_body)
+        dst = str(tmp_path / 'slow.bin')
+        with deadline_scope(0.3):
+            with pytest.raises(DeadlineExceededError):
+                download_file(local_server.url('/slow.bin'), filename=dst, silent=True)
+        assert not (tmp_path / 'slow.bin').exists()
@@ -0,0 +1,68 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from netdriveurls.utils import DNSCache, DNS_CACHE_TTL_ENV
+
+
+@pytest.fixture()
+def lookups(monkeypatch):
+    calls = []
+
+    def _getaddrinfo(host, port, *args):
+        calls.append(host)
+        time.sleep(0.05)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', _getaddrinfo)
+    return calls
+
+
+@pytest.mark.unittest
+class TestUtilsDNS:
+    def test_cached(self, lookups):
+        cache = DNSCache(ttl=60)
+        assert cache.resolve('cdn.example.com', 443)[0][4] == ('127.0.0.1', 443)
+        assert cache.resolve('CDN.example.com', 443)[0][4] == ('127.0.0.1', 443)
+        cache.resolve('cdn.example.com', 80)
+        assert lookups == ['cdn.example.com', 'cdn.example.com']
+        assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+
+        cache.invalidate('cdn.example.com')
+        assert len(cache) == 0
+        cache.resolve('cdn.example.com', 443)
+        assert len(lookups) == 3
+
+    def test_expired(self, lookups, monkeypatch):
+        cache = DNSCache(ttl=0.01)
+        cache.resolve('cdn.example.com', 443)
+        time.sleep(0.02)
+        cache.resolve('cdn.example.com', 443)
+        assert len(lookups) == 2
+
+        monkeypatch.setenv(DNS_CACHE_TTL_ENV, '0')
+        cache = DNSCache()
+        cache.resolve('cdn.example.com', 443)
+        cache.resolve('cdn.example.com', 443)
+        assert len(lookups) == 4 and len(cache) == 0
+
+    def test_bypassed(self, lookups):
+        cache = DNSCache(ttl=60, maxsize=2)
+        cache.resolve('127.0.0.1', 80)
+        cache.resolve('::1', 80)
+        assert len(cache) == 0
+        for host in ['a.com', 'b.com', 'c.com', 'a.com']:
+            cache.resolve(host, 80)
+        assert lookups[2:] == ['a.com', 'b.com', 'c.com', 'a.com']
+        assert len(cache) == 2
+
+    def test_coalesced(self, lookups):
+        cache = DNSCache(ttl=60)
+        threads = [threading.Thread(target=cache.resolve, args=('cdn.example.com', 443)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert lookups == ['cdn.example.com']
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import time
+
+import pytest
+import requests
+
+from netdriveurls.utils import download_file, EventHooks, StalledTransferError, low_speed_scope
+
+
+@pytest.mark.unittest
+class TestUtilsDownload:
+    def test_checksum(self, local_server, tmp_path):
+        content = b'checksum content' * 1000
+        local_server.add_bytes('/file.bin', content)
+        dst = str(tmp_path / 'file.bin')
+
+        download_file(local_server.url('/file.bin'), filename=dst, silent=True,
+                      checksum=f'md5={hashlib.md5(content).hexdigest()}')
+        with open(dst, 'rb') as f:
+            assert f.read() == content
+
+        download_file(local_server.url('/file.bin'), filename=dst, silent=True,
+                      checksum=f'sha-256={hashlib.sha256(content).hexdigest().upper()}')
+        with pytest.raises(requests.exceptions.HTTPError, match='checksum'):
+            download_file(local_server.url('/file.bin'), filename=dst, silent=True, checksum=f'sha256={"0" * 64}')
+        assert not os.path.exists(dst)
+
+    def test_without_read1(self, local_server, tmp_path, monkeypatch):
+        from urllib3 import HTTPResponse, BaseHTTPResponse
+
+        # urllib3 before 2.2
+        monkeypatch.delattr(HTTPResponse, 'read1')
+        monkeypatch.delattr(BaseHTTPResponse, 'read1')
+        content = b'old urllib3' * 1000
+        local_server.add_bytes('/file.bin', content)
+        dst = str(tmp_path / 'file.bin')
+        download_file(local_server.url('/file.bin'), filename=dst, silent=True, expected_size=len(content))
+        with open(dst, 'rb') as f:
+            assert f.read() == content
+
+    @staticmethod
+    def _add_resumable(local_server, path, content, first_part):
+        # the first response stops at the half, first_part(handler, half) sends it, the range requests are served
+        @local_server.route(path)
+        def _send(handler):
+            range_header = handler.headers.get('Range')
+            if range_header:
+                offset = int(range_header[len('bytes='):].rstrip('-'))
+                handler.send_response(206)
+                handler.send_header('Content-Range', f'bytes {offset}-{len(content) - 1}/{len(content)}')
+                handler.send_header('Content-Length', str(len(content) - offset))
+                handler.send_header('ETag', '"v1"')
+                handler.end_headers()
+                handler.wfile.write(content[offset:])
+            else:
+                handler.send_response(200)
+                handler.send_header('Content-Length', str(len(content)))
+                handler.send_header('ETag', '"v1"')
+                handler.end_headers()
+                first_part(handler, content[:len(content) // 2])
+                handler.close_connection = True
+
+    def test_resume_dropped(self, local_server, tmp_path):
+        content = os.urandom(200000)
+        self._add_resumable(local_server, '/file.bin', content, lambda handler, half: handler.wfile.write(half))
+        dst = str(tmp_path / 'file.bin')
+
+        resumes = []
+        hooks = EventHooks()
+        hooks.register('file_resumed', lambda **kwargs: resumes.append(kwargs))
+        download_file(local_server.url('/file.bin'), filename=dst, silent=True, hooks=hooks,
+                      checksum=f'md5={hashlib.md5(content).hexdigest()}')
+        with open(dst, 'rb') as f:
+            assert f.read() == content
+        assert local_server.hits['/file.bin'] == 2
+        assert [item['offset'] for item in resumes] == [len(content) // 2]
+        assert isinstance(resumes[0]['error'], requests.exceptions.ChunkedEncodingError)
+
+    def test_low_speed(self, local_server, tmp_path):
+        content = os.urandom(200000)
+
+        def _trickle(handler, half):
+            handler.wfile.write(half)
+            try:
+                for i in range(len(half), len(half) + 50):
+                    time.sleep(0.1)
+                    handler.wfile.write(content[i:i + 1])
+            except OSError:
+                pass
+
+        self._add_resumable(local_server, '/file.bin', content, _trickle)
+        dst = str(tmp_path / 'file.bin')
+
+        resumes = []
+        hooks = EventHooks()
+        hooks.register('file_resumed', lambda **kwargs: resumes.append(kwargs))
+        start_time = time.monotonic()
+        with low_speed_scope(1000, 0.3):
+            download_file(local_server.url('/file.bin'), filename=dst, silent=True, hooks=hooks,
+                          checksum=f'md5={hashlib.md5(content).hexdigest()}')
+        assert time.monotonic() - start_time < 3.0
+        with open(dst, 'rb') as f:
+            assert f.read() == content
+        assert len(resumes) == 1
+        assert isinstance(resumes[0]['error'], StalledTransferError)
+
+    def test_not_resumable(self, local_server, tmp_path):
+        content = os.urandom(200000)
+
+        @local_server.route('/file.bin')
+        def _send(handler):
+            # ignores the ranges
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(len(content)))
+            handler.end_headers()
+            handler.wfile.write(content[:len(content) // 2])
+            handler.close_connection = True
+
+        dst = str(tmp_path / 'file.bin')
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            download_file(local_server.url('/file.bin'), filename=dst, silent=True)
+        assert local_server.hits['/file.bin'] == 2
+        assert not os.path.exists(dst)
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            download_file(local_server.url('/file.bin'), filename=dst, silent=True, max_resumes=0)
+        assert local_server.hits['/file.bin'] == 3
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from netdriveurls.utils import HedgePolicy, get_requests_session
+
+
+@pytest.fixture()
+def slow_first(local_server):
+    # the first request of each path is slow, the next ones are fast
+    def _add(path: str, delay: float = 1.0):
+        @local_server.route(path)
+        def _send(handler):
+            if local_server.hits[path] == 1:
+                time.sleep(delay)
+            body = f'hit {local_server.hits[path]}'.encode()
+            handler.send_response(200)
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        return local_server.url(path)
+
+    return _add
+
+
+def _warm_policy(host: str, **kwargs) -> HedgePolicy:
+    policy = HedgePolicy(min_samples=5, **kwargs)
+    for _ in range(5):
+        policy.observe(host, 0.05)
+    return policy
+
+
+@pytest.mark.unittest
+class TestUtilsHedge:
+    def test_delay(self):
+        policy = HedgePolicy(min_samples=10, min_delay=0.01)
+        assert policy.delay('example.com') is None
+        for i in range(1, 11):
+            policy.observe('example.com', i / 10)
+        assert policy.delay('example.com') == pytest.approx(0.9)
+        assert policy.delay('other.example.com') is None
+
+    def test_hedged(self, local_server, slow_first):
+        url = slow_first('/info')
+        policy = _warm_policy('127.0.0.1')
+        start_time = time.monotonic()
+        resp = policy.get(get_requests_session(), url)
+        assert time.monotonic() - start_time < 0.8
+        assert resp.text == 'hit 2'
+        assert (policy.hedges, policy.hedge_wins) == (1, 1)
+        # the primary is aborted, not retried
+        time.sleep(0.1)
+        assert local_server.hits['/info'] == 2
+
+    def test_saturated_executor(self, local_server, slow_first):
+        url = slow_first('/info', delay=0.0)
+        policy = _warm_policy('127.0.0.1', max_workers=1)
+        release = threading.Event()
+        policy._get_executor().submit(release.wait, 5.0)
+        try:
+            # the primary does not wait for the executor
+            start_time = time.monotonic()
+            assert policy.get(get_requests_session(), url).text == 'hit 1'
+            assert time.monotonic() - start_time < 0.5
+            assert policy.hedges == 0
+        finally:
+            release.set()
+
+    def test_not_warm(self, local_server, slow_first):
+        url = slow_first('/info', delay=0.3)
+        policy = HedgePolicy(min_samples=5)
+        assert policy.get(get_requests_session(), url).text == 'hit 1'
+        assert local_server.hits['/info'] == 1
+        assert policy.hedges == 0
+
+    def test_budget(self, local_server, slow_first):
+        policy = _warm_policy('127.0.0.1', max_ratio=0.0, min_hedges=1)
+        session = get_requests_session()
+        assert policy.get(session, slow_first('/a', delay=0.3)).text == 'hit 2'
+        assert policy.get(session, slow_first('/b', delay=0.3)).text == 'hit 1'
+        assert local_server.hits['/b'] == 1
+        assert policy.hedges == 1
+
+    def test_disabled(self, local_server, slow_first):
+        url = slow_first('/info', delay=0.3)
+        policy = _warm_policy('127.0.0.1', enabled=False)
+        assert policy.get(get_requests_session(), url).text == 'hit 1'
+        assert policy.hedges == 0
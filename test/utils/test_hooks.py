@@ -0,0 +1,94 @@
+import os
+
+import pytest
+import requests
+import responses
+from urllib3.exceptions import MaxRetryError
+
+from netdriveurls.utils import EventHooks, get_requests_session, download_file, HookedRetry, register_hook, \
+    unregister_hook, get_session_hooks
+
+
+class _Recorder:
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, item):
+        if item.startswith('on_'):
+            event = item[3:]
+            return lambda **kwargs: self.events.append((event, kwargs))
+        raise AttributeError(item)  # pragma: no cover
+
+
+@pytest.mark.unittest
+class TestUtilsHooks:
+    def test_register_unknown_event(self):
+        with pytest.raises(ValueError):
+            EventHooks().register('not_an_event', lambda **kwargs: None)
+
+    def test_register_and_unregister(self):
+        hooks = EventHooks()
+        calls = []
+        callback = hooks.register('retry', lambda **kwargs: calls.append(kwargs))
+        assert hooks.has_listeners('retry')
+        hooks.emit('retry', attempt=1)
+        hooks.unregister('retry', callback)
+        assert not hooks.has_listeners('retry')
+        hooks.emit('retry', attempt=2)
+        assert calls == [{'attempt': 1}]
+
+    def test_callback_error_not_raised(self):
+        hooks = EventHooks()
+        hooks.register('retry', lambda **kwargs: 1 / 0)
+        hooks.emit('retry', attempt=1)
+
+    @responses.activate
+    def test_session_and_file_events(self, tmp_path):
+        responses.add(responses.GET, 'https://example.com/file.bin', body=b'x' * 3000,
+                      headers={'Content-Length': '3000'})
+        recorder = _Recorder()
+        hooks = EventHooks()
+        hooks.subscribe(recorder)
+        session = get_requests_session(hooks=hooks)
+        assert get_session_hooks(session) is hooks
+
+        filename = download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'),
+                                 session=session, silent=True)
+        assert os.path.getsize(filename) == 3000
+
+        events = [event for event, _ in recorder.events]
+        assert events[:3] == ['request_start', 'request_end', 'file_start']
+        assert events[-1] == 'file_done'
+        assert sum(p['bytes'] for e, p in recorder.events if e == 'file_progress') == 3000
+        request_end = dict(recorder.events)['request_end']
+        assert request_end['host'] == 'example.com'
+        assert request_end['status'] == 200
+        assert request_end['bytes'] == 3000
+        assert dict(recorder.events)['file_done']['size'] == 3000
+
+    @responses.activate
+    def test_file_failed_event(self, tmp_path):
+        responses.add(responses.GET, 'https://example.com/file.bin', body=b'x' * 100)
+        failures = []
+        callback = register_hook('file_failed', lambda **kwargs: failures.append(kwargs))
+        try:
+            with pytest.raises(requests.exceptions.HTTPError):
+                download_file('https://example.com/file.bin', filename=str(tmp_path / 'file.bin'),
+                              expected_size=200, silent=True)
+        finally:
+            unregister_hook('file_failed', callback)
+        assert len(failures) == 1
+        assert failures[0]['host'] == 'example.com'
+        assert not os.path.exists(tmp_path / 'file.bin')
+
+    def test_retry_event(self):
+        hooks = EventHooks()
+        retries = []
+        hooks.register('retry', lambda **kwargs: retries.append(kwargs))
+        retry = HookedRetry(total=1, hooks=hooks)
+        retry = retry.increment('GET', '/path', error=ConnectionError('boom'))
+        assert retry.hooks is hooks
+        with pytest.raises(MaxRetryError):
+            retry.increment('GET', '/path', error=ConnectionError('boom'))
+        assert [item['attempt'] for item in retries] == [1]
+        assert retries[0]['method'] == 'GET'
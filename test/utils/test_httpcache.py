@@ -0,0 +1,96 @@
+import pytest
+import responses
+
+from netdriveurls.utils import HTTPCache
+
+_URL = 'https://example.com/album'
+
+
+def _parse(resp):
+    _parse.calls += 1
+    return [line.split(',') for line in resp.text.splitlines()]
+
+
+_parse.calls = 0
+
+
+@pytest.mark.unittest
+class TestUtilsHTTPCache:
+    def test_revalidate(self, tmp_path):
+        cache = HTTPCache(directory=str(tmp_path))
+        _parse.calls = 0
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1\nb,2', headers={'ETag': '"v1"'})
+            assert cache.fetch(_URL, _parse) == [['a', '1'], ['b', '2']]
+            assert 'If-None-Match' not in rsps.calls[0].request.headers
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, status=304)
+            # the parsed listing is reused, a new process would do the same
+            assert HTTPCache(directory=str(tmp_path)).fetch(_URL, _parse) == [['a', '1'], ['b', '2']]
+            assert rsps.calls[0].request.headers['If-None-Match'] == '"v1"'
+        assert _parse.calls == 1
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='c,3', headers={'ETag': '"v2"'})
+            assert cache.fetch(_URL, _parse) == [['c', '3']]
+            assert rsps.calls[0].request.headers['If-None-Match'] == '"v1"'
+        assert _parse.calls == 2
+
+    def test_last_modified(self, tmp_path):
+        cache = HTTPCache(directory=str(tmp_path))
+        last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers={'Last-Modified': last_modified})
+            rsps.add(responses.GET, _URL, status=304)
+            assert cache.fetch(_URL, _parse) == cache.fetch(_URL, _parse) == [['a', '1']]
+            assert rsps.calls[1].request.headers['If-Modified-Since'] == last_modified
+
+    @pytest.mark.parametrize('headers', [{}, {'ETag': '"v1"', 'Cache-Control': 'no-store'}])
+    def test_not_stored(self, tmp_path, headers):
+        cache = HTTPCache(directory=str(tmp_path))
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers=headers)
+            rsps.add(responses.GET, _URL, body='a,1', headers=headers)
+            cache.fetch(_URL, _parse)
+            cache.fetch(_URL, _parse)
+            assert 'If-None-Match' not in rsps.calls[1].request.headers
+        assert list(tmp_path.iterdir()) == []
+
+    def test_expired(self, tmp_path):
+        cache = HTTPCache(directory=str(tmp_path), ttl=-1)
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers={'ETag': '"v1"'})
+            rsps.add(responses.GET, _URL, body='a,1', headers={'ETag': '"v1"'})
+            cache.fetch(_URL, _parse)
+            cache.fetch(_URL, _parse)
+            assert 'If-None-Match' not in rsps.calls[1].request.headers
+
+    def test_version_in_key(self, tmp_path, monkeypatch):
+        from netdriveurls.utils import httpcache
+
+        cache = HTTPCache(directory=str(tmp_path))
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers={'ETag': '"v1"'})
+            cache.fetch(_URL, _parse)
+
+        # the listing parsed by an older release is not revalidated after an upgrade
+        monkeypatch.setattr(httpcache, '__VERSION__', '999.0.0')
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers={'ETag': '"v1"'})
+            cache.fetch(_URL, _parse)
+            assert 'If-None-Match' not in rsps.calls[0].request.headers
+
+    def test_prune(self, tmp_path):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, _URL, body='a,1', headers={'ETag': '"v1"'})
+            HTTPCache(directory=str(tmp_path), ttl=-1).fetch(_URL, _parse)
+        assert len(list(tmp_path.iterdir())) == 1
+
+        # the expired pages are removed when a process stores its first page
+        cache = HTTPCache(directory=str(tmp_path))
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, f'{_URL}/2', body='b,2', headers={'ETag': '"v1"'})
+            cache.fetch(f'{_URL}/2', _parse)
+        assert len(list(tmp_path.iterdir())) == 1
+        assert cache.prune() == 0
@@ -0,0 +1,196 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from netdriveurls.utils import EventHooks, HookedRetry, get_requests_session
+
+h2_config = pytest.importorskip('h2.config')
+h2_connection = pytest.importorskip('h2.connection')
+h2_events = pytest.importorskip('h2.events')
+pytest.importorskip('httpx')
+
+from netdriveurls.utils import HTTPXAdapter  # noqa: E402
+
+
+class _H2Server:
+    """
+    Local plain-text HTTP/2 server, routes are ``path -> handler() -> (status, headers, body)`` functions.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.connections = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(16)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        host, port = self._sock.getsockname()
+        return f'http://{host}:{port}{path}'
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                self._serve_h2(conn)
+            except OSError:
+                # closed by the client, e.g. after a timeout
+                pass
+
+    def _serve_h2(self, conn):
+        h2conn = h2_connection.H2Connection(config=h2_config.H2Configuration(client_side=False))
+        h2conn.initiate_connection()
+        conn.sendall(h2conn.data_to_send())
+        while True:
+            data = conn.recv(65535)
+            if not data:
+                return
+            for event in h2conn.receive_data(data):
+                if isinstance(event, h2_events.RequestReceived):
+                    headers = dict(event.headers)
+                    path = headers[b':path'].decode().split('?')[0]
+                    route = self.routes.get(path)
+                    status, resp_headers, body = route(headers) if route else (404, [], b'Not Found')
+                    h2conn.send_headers(event.stream_id, [
+                        (':status', str(status)), ('content-length', str(len(body))), *resp_headers,
+                    ], end_stream=headers[b':method'] == b'HEAD' or not body)
+                    if headers[b':method'] != b'HEAD' and body:
+                        h2conn.send_data(event.stream_id, body, end_stream=True)
+                elif isinstance(event, h2_events.ConnectionTerminated):
+                    conn.sendall(h2conn.data_to_send())
+                    return
+            conn.sendall(h2conn.data_to_send())
+
+    def close(self):
+        self._sock.close()
+
+
+@pytest.fixture()
+def h2_server():
+    server = _H2Server()
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+def _h2_session(**kwargs):
+    session = get_requests_session()
+    adapter = HTTPXAdapter(http1=False, **kwargs)
+    session.mount('http://', adapter)
+    return session
+
+
+@pytest.mark.unittest
+class TestUtilsHTTPXAdapter:
+    def test_multiplexed(self, h2_server, monkeypatch):
+        from httpcore._sync.http2 import HTTP2Connection
+
+        h2_server.routes['/small'] = lambda headers: (200, [('content-type', 'image/png')], b'x' * 1000)
+        session = _h2_session()
+        send_request_headers = HTTP2Connection._send_request_headers
+
+        def _slow_send_request_headers(self, request, stream_id):
+            # widen the gap between picking the stream id and sending it, where the threads used to race
+            time.sleep(0.002 * (stream_id % 3))
+            return send_request_headers(self, request, stream_id)
+
+        monkeypatch.setattr(HTTP2Connection, '_send_request_headers', _slow_send_request_headers)
+
+        def _get(_):
+            resp = session.get(h2_server.url('/small'))
+            resp.raise_for_status()
+            return resp.raw.http_version, resp.headers['Content-Type'], resp.content
+
+        # the streams are opened in order even when many threads share the connection from the start,
+        # otherwise the server rejects the lower stream ids and kills the connection
+        with ThreadPoolExecutor(32) as pool:
+            results = list(pool.map(_get, range(128)))
+        assert results == [('HTTP/2', 'image/png', b'x' * 1000)] * 128
+        # all the concurrent requests share one connection
+        assert h2_server.connections == 1
+
+        resp = session.get(h2_server.url('/small'), stream=True)
+        assert b''.join(resp.iter_content(300)) == b'x' * 1000
+        assert session.head(h2_server.url('/small')).status_code == 200
+        assert session.get(h2_server.url('/not_found')).status_code == 404
+
+    def test_headers_and_cookies(self, h2_server):
+        h2_server.routes['/cookie'] = lambda headers: (200, [('set-cookie', 'token=abc; Path=/')], b'ok')
+        h2_server.routes['/echo'] = lambda headers: (200, [], headers.get(b'cookie', b''))
+        session = _h2_session()
+        assert session.get(h2_server.url('/cookie')).cookies['token'] == 'abc'
+        assert session.cookies['token'] == 'abc'
+        assert session.get(h2_server.url('/echo')).content == b'token=abc'
+        # the cookies are kept by the session, not by the client shared by the sessions
+        assert _h2_session().get(h2_server.url('/echo')).content == b''
+
+    def test_retry(self, h2_server):
+        calls = []
+
+        def _flaky(headers):
+            calls.append(1)
+            return (503, [], b'busy') if len(calls) <= 2 else (200, [], b'done')
+
+        h2_server.routes['/flaky'] = _flaky
+        hooks = EventHooks()
+        retried = []
+        hooks.register('retry', lambda status, **_: retried.append(status))
+        session = get_requests_session()
+        session.mount('http://', HTTPXAdapter(
+            http1=False, hooks=hooks, max_retries=HookedRetry(total=3, status_forcelist=[503], hooks=hooks)))
+        assert session.get(h2_server.url('/flaky')).content == b'done'
+        assert retried == [503, 503]
+
+        calls.clear()
+        session.mount('http://', HTTPXAdapter(http1=False, max_retries=HookedRetry(total=1, status_forcelist=[503])))
+        with pytest.raises(requests.exceptions.RetryError):
+            session.get(h2_server.url('/flaky'))
+
+    def test_timeout(self, h2_server):
+        def _slow(headers):
+            time.sleep(1.0)
+            return 200, [], b'late'
+
+        h2_server.routes['/slow'] = _slow
+        session = _h2_session(max_retries=0, timeout=0.3)
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            session.get(h2_server.url('/slow'))
+
+    def test_connection_error(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        with pytest.raises(requests.exceptions.ConnectionError):
+            _h2_session(max_retries=1).get(f'http://127.0.0.1:{port}/')
+
+    def test_session_option(self):
+        session = get_requests_session(http2=True)
+        assert isinstance(session.get_adapter('https://example.com'), HTTPXAdapter)
+
+    def test_proxies(self, local_server, monkeypatch):
+        # the local server answers as a plain http proxy, the requests come with the absolute urls
+        local_server.add_bytes('http://proxied.invalid/data', b'via proxy')
+        session = get_requests_session()
+        session.mount('http://', HTTPXAdapter())
+        session.proxies = {'http': local_server.url('')}
+        assert session.get('http://proxied.invalid/data').content == b'via proxy'
+
+        session.proxies = {}
+        monkeypatch.setenv('HTTP_PROXY', local_server.url(''))
+        assert session.get('http://proxied.invalid/data').content == b'via proxy'
+        assert local_server.hits['http://proxied.invalid/data'] == 2
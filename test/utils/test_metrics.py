@@ -0,0 +1,49 @@
+import pytest
+
+from netdriveurls.utils import MetricsCollector, EventHooks, LatencyHistogram
+
+
+@pytest.mark.unittest
+class TestUtilsMetrics:
+    def test_histogram(self):
+        hist = LatencyHistogram(buckets=(0.1, 1.0))
+        assert hist.quantile(0.5) is None
+        for value in (0.05, 0.05, 0.5, 2.0):
+            hist.observe(value)
+        assert hist.counts == [2, 1, 1]
+        assert hist.quantile(0.5) == 0.1
+        assert hist.quantile(0.75) == 1.0
+        assert hist.quantile(1.0) == float('inf')
+
+    def test_collect_and_export(self):
+        hooks = EventHooks()
+        collector = MetricsCollector(buckets=(0.1, 1.0)).attach(hooks)
+        hooks.emit('request_end', method='GET', url='https://a.com/x', host='a.com',
+                   status=200, bytes=100, latency=0.05, error=None)
+        hooks.emit('request_end', method='GET', url='https://a.com/y', host='a.com',
+                   status=None, bytes=None, latency=0.5, error=OSError())
+        hooks.emit('retry', method='GET', url='/y', host='a.com', attempt=1, status=None, error=OSError())
+        hooks.emit('file_start', url='https://b.com/f', host='b.com', filename='f', expected_size=10)
+        hooks.emit('file_progress', url='https://b.com/f', host='b.com', filename='f',
+                   bytes=10, downloaded=10, expected_size=10)
+        hooks.emit('file_done', url='https://b.com/f', host='b.com', filename='f', size=10, elapsed=2.0)
+
+        data = collector.to_json()
+        assert data['a.com']['requests'] == 2
+        assert data['a.com']['request_errors'] == 1
+        assert data['a.com']['statuses'] == {'200': 1, 'error': 1}
+        assert data['a.com']['retries'] == 1
+        assert data['a.com']['request_latency']['count'] == 2
+        assert data['b.com']['files_done'] == 1
+        assert data['b.com']['downloaded_bytes'] == 10
+
+        text = collector.to_prometheus()
+        assert 'netdriveurls_requests_total{host="a.com"} 2' in text
+        assert 'netdriveurls_responses_total{host="a.com",status="200"} 1' in text
+        assert 'netdriveurls_request_latency_seconds_bucket{host="a.com",le="0.1"} 1' in text
+        assert 'netdriveurls_request_latency_seconds_bucket{host="a.com",le="+Inf"} 2' in text
+        assert 'netdriveurls_file_duration_seconds_count{host="b.com"} 1' in text
+
+        collector.detach(hooks)
+        hooks.emit('retry', method='GET', url='/y', host='a.com', attempt=1, status=None, error=None)
+        assert collector.to_json()['a.com']['retries'] == 1
@@ -0,0 +1,92 @@
+import io
+import json
+import threading
+
+import pytest
+
+from netdriveurls.utils import ProgressAggregator, JsonProgressSink, ProgressSink, progress_scope, \
+    get_current_progress, set_progress_mode, download_file
+
+
+class _ListSink(ProgressSink):
+    def __init__(self):
+        self.updates = []
+        self.closed = None
+
+    def update(self, snapshot):
+        self.updates.append(snapshot)
+
+    def close(self, snapshot):
+        self.closed = snapshot
+
+
+@pytest.mark.unittest
+class TestUtilsProgress:
+    def test_aggregator_threads(self):
+        progress = ProgressAggregator()
+        progress.add_files(8, total_bytes=8000, sized=8)
+
+        def _work():
+            for _ in range(100):
+                progress.update_bytes(10)
+            progress.file_done()
+
+        threads = [threading.Thread(target=_work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        snapshot = progress.snapshot()
+        assert snapshot.files_total == 8
+        assert snapshot.files_done == 8
+        assert snapshot.bytes_done == 8000
+        assert snapshot.eta == 0.0
+        assert progress._thread is None
+
+    def test_eta_by_files(self):
+        progress = ProgressAggregator()
+        progress.add_files(4)
+        assert progress.snapshot().eta is None
+        progress.file_done()
+        progress.file_failed()
+        snapshot = progress.snapshot()
+        assert snapshot.files_sized == 0
+        assert snapshot.eta == pytest.approx(snapshot.elapsed)
+
+    def test_sinks(self):
+        sink, stream = _ListSink(), io.StringIO()
+        with ProgressAggregator([sink, JsonProgressSink(stream)], desc='album', interval=0.01) as progress:
+            progress.add_files(2)
+            progress.add_file_size(100)
+            progress.update_bytes(100)
+            progress.file_done()
+            threading.Event().wait(0.1)
+
+        assert sink.updates
+        assert sink.closed.files_done == 1
+        assert sink.closed.bytes_total == 100
+        lines = stream.getvalue().splitlines()
+        assert json.loads(lines[-1])['desc'] == 'album'
+
+    def test_scope_reused(self):
+        set_progress_mode('silent')
+        try:
+            assert get_current_progress() is None
+            with progress_scope('outer') as outer:
+                with progress_scope('inner') as inner:
+                    assert inner is outer
+                assert get_current_progress() is outer
+            assert get_current_progress() is None
+        finally:
+            set_progress_mode('tqdm')
+
+        with pytest.raises(ValueError):
+            set_progress_mode('unknown')
+
+    def test_download_file(self, local_server, tmp_path):
+        local_server.add_bytes('/file.bin', b'x' * 200000)
+        progress = ProgressAggregator()
+        with progress_scope(progress=progress):
+            download_file(local_server.url('/file.bin'), filename=str(tmp_path / 'file.bin'))
+        assert progress.snapshot().bytes_done == 200000
@@ -0,0 +1,50 @@
+import pytest
+import requests
+from urllib3.util.retry import RequestHistory
+
+from netdriveurls.utils import RetryBudget, HookedRetry, TimeoutHTTPAdapter
+
+
+@pytest.mark.unittest
+class TestUtilsRetryBudget:
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, min_retries=2, window=60)
+        assert budget.available('a.com') == 2
+        assert budget.try_retry('a.com') and budget.try_retry('a.com')
+        assert not budget.try_retry('a.com')
+        # other hosts have their own budget
+        assert budget.try_retry('b.com')
+
+        for _ in range(4):
+            budget.record_request('a.com')
+        assert budget.available('a.com') == 2
+        assert budget.try_retry('a.com') and budget.try_retry('a.com')
+        assert not budget.try_retry('a.com')
+
+    def test_window(self):
+        budget = RetryBudget(ratio=0, min_retries=1, window=0)
+        assert budget.try_retry('a.com')
+        assert budget.try_retry('a.com')
+
+    def test_session(self, local_server):
+        local_server.add_bytes('/busy', b'busy', status=503)
+        budget = RetryBudget(ratio=0, min_retries=3, window=60)
+        session = requests.Session()
+        session.mount('http://', TimeoutHTTPAdapter(max_retries=HookedRetry(
+            total=5, status_forcelist=[503], budget=budget)))
+
+        with pytest.raises(requests.exceptions.RetryError):
+            session.get(local_server.url('/busy'))
+        assert local_server.hits['/busy'] == 4
+        # the budget of the host is exhausted, no retry anymore
+        with pytest.raises(requests.exceptions.RetryError):
+            session.get(local_server.url('/busy'))
+        assert local_server.hits['/busy'] == 5
+
+    def test_jitter(self):
+        history = (RequestHistory('GET', '/', None, 503, None),) * 4
+        retry = HookedRetry(total=10, backoff_factor=1, jitter=1.0).new(history=history)
+        backoffs = {retry.get_backoff_time() for _ in range(20)}
+        assert len(backoffs) > 1
+        assert all(0 <= backoff <= 8 for backoff in backoffs)
+        assert HookedRetry(total=10, backoff_factor=1).new(history=history).get_backoff_time() == 8
@@ -0,0 +1,24 @@
+import pytest
+
+from netdriveurls.utils import get_requests_session, prewarm_connections
+
+
+@pytest.mark.unittest
+class TestUtilsSession:
+    def test_prewarm(self, local_server):
+        local_server.add_bytes('/a.bin', b'a' * 100)
+        session = get_requests_session()
+        url = local_server.url('/a.bin')
+        assert prewarm_connections(session, [url, url + '?x=1', 'ftp://example.com/a'], wait=True) == \
+               [local_server.url('/')]
+
+        resp = session.get(url)
+        assert resp.content == b'a' * 100
+        # the connection was opened beforehand
+        assert resp.timings.reused
+
+        # the pool has an idle connection already
+        adapter = session.get_adapter(url)
+        verify = session.merge_environment_settings(url, {}, None, None, None)['verify']
+        assert not adapter.prewarm(local_server.url('/'), verify=verify)
+        assert not adapter.prewarm(local_server.url('/'), verify=verify, proxies={'http': 'http://127.0.0.1:1'})
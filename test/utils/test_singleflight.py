@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from netdriveurls.utils import SingleFlight, request_key, single_flight
+
+
+@pytest.mark.unittest
+class TestUtilsSingleFlight:
+    def test_request_key(self):
+        assert request_key('get', 'https://a.com/x') == request_key('GET', 'https://a.com/x', {'User-Agent': 'a'})
+        assert request_key('GET', 'https://a.com/x', {'authorization': 'x'}) == \
+               request_key('GET', 'https://a.com/x', {'Authorization': 'x'})
+        assert request_key('GET', 'https://a.com/x', {'Authorization': 'x'}) != request_key('GET', 'https://a.com/x')
+        assert request_key('GET', 'https://a.com/x') != request_key('HEAD', 'https://a.com/x')
+
+    def test_coalesce(self):
+        flight = SingleFlight()
+        calls, results = [], []
+        release = threading.Event()
+
+        def _fetch():
+            calls.append(1)
+            release.wait()
+            return ['parsed']
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', _fetch))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert flight.shared == 7
+        assert len(results) == 8 and all(result is results[0] for result in results)
+
+        # finished calls are not cached
+        flight.do('key', _fetch)
+        assert len(calls) == 2
+
+    def test_error_shared(self):
+        flight = SingleFlight()
+        errors = []
+        release = threading.Event()
+
+        def _fetch():
+            release.wait()
+            raise ValueError('broken')
+
+        def _run():
+            try:
+                flight.do('key', _fetch)
+            except ValueError as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=_run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert len(errors) == 4
+        assert flight.shared == 3
+
+    def test_decorator(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        @single_flight(flight=flight)
+        def _get_page(url, session=None):
+            calls.append(url)
+            release.wait()
+            return url.upper()
+
+        results = []
+        threads = [threading.Thread(target=lambda u=url: results.append(_get_page(u, session=object())))
+                   for url in ['https://a.com/x'] * 3 + ['https://a.com/y'] * 3]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert sorted(calls) == ['https://a.com/x', 'https://a.com/y']
+        assert sorted(results) == ['HTTPS://A.COM/X'] * 3 + ['HTTPS://A.COM/Y'] * 3
+
+    def test_decorator_headers(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        @single_flight(flight=flight)
+        def _get_page(url, session=None):
+            calls.append(session.headers.get('Authorization'))
+            release.wait()
+            return session.headers.get('Authorization')
+
+        def _session(auth: str, cookie: str = 'a') -> requests.Session:
+            session = requests.Session()
+            session.headers['Authorization'] = auth
+            session.headers['User-Agent'] = f'agent {len(calls)}'
+            session.cookies.set('token', cookie, domain='a.com')
+            return session
+
+        # the other accounts do not get each other's responses, the other headers do not matter
+        sessions = [_session('key1'), _session('key1'), _session('key2'), _session('key1', cookie='b')]
+        results = []
+        threads = [threading.Thread(target=lambda s=session: results.append(_get_page('https://a.com/x', session=s)))
+                   for session in sessions]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+        assert sorted(calls) == ['key1', 'key1', 'key2']
+        assert sorted(results) == ['key1', 'key1', 'key1', 'key2']
+        assert flight.shared == 1
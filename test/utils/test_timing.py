@@ -0,0 +1,79 @@
+import socket
+
+import pytest
+import requests
+from hbutils.testing import simulate_entry
+
+from netdriveurls.entry import netdriveurlscli
+from netdriveurls.utils import get_requests_session, EventHooks, TimingsCollector, get_response_timings
+
+
+@pytest.mark.unittest
+class TestUtilsTiming:
+    def test_response_timings(self, local_server):
+        local_server.add_bytes('/data', b'x' * 100000)
+        session = get_requests_session()
+
+        resp = session.get(local_server.url('/data'))
+        timings = get_response_timings(resp)
+        assert not timings.reused
+        assert timings.connect > 0
+        assert timings.tls == pytest.approx(0.0, abs=0.01)
+        assert timings.ttfb > 0
+        assert timings.transfer is not None
+
+        resp = session.get(local_server.url('/data'))
+        timings = get_response_timings(resp)
+        assert timings.reused
+        assert timings.dns == 0.0 and timings.connect == 0.0
+
+    def test_dead_address_skipped(self, local_server, monkeypatch):
+        from netdriveurls.utils import timing
+
+        local_server.add_bytes('/data', b'x' * 100)
+        port = int(local_server.url('/').rsplit(':', 1)[1].split('/')[0])
+        dead_address = ('192.0.2.1', port)
+        create_connection = timing._connection.create_connection
+
+        def _create_connection(address, *args, **kwargs):
+            if address == dead_address:
+                raise socket.timeout('timed out')
+            return create_connection(address, *args, **kwargs)
+
+        monkeypatch.setattr(timing._connection, 'create_connection', _create_connection)
+        monkeypatch.setattr(timing, 'resolve_host', lambda host, port_: [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', dead_address),
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port_)),
+        ])
+        assert get_requests_session().get(local_server.url('/data')).content == b'x' * 100
+
+        monkeypatch.setattr(timing, 'resolve_host', lambda host, port_: [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', dead_address),
+        ])
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            get_requests_session(max_retries=0).get(local_server.url('/data'))
+
+    def test_stream_transfer_and_event(self, local_server):
+        local_server.add_bytes('/data', b'x' * 100000)
+        hooks = EventHooks()
+        collector = TimingsCollector().attach(hooks)
+        session = get_requests_session(hooks=hooks)
+
+        resp = session.get(local_server.url('/data'), stream=True)
+        timings = get_response_timings(resp)
+        assert timings.transfer is None
+        assert collector.summary() == {}
+        for _ in resp.iter_content(4096):
+            pass
+        assert timings.transfer is not None
+
+        summary = collector.summary()
+        assert summary['127.0.0.1']['requests'] == 1
+        assert summary['127.0.0.1']['reused'] == 0
+        assert summary['127.0.0.1']['transfer']['mean'] == timings.transfer
+        assert '127.0.0.1' in collector.format_report()
+
+    def test_cli_timings(self):
+        result = simulate_entry(netdriveurlscli, ['netdriveurls', 'download', '-h'])
+        assert result.exitcode == 0
+        assert '--timings' in result.stdout
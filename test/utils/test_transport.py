@@ -0,0 +1,78 @@
+import pytest
+
+from netdriveurls.utils import TimeoutHTTPAdapter, get_requests_session, set_transport, get_transport, \
+    get_host_transports, register_transport, TRANSPORT_ENV
+from netdriveurls.utils.transport import _TRANSPORTS
+
+
+class _MarkedAdapter(TimeoutHTTPAdapter):
+    pass
+
+
+@pytest.fixture()
+def transports(monkeypatch):
+    monkeypatch.delenv(TRANSPORT_ENV, raising=False)
+    monkeypatch.setattr('netdriveurls.utils.transport._default_transport', None)
+    monkeypatch.setattr('netdriveurls.utils.transport._host_transports', {})
+    monkeypatch.setitem(_TRANSPORTS, 'marked', lambda **kwargs: _MarkedAdapter(**kwargs))
+    yield
+
+
+@pytest.mark.unittest
+class TestUtilsTransport:
+    def test_default(self, transports, monkeypatch):
+        assert get_transport() == 'requests'
+        monkeypatch.setenv(TRANSPORT_ENV, 'marked')
+        assert get_transport() == 'marked'
+        set_transport('requests')
+        assert get_transport() == 'requests'
+
+        session = get_requests_session()
+        assert type(session.adapters['https://']) is TimeoutHTTPAdapter
+
+    def test_unknown(self, transports):
+        with pytest.raises(ValueError):
+            set_transport('unknown')
+        with pytest.raises(ValueError):
+            get_requests_session(transport='unknown')
+
+    def test_host(self, transports):
+        set_transport('marked', host='Example.com')
+        assert get_host_transports() == {'example.com': 'marked'}
+        assert get_transport('example.com') == 'marked'
+        assert get_transport('other.com') == 'requests'
+
+        session = get_requests_session(timeout=3)
+        adapter = session.get_adapter('https://example.com/a.png')
+        assert isinstance(adapter, _MarkedAdapter)
+        assert adapter.timeout == 3
+        assert type(session.get_adapter('https://other.com/a.png')) is TimeoutHTTPAdapter
+        assert type(session.get_adapter('https://example.com.evil/a.png')) is TimeoutHTTPAdapter
+
+        # an explicit transport is used for all the hosts
+        session = get_requests_session(transport='requests')
+        assert type(session.get_adapter('https://example.com/a.png')) is TimeoutHTTPAdapter
+
+        set_transport(None, host='example.com')
+        assert get_host_transports() == {}
+
+    def test_register(self, transports):
+        register_transport('marked2', lambda **kwargs: _MarkedAdapter(**kwargs))
+        try:
+            session = get_requests_session(transport='marked2')
+            assert isinstance(session.adapters['http://'], _MarkedAdapter)
+        finally:
+            _TRANSPORTS.pop('marked2')
+
+    def test_same_results(self, transports, local_server):
+        pytest.importorskip('pycurl')
+        pytest.importorskip('httpx')
+        local_server.add_bytes('/file.bin', b'x' * 100000, headers={'Set-Cookie': 'a=1'})
+        results = []
+        for name in ['requests', 'httpx', 'pycurl']:
+            session = get_requests_session(transport=name)
+            resp = session.get(local_server.url('/file.bin'))
+            resp.raise_for_status()
+            results.append((resp.status_code, resp.content, resp.headers['Content-Length'],
+                            session.cookies.get('a')))
+        assert results[0] == results[1] == results[2] == (200, b'x' * 100000, '100000', '1')